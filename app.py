@@ -1,90 +1,380 @@
-from flask import Flask, render_template, abort, redirect, url_for, request, flash
+from flask import Flask, render_template, abort, redirect, url_for, request, flash, jsonify, make_response
 import os
+import json
+import hashlib
+import tempfile
+from datetime import datetime, timezone
 from markupsafe import Markup
-from function import split_chapters, read_file_auto, split_novel_by_chapter
-import shutil
+from function import split_chapters, read_file_auto
+from storage import load_manifest, read_paragraphs, delete_novel, rename_novel
+from jobs import submit_upload, get_job, list_jobs, abandon_unfinished
+import search
+import catalog
+from cache import LRUCache
+from prefetch import Prefetcher
+import compress
+import metrics
 
 # nohup python app.py > app.log 2>&1 &
 
 app = Flask(__name__)
 NOVEL_FOLDER = 'novels'  # 定义小说文件存储的文件夹路径
-app.secret_key = os.urandom(24)  # 设置Flask应用的密钥用于session加密
+UPLOAD_FOLDER = os.path.join(NOVEL_FOLDER, '.uploads')  # 上传文件等待后台分章时的暂存目录
+SECRET_KEY_FILE = os.path.join(NOVEL_FOLDER, '.secret_key')
+
+
+def load_secret_key(path=SECRET_KEY_FILE):
+    """
+    session 加密密钥：优先用环境变量 SECRET_KEY，否则读取书库中的密钥文件（第一次运行时生成）。
+
+    密钥固定下来，重启后和多个工作进程之间 session、flash 消息都能正常使用。
+    """
+    if os.environ.get('SECRET_KEY'):
+        return os.environ['SECRET_KEY']
+    if not os.path.exists(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f'{path}.{os.getpid()}'
+        with open(tmp_path, 'w', encoding='ascii') as f:
+            f.write(os.urandom(24).hex())
+        try:
+            # 硬链接到位是原子的：多个进程同时启动时只有一个的密钥生效，其余读取它
+            os.link(tmp_path, path)
+        except FileExistsError:
+            pass
+        finally:
+            os.remove(tmp_path)
+    with open(path, 'r', encoding='ascii') as f:
+        return f.read().strip()
+
+
+app.secret_key = load_secret_key()  # 设置Flask应用的密钥用于session加密
+PARAGRAPHS_PER_PAGE = 40  # 阅读页每页显示的段落数
+# 渲染好的章节页缓存，按字节数限制大小（默认 64MB，PAGE_CACHE_BYTES=0 关闭）
+page_cache = LRUCache(int(os.environ.get('PAGE_CACHE_BYTES', 64 << 20)))
+# 整本目录的 JSON 缓存（每本小说一份）
+toc_cache = LRUCache(16 << 20)
+# 章节页、目录页压缩后的版本，键为 (小说名, ..., 压缩格式)；内容不变的页面只压缩一次
+compressed_cache = LRUCache(int(os.environ.get('COMPRESSED_CACHE_BYTES', 32 << 20)))
+TOC_MAX_WINDOW = 500  # 目录接口单次最多返回的章节数
+# 读者打开一页后在后台预取下一页（PREFETCH=0 关闭）
+PREFETCH = os.environ.get('PREFETCH', '1') != '0'
+prefetcher = Prefetcher()
+
+# 页面随模板变化，ETag 中带上模板的修改时间，改版后旧缓存自动失效
+TEMPLATE_DIR = os.path.join(app.root_path, app.template_folder)
+TEMPLATE_VERSION = max((os.stat(os.path.join(TEMPLATE_DIR, name)).st_mtime_ns for name in os.listdir(TEMPLATE_DIR)),
+                       default=0)
 
 from flask import request
 
-@app.route('/')
-def index():
-    # 获取小说文件夹列表（忽略非目录）
-    folders = [f for f in os.listdir(NOVEL_FOLDER) if os.path.isdir(os.path.join(NOVEL_FOLDER, f))]
-    novels = [{'filename': f, 'title': f} for f in sorted(folders)]
 
-    # 分页参数
-    page = request.args.get('page', 1, type=int)
-    per_page = 20
-    total = len(novels)
+def make_etag(*parts):
+    """由页面参数和数据版本生成强 ETag"""
+    key = '\0'.join(str(part) for part in (TEMPLATE_VERSION,) + parts)
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()
 
-    start = (page - 1) * per_page
-    end = start + per_page
-    novels_paginated = novels[start:end]
 
-    total_pages = (total + per_page - 1) // per_page  # 向上取整
+def not_modified(etag, last_modified=None):
+    """
+    处理条件请求：客户端缓存仍有效时直接返回 304，不读取章节、不渲染模板。
 
-    return render_template(
-        'index.html',
-        novels=novels_paginated,
-        page=page,
-        total_pages=total_pages
-    )
+    :param etag: 页面的 ETag
+    :param last_modified: 页面内容的修改时间（datetime），可选
+    :return: 304 响应；需要返回完整页面时返回 None
+    """
+    if request.if_none_match:
+        fresh = request.if_none_match.contains(etag)
+    elif last_modified and request.if_modified_since:
+        fresh = last_modified.replace(microsecond=0) <= request.if_modified_since
+    else:
+        fresh = False
+    if not fresh:
+        return None
+    return cache_headers(make_response('', 304), etag, last_modified)
+
+
+def cache_headers(response, etag, last_modified=None, cache_control='no-cache'):
+    """给响应加上缓存校验头（no-cache：可以缓存，但每次使用前都要用 ETag 向服务器确认）"""
+    response.set_etag(etag)
+    if last_modified:
+        response.last_modified = last_modified
+    response.headers['Cache-Control'] = cache_control
+    if compress.COMPRESS:
+        response.vary.add('Accept-Encoding')
+    return response
+
+
+def response_encoding():
+    """按 Accept-Encoding 协商本次响应的压缩格式，不压缩时为 None"""
+    return compress.negotiate(request.accept_encodings)
+
+
+def encoded_body(body, encoding, cache_key=None, version=None):
+    """
+    按协商的格式压缩响应体。
+
+    :param body: 未压缩的响应体 bytes，或生成它的函数（压缩版本命中缓存时不调用）
+    :param encoding: response_encoding() 的结果
+    :param cache_key: 给出时压缩结果按 (cache_key..., 格式) 存入 compressed_cache，同一版本只压缩一次
+    :param version: 缓存的版本标记（页面的 ETag）
+    :return: (响应体, 是否命中缓存)
+    """
+    if encoding and cache_key is not None:
+        cached = compressed_cache.get(cache_key + (encoding,), version)
+        if cached is not None:
+            return cached, True
+    if callable(body):
+        body = body()
+    if not encoding:
+        return body, False
+    with metrics.stage('compress'):
+        encoded = compress.compress(body, encoding)
+    if cache_key is not None:
+        compressed_cache.put(cache_key + (encoding,), version, encoded)
+    return encoded, False
+
+
+def send_body(body, encoding, etag, last_modified=None, cache_control='no-cache'):
+    """返回（可能已压缩的）响应体，带上 Content-Encoding 和对应格式的 ETag"""
+    response = make_response(body)
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    return cache_headers(response, compress.encoded_etag(etag, encoding), last_modified, cache_control)
+
+
+def manifest_modified(manifest):
+    """章节清单的修改时间"""
+    return datetime.fromtimestamp(manifest['mtime'] / 1e9, timezone.utc)
+
+# 每个请求的耗时按路由记入 /metrics，各阶段耗时同时写入 Server-Timing 响应头
+@app.before_request
+def start_timer():
+    metrics.start_request(request.endpoint)
+
+@app.after_request
+def record_timing(response):
+    stages = metrics.finish_request(response.status_code, f'{request.method} {request.full_path}')
+    if stages:
+        response.headers['Server-Timing'] = ', '.join(f'{name};dur={seconds * 1000:.2f}' for name, seconds in stages)
+    return response
+
+@app.route('/')
+def index():
+    # 排序方式：书名 / 最近添加 / 最近阅读
+    sort = request.args.get('sort', 'name')
+    if sort not in catalog.SORTS:
+        sort = 'name'
+
+    # keyset 分页：after/before 为相邻页边界上的书名，只取一页记录
+    per_page = 20
+    # 书架内容由目录版本号决定（阅读位置变化也会更新版本号）
+    with metrics.stage('version'):
+        etag = make_etag('index', catalog.version(NOVEL_FOLDER), sort,
+                         request.args.get('after'), request.args.get('before'))
+    encoding = response_encoding()
+    cached = not_modified(compress.encoded_etag(etag, encoding))
+    if cached:
+        return cached
+
+    with metrics.stage('catalog'):
+        novels, has_prev, has_next = catalog.list_novels(
+            NOVEL_FOLDER, sort,
+            after=request.args.get('after'), before=request.args.get('before'), limit=per_page)
+    for novel in novels:
+        novel['filename'] = novel['title'] = novel['name']
+
+    with metrics.stage('render'):
+        body = render_template(
+            'index.html',
+            novels=novels,
+            sort=sort,
+            has_prev=has_prev,
+            has_next=has_next
+        ).encode('utf-8')
+    # 书架随阅读位置变化，每次现压缩，不缓存
+    body, _ = encoded_body(body, encoding)
+    # 书架显示个人阅读位置，只允许浏览器缓存
+    return send_body(body, encoding, etag, cache_control='private, no-cache')
 
 
 @app.route('/view/<novel_name>/toc')
 def view_toc(novel_name):
     # 小说所在的目录
+    novel_dir = os.path.join(NOVEL_FOLDER, novel_name)
+    with metrics.stage('manifest'):
+        if not os.path.isdir(novel_dir):
+            abort(404)
+
+        # 从章节清单获取标题（有缓存，不再遍历目录）
+        manifest = load_manifest(novel_dir)
+    chapter_titles = manifest['titles']
+
+    etag = make_etag('toc', novel_name, manifest['mtime'])
+    last_modified = manifest_modified(manifest)
+    encoding = response_encoding()
+    cached = not_modified(compress.encoded_etag(etag, encoding), last_modified)
+    if cached:
+        return cached
+
+    def render():
+        with metrics.stage('render'):
+            return render_template(
+                'toc.html',
+                title=novel_name,
+                filename=novel_name,
+                chapter_titles=chapter_titles
+            ).encode('utf-8')
+
+    # 目录页在清单不变时内容不变，压缩版本缓存起来
+    body, _ = encoded_body(render, encoding, (novel_name, 'toc'), etag)
+    return send_body(body, encoding, etag, last_modified)
+
+# 目录 JSON：阅读页侧边栏按需加载当前章节附近的一段
+@app.route('/view/<novel_name>/toc.json')
+def toc_json(novel_name):
     novel_dir = os.path.join(NOVEL_FOLDER, novel_name)
     if not os.path.isdir(novel_dir):
         abort(404)
 
-    # 获取所有章节文件并排序
-    chapter_files = sorted(os.listdir(novel_dir))
+    manifest = load_manifest(novel_dir)
+    titles = manifest['titles']
+    # 不带 start 时返回整本目录，否则返回 [start, start + count) 一段
+    start = request.args.get('start', type=int)
+    count = min(request.args.get('count', 100, type=int), TOC_MAX_WINDOW)
+
+    etag = make_etag('toc.json', novel_name, manifest['mtime'], start, count)
+    last_modified = manifest_modified(manifest)
+    encoding = response_encoding()
+    cached = not_modified(compress.encoded_etag(etag, encoding), last_modified)
+    if cached:
+        return cached
+
+    if start is None:
+        def whole():
+            body = toc_cache.get(novel_name, manifest['mtime'])
+            if body is None:
+                body = json.dumps({'total': len(titles), 'start': 0, 'titles': titles},
+                                  ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+                toc_cache.put(novel_name, manifest['mtime'], body)
+            return body
+
+        body, _ = encoded_body(whole, encoding, (novel_name, 'toc.json'), etag)
+    else:
+        start = max(0, min(start, len(titles)))
+        body = json.dumps({'total': len(titles), 'start': start, 'titles': titles[start:start + max(0, count)]},
+                          ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        body, _ = encoded_body(body, encoding)
+
+    response = send_body(body, encoding, etag, last_modified)
+    response.mimetype = 'application/json'
+    return response
+
+def page_count(chapter):
+    """章节的总页数（向上取整），非空段落数在分章时已记录在清单中"""
+    return (chapter['paragraphs'] + PARAGRAPHS_PER_PAGE - 1) // PARAGRAPHS_PER_PAGE
+
+
+def chapter_etag(novel_name, chapter_index, page, manifest):
+    # 章节分好后内容不变：清单 mtime 和章节大小不变，同一页的内容就不变
+    return make_etag('chapter', novel_name, chapter_index, page, manifest['mtime'],
+                     manifest['chapters'][chapter_index]['size'])
 
-    # 生成章节标题（去掉编号）
-    chapter_titles = [os.path.splitext(f)[0].split('_', 2)[-1] for f in chapter_files]
 
-    return render_template(
-        'toc.html',
-        title=novel_name,
-        filename=novel_name,
-        chapter_titles=chapter_titles
-    )
+def chapter_url_template(novel_name):
+    """章节页地址模板，章节索引处为 {index}，目录按需加载时由页面脚本填入（地址仍由 url_for 生成）"""
+    sentinel = str(2 ** 31 - 1)
+    head, _, tail = url_for('view_chapter', novel_name=novel_name, chapter_index=int(sentinel)).rpartition(sentinel)
+    return head + '{index}' + tail
+
+
+def render_chapter_page(novel_name, novel_dir, chapters, chapter_index, page):
+    """渲染章节的一页，返回 bytes"""
+    current_chapter = chapters[chapter_index]
+    # 计算当前页的起始段落
+    start = (page - 1) * PARAGRAPHS_PER_PAGE
+    # 通过段落偏移索引只读取当前页的段落
+    with metrics.stage('read'):
+        page_paragraphs = read_paragraphs(novel_dir, current_chapter, start, PARAGRAPHS_PER_PAGE)
+
+    # 渲染模板，传递所需数据
+    with metrics.stage('render'):
+        return render_template(
+            'view.html',
+            title=novel_name,              # 小说名（用于显示或SEO）
+            chapter_index=chapter_index,  # 当前章节索引
+            chapter_count=len(chapters),  # 章节总数
+            filename=novel_name,           # 用于url_for构建链接
+            chapter_url=chapter_url_template(novel_name),  # 目录中各章节的链接模板
+            chapter_title=current_chapter['title'],   # 当前章节标题
+            page_paragraphs=page_paragraphs, # 当前分页显示的段落
+            current_page=page,             # 当前页码
+            total_pages=page_count(current_chapter)  # 总页数
+        ).encode('utf-8')
+
+
+def is_prefetch_request():
+    """浏览器按 <link rel="prefetch"> 提前请求的页面，读者还没有真正打开"""
+    purpose = request.headers.get('Sec-Purpose') or request.headers.get('Purpose') or request.headers.get('X-Moz')
+    return bool(purpose) and purpose.startswith('prefetch')
+
+
+def prefetch_page(novel_name, chapter_index, page, base_url, encoding=None):
+    """
+    后台线程中把一页渲染进页面缓存（encoding 不为空时同时缓存该格式的压缩版本）；
+    已在缓存中或章节已不存在时返回 False
+    """
+    novel_dir = os.path.join(NOVEL_FOLDER, novel_name)
+    manifest = load_manifest(novel_dir)
+    chapters = manifest['chapters']
+    if chapter_index >= len(chapters) or page > page_count(chapters[chapter_index]):
+        return False
+    etag = chapter_etag(novel_name, chapter_index, page, manifest)
+    cache_key = (novel_name, chapter_index, page)
+    if page_cache.contains(cache_key, etag) and (
+            not encoding or compressed_cache.contains(cache_key + (encoding,), etag)):
+        return False
+    # 模板中的 url_for 需要请求上下文，按读者请求的站点地址构造一个
+    with app.test_request_context(base_url=base_url):
+        body = page_cache.get(cache_key, etag)
+        if body is None:
+            body = render_chapter_page(novel_name, novel_dir, chapters, chapter_index, page)
+            page_cache.put(cache_key, etag, body)
+        if encoding:
+            encoded_body(body, encoding, cache_key, etag)
+    return True
+
+
+def schedule_next_page(novel_name, chapters, chapter_index, page):
+    """读者打开一页后，在后台预取下一页（本章最后一页时预取下一章第一页）"""
+    if not PREFETCH or not page_cache.max_bytes:
+        return
+    if page < page_count(chapters[chapter_index]):
+        target = (chapter_index, page + 1)
+    elif chapter_index + 1 < len(chapters):
+        target = (chapter_index + 1, 1)
+    else:
+        return
+    prefetcher.schedule((novel_name,) + target, prefetch_page, novel_name, *target, request.url_root,
+                        response_encoding())
+
 
 @app.route('/view/<novel_name>/chapter/<int:chapter_index>')
 def view_chapter(novel_name, chapter_index):
     # 拼接小说目录路径
     novel_dir = os.path.join(NOVEL_FOLDER, novel_name)
-    # 如果小说目录不存在，返回404错误
-    if not os.path.isdir(novel_dir):
-        abort(404)
+    with metrics.stage('manifest'):
+        # 如果小说目录不存在，返回404错误
+        if not os.path.isdir(novel_dir):
+            abort(404)
 
-    # 获取该小说目录下所有章节文件名，排序保证顺序一致
-    chapter_files = sorted(os.listdir(novel_dir))
+        # 读取章节清单（按 mtime 缓存），按索引直接定位章节
+        manifest = load_manifest(novel_dir)
+    chapters = manifest['chapters']
 
-    # 检查传入的章节索引是否合法（不能超出文件列表范围）
-    if chapter_index < 0 or chapter_index >= len(chapter_files):
+    # 检查传入的章节索引是否合法（不能超出章节范围）
+    if chapter_index < 0 or chapter_index >= len(chapters):
         abort(404)
 
-    # 获取当前章节对应的文件名和完整路径
-    current_chapter_file = chapter_files[chapter_index]
-    filepath = os.path.join(novel_dir, current_chapter_file)
-
-    # 读取当前章节文件内容，使用utf-8编码
-    with open(filepath, 'r', encoding='utf-8') as f:
-        chapter_content = f.read()
-
-    # 从所有章节文件名中提取章节标题（假设文件名格式带编号和标题，中间用下划线分割）
-    chapter_titles = [os.path.splitext(f)[0].split('_', 2)[-1] for f in chapter_files]
-    # 当前章节标题
-    chapter_title = chapter_titles[chapter_index]
-
     # 从URL参数获取分页页码，默认是第一页
     page = request.args.get('page', '1')
     try:
@@ -93,74 +383,141 @@ def view_chapter(novel_name, chapter_index):
         # 如果页码不是整数，默认第一页
         page = 1
 
-    # 把章节内容按换行拆成段落，并去除空白段落
-    paragraphs = [p for p in chapter_content.split('\n') if p.strip()]
-
-    # 每页显示的段落数
-    paragraphs_per_page = 40
-    # 计算总页数（向上取整）
-    total_pages = (len(paragraphs) + paragraphs_per_page - 1) // paragraphs_per_page
-
     # 保证页码在合理范围内
+    total_pages = page_count(chapters[chapter_index])
     if page < 1:
         page = 1
     elif page > total_pages:
         page = total_pages
 
-    # 计算当前页的段落范围索引
-    start = (page - 1) * paragraphs_per_page
-    end = start + paragraphs_per_page
-    # 当前页要显示的段落列表
-    page_paragraphs = paragraphs[start:end]
-
-    # 渲染模板，传递所需数据
-    return render_template(
-        'view.html',
-        title=novel_name,              # 小说名（用于显示或SEO）
-        chapter_index=chapter_index,  # 当前章节索引
-        chapter_count=len(chapter_files),  # 章节总数
-        filename=novel_name,           # 用于url_for构建链接
-        chapter_title=chapter_title,   # 当前章节标题
-        chapter_titles=chapter_titles, # 所有章节标题（目录用）
-        page_paragraphs=page_paragraphs, # 当前分页显示的段落
-        current_page=page,             # 当前页码
-        total_pages=total_pages        # 总页数
-    )
-
-import shutil  # 用于删除整个文件夹
+    # 浏览器预取的页面读者还没打开，不记录阅读位置，也不再往后预取
+    browser_prefetch = is_prefetch_request()
+    if not browser_prefetch:
+        # 记录阅读位置（书架上“继续阅读”和最近阅读排序用）
+        with metrics.stage('catalog'):
+            catalog.record_read(novel_dir, chapter_index, page)
+        schedule_next_page(novel_name, chapters, chapter_index, page)
+
+    etag = chapter_etag(novel_name, chapter_index, page, manifest)
+    last_modified = manifest_modified(manifest)
+    encoding = response_encoding()
+    cached = not_modified(compress.encoded_etag(etag, encoding), last_modified)
+    if cached:
+        return cached
+
+    # 热门页面直接用缓存的渲染结果和压缩结果（ETag 不同说明章节已改写，视为未命中）
+    cache_key = (novel_name, chapter_index, page)
+
+    def render():
+        body = page_cache.get(cache_key, etag)
+        if body is None:
+            body = render_chapter_page(novel_name, novel_dir, chapters, chapter_index, page)
+            page_cache.put(cache_key, etag, body)
+        elif not browser_prefetch:
+            prefetcher.mark_served(cache_key)
+        return body
+
+    body, hit = encoded_body(render, encoding, cache_key, etag)
+    # 浏览器预取请求命中不算预取命中，读者真正翻页时才算
+    if hit and not browser_prefetch:
+        prefetcher.mark_served(cache_key)
+    return send_body(body, encoding, etag, last_modified)
+
+# 页面由浏览器预取缓存直接打开时服务器收不到请求，由页面脚本补记阅读位置
+@app.route('/view/<novel_name>/chapter/<int:chapter_index>/read', methods=['POST'])
+def record_read(novel_name, chapter_index):
+    novel_dir = os.path.join(NOVEL_FOLDER, novel_name)
+    if not os.path.isdir(novel_dir):
+        abort(404)
+    # 与章节页相同的范围检查：不存在的章节 404，页码不是 1 ~ 总页数的整数时 400
+    chapters = load_manifest(novel_dir)['chapters']
+    if chapter_index < 0 or chapter_index >= len(chapters):
+        abort(404)
+    try:
+        page = int(request.args.get('page', '1'))
+    except ValueError:
+        abort(400)
+    if not 1 <= page <= page_count(chapters[chapter_index]):
+        abort(400)
+    catalog.record_read(novel_dir, chapter_index, page)
+    return '', 204
+
+# 全文搜索
+@app.route('/search')
+def search_novels():
+    query = request.args.get('q', '').strip()
+    results = search.search(NOVEL_FOLDER, query) if query else []
+    # 命中段落换算成阅读页的页码，结果直接跳转到对应页
+    for result in results:
+        result['page'] = result['paragraph'] // PARAGRAPHS_PER_PAGE + 1
+    return render_template('search.html', query=query, results=results, limit=search.MAX_RESULTS)
 
 @app.route('/upload', methods=['POST'])
 def upload():
     file = request.files.get('novel')
     if file and file.filename.endswith('.txt'):
-        # 小说名（去掉扩展名）
-        novel_name = os.path.splitext(file.filename)[0]
-        novel_dir = os.path.join(NOVEL_FOLDER, novel_name)
-        os.makedirs(novel_dir, exist_ok=True)
-
-        save_path = os.path.join(novel_dir, file.filename)
+        # 先保存到暂存目录（文件名即小说名），再交给后台分章，请求立即返回
+        os.makedirs(UPLOAD_FOLDER, exist_ok=True)
+        save_path = os.path.join(tempfile.mkdtemp(dir=UPLOAD_FOLDER), os.path.basename(file.filename))
         file.save(save_path)
+        # 同名小说重新上传后，清掉旧的页面缓存
+        job_id = submit_upload(save_path, NOVEL_FOLDER, on_done=lambda job: invalidate_pages(job['novel']))
 
-        try:
-            # 调用分章节函数（改为存放到 novel_dir）
-            chapter_files = split_novel_by_chapter(save_path, novel_dir)
-            flash(f'上传成功！共分割出 {len(chapter_files)} 个章节。')
-        except Exception as e:
-            flash(f'上传成功，但分章节失败：{str(e)}')
-
-        # 删除原始整本文件
-        os.remove(save_path)
+        if request.accept_mimetypes.best == 'application/json':
+            return jsonify(job_id=job_id, status_url=url_for('job_status', job_id=job_id)), 202
+        flash(f'上传成功，正在后台分章节（任务 {job_id[:8]}）。')
     else:
+        if request.accept_mimetypes.best == 'application/json':
+            return jsonify(error='只支持 .txt 文件上传'), 400
         flash('只支持 .txt 文件上传')
     return redirect(url_for('manage'))
 
+def invalidate_pages(novel_name):
+    """清掉一本小说的所有页面缓存"""
+    page_cache.invalidate(lambda key: key[0] == novel_name)
+    toc_cache.invalidate(lambda key: key == novel_name)
+    compressed_cache.invalidate(lambda key: key[0] == novel_name)
+
+# 页面缓存命中统计
+@app.route('/stats/cache')
+def cache_stats():
+    return jsonify(page_cache.stats())
+
+# 预取统计：预取页数、之后被读到的页数（命中率）
+@app.route('/stats/prefetch')
+def prefetch_stats():
+    return jsonify(prefetcher.stats())
+
+# Prometheus 指标：各路由与各阶段耗时、上传分章、缓存命中率
+@app.route('/metrics')
+def metrics_endpoint():
+    response = make_response(metrics.render({'page': page_cache, 'toc': toc_cache, 'compressed': compressed_cache},
+                                                 prefetcher.stats()))
+    response.headers['Content-Type'] = 'text/plain; version=0.0.4; charset=utf-8'
+    return response
+
+# 上传任务进度
+@app.route('/jobs')
+def jobs_status():
+    return jsonify(jobs=list_jobs(NOVEL_FOLDER))
+
+@app.route('/jobs/<job_id>')
+def job_status(job_id):
+    job = get_job(job_id, NOVEL_FOLDER)
+    if job is None:
+        abort(404)
+    return jsonify(job)
+
 # 删除整本小说（文件夹）
 @app.route('/delete/<novel_name>', methods=['POST'])
 def delete(novel_name):
     safe_name = os.path.basename(novel_name)  # 确保安全
     novel_path = os.path.join(NOVEL_FOLDER, safe_name)
     if os.path.exists(novel_path) and os.path.isdir(novel_path):
-        shutil.rmtree(novel_path)  # 删除整个小说文件夹
+        delete_novel(novel_path)  # 删除整个小说（两种存储格式都是一个文件夹）
+        search.remove_novel(NOVEL_FOLDER, safe_name)
+        catalog.remove_novel(novel_path)
+        invalidate_pages(safe_name)
         flash('删除成功')
     else:
         flash('小说不存在')
@@ -169,13 +526,9 @@ def delete(novel_name):
 # 管理页面
 @app.route('/manage')
 def manage():
-    # 获取小说目录（只取文件夹）
-    novels = []
-    for name in os.listdir(NOVEL_FOLDER):
-        dir_path = os.path.join(NOVEL_FOLDER, name)
-        if os.path.isdir(dir_path):
-            novels.append({'filename': name, 'title': name})
-    return render_template('manage.html', novels=novels)
+    # 从书架目录获取小说列表（不再遍历书库目录）
+    novels = [{'filename': novel['name'], 'title': novel['name']} for novel in catalog.all_novels(NOVEL_FOLDER)]
+    return render_template('manage.html', novels=novels, jobs=list_jobs(NOVEL_FOLDER))
 
 # 重命名小说文件夹
 @app.route('/rename', methods=['POST'])
@@ -195,10 +548,14 @@ def rename():
     elif os.path.exists(new_path):
         flash("新小说名已存在")
     else:
-        os.rename(old_path, new_path)
+        rename_novel(old_path, new_path)
+        search.rename_novel(NOVEL_FOLDER, os.path.basename(old_name), os.path.basename(new_name))
+        catalog.rename_novel(old_path, new_path)
+        invalidate_pages(os.path.basename(old_name))
         flash("重命名成功")
     return redirect(url_for('manage'))
 
 if __name__ == '__main__':
     os.makedirs(NOVEL_FOLDER, exist_ok=True)  # 创建小说文件夹（如果不存在）
+    abandon_unfinished(NOVEL_FOLDER)
     app.run(host='0.0.0.0', port=5000, debug=True)  # 启动Flask应用
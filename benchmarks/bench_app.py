@@ -0,0 +1,329 @@
+"""
+阅读器性能与压力测试。
+
+按指定规模生成合成书库（若干普通小说，外加一本章节很多的长篇和一本单章很大的小说），
+对书架、管理页、目录页、章节页分别测量：
+- Flask 测试客户端逐个请求（不经网络，反映视图本身的开销）
+- 真实 HTTP 服务（子进程中运行）上的并发压测
+记录延迟分位数（p50/p90/p99/max）和吞吐量；另外测量 split_novel_by_chapter 的分章吞吐量。
+结果写入 JSON（带当前提交号），便于对比不同提交。
+
+每个书库的测量都在独立子进程中进行，进程内缓存互不影响。
+
+用法：python benchmarks/bench_app.py [--libraries 10 1000] [--requests 200] [--concurrency 8]
+                                    [--server dev production] [--workers 4] [--threads 4]
+                                    [--long-chapters 2000] [--big-chapter-mb 5] [--output app.json]
+"""
+import io
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import socket
+import argparse
+import tempfile
+import threading
+import contextlib
+import subprocess
+import http.client
+from urllib.parse import quote
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+CHARS = '的一是不了人我在有他这中大来上个国到说们为子和你地出会也时要就可以对生能而那得于着下自之年过发后作里用道行所然家种事成方多经么去法学如都同现没'
+
+LONG_NOVEL = '合成长篇'
+BIG_NOVEL = '合成大章节'
+
+
+class TextMaker:
+    """从预先生成的段落池中随机取段落，快速生成指定大小的章节"""
+
+    def __init__(self, seed=0):
+        self.rng = random.Random(seed)
+        self.pool = ['　　' + ''.join(self.rng.choice(CHARS) for _ in range(self.rng.randint(20, 120)))
+                     for _ in range(500)]
+
+    def chapter(self, title, size_bytes):
+        parts = [title]
+        size = len(title.encode('utf-8'))
+        while size < size_bytes:
+            paragraph = self.rng.choice(self.pool)
+            parts.append(paragraph)
+            size += len(paragraph.encode('utf-8')) + 2
+        return '\n\n'.join(parts)
+
+
+def write_novel(book_folder, chapters, chapter_bytes, maker):
+    from storage import open_writer
+    with open_writer(book_folder) as writer:
+        for i in range(1, chapters + 1):
+            writer.add_chapter(f'{i:04d}_第{i}章.txt', maker.chapter(f'第{i}章 标题{i}', chapter_bytes))
+
+
+def make_library(root, novels, args):
+    """生成书库并同步书架目录，返回耗时秒数"""
+    import catalog
+    start = time.perf_counter()
+    maker = TextMaker()
+    for n in range(1, novels + 1):
+        write_novel(os.path.join(root, f'合成小说{n:05d}'), args.chapters, args.chapter_kb * 1024, maker)
+    write_novel(os.path.join(root, LONG_NOVEL), args.long_chapters, args.chapter_kb * 1024, maker)
+    write_novel(os.path.join(root, BIG_NOVEL), 3, int(args.big_chapter_mb * 1024 * 1024), maker)
+    with contextlib.redirect_stdout(io.StringIO()):
+        catalog.sync(root)
+    return time.perf_counter() - start
+
+
+def scenarios(novels, args, seed=0):
+    """各测试场景的请求地址列表"""
+    rng = random.Random(seed)
+    long_name = quote(LONG_NOVEL)
+    big_name = quote(BIG_NOVEL)
+    middle = quote(f'合成小说{max(1, novels // 2):05d}')
+    count = args.requests
+    # 冷：每次请求不同的章节页；热：在少数几页之间反复请求（命中渲染缓存）
+    cold = [f'/view/{long_name}/chapter/{i}?page=1'
+            for i in rng.sample(range(args.long_chapters), min(count, args.long_chapters))]
+    hot = [f'/view/{long_name}/chapter/{i % 5}?page=1' for i in range(count)]
+    # 大章节按页翻阅
+    pages = max(1, args.big_pages)
+    big = [f'/view/{big_name}/chapter/{i % 3}?page={1 + i // 3 % pages}' for i in range(count)]
+    return {
+        'index': ['/'] * count,
+        'index_page': [f'/?after={middle}'] * count,
+        'manage': ['/manage'] * count,
+        'toc': [f'/view/{long_name}/toc'] * count,
+        'chapter_cold': cold,
+        'chapter_hot': hot,
+        'chapter_big': big,
+    }
+
+
+def summarize(latencies, seconds, errors):
+    """延迟（毫秒）的分位数与吞吐量"""
+    ordered = sorted(latencies)
+
+    def percentile(p):
+        if not ordered:
+            return None
+        return round(ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))] * 1000, 3)
+
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'p50_ms': percentile(50),
+        'p90_ms': percentile(90),
+        'p99_ms': percentile(99),
+        'max_ms': round(ordered[-1] * 1000, 3) if ordered else None,
+        'rps': round(len(latencies) / seconds, 1) if seconds else None,
+    }
+
+
+def client_main(workdir, novels, args):
+    """子进程：在书库目录中用 Flask 测试客户端逐个请求"""
+    os.chdir(workdir)
+    from app import app
+    client = app.test_client()
+    results = {}
+    for name, urls in scenarios(novels, args).items():
+        latencies = []
+        errors = 0
+        start = time.perf_counter()
+        for url in urls:
+            t = time.perf_counter()
+            response = client.get(url)
+            response.get_data()
+            latencies.append(time.perf_counter() - t)
+            errors += response.status_code != 200
+        results[name] = summarize(latencies, time.perf_counter() - start, errors)
+    print(json.dumps(results))
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def start_app_server(workdir, port, server='dev', workers=4, threads=4):
+    """
+    在子进程中启动阅读器。
+
+    :param server: 'dev' 为 Flask 开发服务器（多线程），'production' 为 serve.py 的生产模式
+    """
+    if server == 'production':
+        command = [sys.executable, os.path.join(ROOT, 'serve.py'), '--bind', f'127.0.0.1:{port}',
+                   '--workers', str(workers), '--threads', str(threads)]
+    else:
+        code = (f'import sys; sys.path.insert(0, {ROOT!r}); from app import app; '
+                f'app.run(host="127.0.0.1", port={port}, threaded=True)')
+        command = [sys.executable, '-c', code]
+    proc = subprocess.Popen(command, cwd=workdir, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=1).close()
+            return proc
+        except OSError:
+            time.sleep(0.1)
+    proc.kill()
+    raise RuntimeError("阅读器启动超时")
+
+
+def load_test(port, urls, concurrency):
+    """concurrency 个线程分担 urls 中的请求，返回统计结果"""
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+    pending = iter(urls)
+
+    def worker():
+        conn = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+        while True:
+            with lock:
+                url = next(pending, None)
+            if url is None:
+                break
+            t = time.perf_counter()
+            try:
+                conn.request('GET', url)
+                response = conn.getresponse()
+                response.read()
+                ok = response.status == 200
+                if response.will_close:
+                    conn.close()
+            except (OSError, http.client.HTTPException):
+                ok = False
+                conn.close()
+            elapsed = time.perf_counter() - t
+            with lock:
+                latencies.append(elapsed)
+                errors[0] += not ok
+        conn.close()
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return summarize(latencies, time.perf_counter() - start, errors[0])
+
+
+def make_split_input(path, size_mb, maker):
+    with open(path, 'w', encoding='utf-8') as f:
+        written = 0
+        chapter = 1
+        while written < size_mb * 1024 * 1024:
+            text = maker.chapter(f'第{chapter}章 标题{chapter}', 8 * 1024) + '\n\n'
+            f.write(text)
+            written += len(text.encode('utf-8'))
+            chapter += 1
+
+
+def bench_split(workdir, size_mb):
+    from function import split_novel_by_chapter
+    path = os.path.join(workdir, '分章测试.txt')
+    make_split_input(path, size_mb, TextMaker(1))
+    start = time.perf_counter()
+    chapters = split_novel_by_chapter(path, os.path.join(workdir, 'split'))
+    seconds = time.perf_counter() - start
+    return {'size_mb': size_mb, 'chapters': len(chapters), 'seconds': round(seconds, 3),
+            'mb_per_sec': round(size_mb / seconds, 2), 'chapters_per_sec': round(len(chapters) / seconds, 1)}
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_table(label, results):
+    print(f"  {label}")
+    for name, r in results.items():
+        print(f"    {name:<14} p50 {r['p50_ms']:9.2f} ms  p90 {r['p90_ms']:9.2f} ms  p99 {r['p99_ms']:9.2f} ms"
+              f"  {r['rps']:8.1f} 请求/秒  错误 {r['errors']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='阅读器性能与压力测试')
+    parser.add_argument('--libraries', type=int, nargs='+', default=[10, 1000], help='书库中普通小说的数量')
+    parser.add_argument('--chapters', type=int, default=10, help='普通小说的章节数')
+    parser.add_argument('--chapter-kb', type=int, default=4, help='普通章节大小（KB）')
+    parser.add_argument('--long-chapters', type=int, default=2000, help='长篇的章节数（最多 10000）')
+    parser.add_argument('--big-chapter-mb', type=float, default=5, help='大章节的大小（MB）')
+    parser.add_argument('--big-pages', type=int, default=20, help='大章节翻阅的页数')
+    parser.add_argument('--requests', type=int, default=200, help='每个场景的请求数')
+    parser.add_argument('--concurrency', type=int, default=8, help='HTTP 压测的并发数，0 为不做 HTTP 压测')
+    parser.add_argument('--server', nargs='+', choices=('dev', 'production'), default=['dev'],
+                        help='HTTP 压测的服务器，可同时指定两种做对比')
+    parser.add_argument('--workers', type=int, default=4, help='生产模式的工作进程数')
+    parser.add_argument('--threads', type=int, default=4, help='生产模式每个工作进程的线程数')
+    parser.add_argument('--split-mb', type=float, default=50, help='分章测试的文件大小（MB），0 为不测')
+    parser.add_argument('--output', help='结果写入的 JSON 文件')
+    parser.add_argument('--child', nargs=2, metavar=('WORKDIR', 'NOVELS'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    args.long_chapters = min(args.long_chapters, 10000)
+
+    if args.child:
+        client_main(args.child[0], int(args.child[1]), args)
+        return
+
+    report = {'commit': git_commit(), 'time': time.strftime('%Y-%m-%d %H:%M:%S'),
+              'params': {k: v for k, v in vars(args).items() if k not in ('child', 'output')},
+              'libraries': []}
+    for novels in args.libraries:
+        workdir = tempfile.mkdtemp()
+        try:
+            root = os.path.join(workdir, 'novels')
+            os.makedirs(root)
+            generate = make_library(root, novels, args)
+            print(f"书库 {novels} 本（另有长篇 {args.long_chapters} 章、大章节 {args.big_chapter_mb} MB），"
+                  f"生成用时 {generate:.1f} 秒")
+            entry = {'novels': novels, 'generate_seconds': round(generate, 2)}
+
+            output = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), '--child', workdir, str(novels)] + sys.argv[1:],
+                capture_output=True, text=True, check=True).stdout
+            entry['client'] = json.loads(output.strip().splitlines()[-1])
+            print_table('测试客户端', entry['client'])
+
+            for server_type in args.server if args.concurrency else ():
+                port = free_port()
+                server = start_app_server(workdir, port, server_type, args.workers, args.threads)
+                try:
+                    results = {name: load_test(port, urls, args.concurrency)
+                               for name, urls in scenarios(novels, args).items()}
+                finally:
+                    server.terminate()
+                    server.wait()
+                # 只测开发服务器时沿用原来的键名，便于和旧结果对比
+                entry['http' if server_type == 'dev' else f'http_{server_type}'] = results
+                print_table(f'HTTP 并发 {args.concurrency}（{server_type}）', results)
+            report['libraries'].append(entry)
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    if args.split_mb:
+        workdir = tempfile.mkdtemp()
+        try:
+            report['split'] = bench_split(workdir, args.split_mb)
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+        split = report['split']
+        print(f"分章 {split['size_mb']} MB：{split['chapters']} 章，{split['seconds']} 秒，"
+              f"{split['mb_per_sec']} MB/秒，{split['chapters_per_sec']} 章/秒")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+"""
+响应压缩的效果与开销。
+
+生成一个小书库，用 Flask 测试客户端请求章节页、目录页和书架，分别在以下方式下统计
+平均响应字节数（相对原文节省的比例）和每个请求的 CPU 时间：
+- identity：不压缩
+- gzip / br 现压缩：每个请求都压缩一次（关闭压缩结果缓存）
+- gzip / br 预压缩：压缩结果缓存后再请求（章节页、目录页的实际情况；书架每次现压缩）
+
+用法：python benchmarks/bench_compress.py [--chapters 50] [--chapter-kb 20] [--requests 500] [--output compress.json]
+"""
+import io
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import contextlib
+from urllib.parse import quote
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from bench_app import TextMaker, write_novel
+
+NOVEL = '合成小说'
+
+
+def scenarios(args):
+    name = quote(NOVEL)
+    return {
+        'chapter': [f'/view/{name}/chapter/{i % args.chapters}?page=1' for i in range(args.requests)],
+        'toc': [f'/view/{name}/toc'] * args.requests,
+        'index': ['/'] * args.requests,
+    }
+
+
+def run(client, urls, accept):
+    """请求一遍，返回 (平均字节数, 每请求 CPU 毫秒)"""
+    headers = {'Accept-Encoding': accept} if accept else {}
+    total = 0
+    start = time.process_time()
+    for url in urls:
+        response = client.get(url, headers=headers)
+        total += len(response.get_data())
+        if response.status_code != 200:
+            raise RuntimeError(f"{url} 返回 {response.status_code}")
+    cpu = time.process_time() - start
+    return total / len(urls), cpu * 1000 / len(urls)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='响应压缩的效果与开销')
+    parser.add_argument('--chapters', type=int, default=50, help='章节数')
+    parser.add_argument('--chapter-kb', type=int, default=20, help='每章大小（KB）')
+    parser.add_argument('--requests', type=int, default=500, help='每种场景的请求数')
+    parser.add_argument('--output', help='结果写入的 JSON 文件')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp()
+    cwd = os.getcwd()
+    results = {}
+    try:
+        os.chdir(workdir)
+        import catalog
+        write_novel(os.path.join('novels', NOVEL), args.chapters, args.chapter_kb * 1024, TextMaker())
+        with contextlib.redirect_stdout(io.StringIO()):
+            catalog.sync('novels')
+        import app as reader
+        import compress
+        reader.PREFETCH = False
+        client = reader.app.test_client()
+
+        modes = [('identity', None, True)]
+        for encoding in compress.ENCODINGS:
+            modes += [(f'{encoding} 现压缩', encoding, False), (f'{encoding} 预压缩', encoding, True)]
+        cache_bytes = reader.compressed_cache.max_bytes
+        for scenario, urls in scenarios(args).items():
+            rows = results[scenario] = {}
+            for label, encoding, cached in modes:
+                reader.compressed_cache.clear()
+                reader.compressed_cache.max_bytes = cache_bytes if cached else 0
+                # 先请求一遍预热渲染缓存和压缩缓存，再计时
+                run(client, urls, encoding)
+                size, cpu_ms = run(client, urls, encoding)
+                rows[label] = {'bytes': round(size), 'cpu_ms': round(cpu_ms, 4)}
+            identity = rows['identity']['bytes']
+            for label, row in rows.items():
+                row['saved'] = round(1 - row['bytes'] / identity, 3)
+                print(f"{scenario:<8} {label:<12} {row['bytes']:>9} 字节  节省 {row['saved']:6.1%}"
+                      f"  {row['cpu_ms']:8.3f} ms CPU/请求")
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({'chapter_kb': args.chapter_kb, 'encodings': list(compress.ENCODINGS), 'results': results},
+                      f, ensure_ascii=False, indent=2)
+
+
+if __name__ == '__main__':
+    main()
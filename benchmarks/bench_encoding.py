@@ -0,0 +1,135 @@
+"""
+编码探测性能对比：chardet 检测 100KB（原 read_file_auto）vs detect_encoding。
+
+默认生成一组混合编码的合成样本（简体/繁体，utf-8、带 BOM、GBK、GB18030、Big5、UTF-16），
+也可用 --corpus 指定真实 txt 目录（文件名形如 xxx.<编码>.txt 时会校验探测结果）。
+对每个文件记录探测耗时，并检查按探测结果解码是否正确。
+
+用法：python benchmarks/bench_encoding.py [--corpus DIR] [--size-kb 512] [--output encoding.json]
+"""
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import tempfile
+
+import chardet
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from function import detect_encoding
+
+SIMPLIFIED = '的一是不了人我在有他这中大来上个国到说们为子和你地出会也时要就可以对生能而那得于着下自之年过发后作里用道行所然家种事成方多经么去法学如都同现没'
+TRADITIONAL = '的一是不了人我在有他這中大來上個國到說們為子和你地出會也時要就可以對生能而那得於著下自之年過發後作裡用道行所然家種事成方多經麼去法學如都同現沒'
+
+SAMPLES = [
+    ('simplified', SIMPLIFIED, 'utf-8'),
+    ('simplified', SIMPLIFIED, 'utf-8-sig'),
+    ('simplified', SIMPLIFIED, 'gbk'),
+    ('simplified', SIMPLIFIED, 'gb18030'),
+    ('simplified', SIMPLIFIED, 'utf-16'),
+    ('traditional', TRADITIONAL, 'utf-8'),
+    ('traditional', TRADITIONAL, 'big5'),
+    ('traditional', TRADITIONAL, 'gbk'),
+]
+
+
+def make_text(chars, size_kb, seed=0):
+    rng = random.Random(seed)
+    parts = []
+    length = 0
+    chapter = 1
+    while length < size_kb * 1024 // 2:
+        line = f'第{chapter}章 ' + ''.join(rng.choice(chars) for _ in range(8)) + '\n'
+        for _ in range(30):
+            line += '　　' + ''.join(rng.choice(chars) for _ in range(rng.randint(20, 80))) + '\n'
+        parts.append(line)
+        length += len(line)
+        chapter += 1
+    return ''.join(parts)
+
+
+def old_detect(filepath):
+    """原 read_file_auto 的做法"""
+    with open(filepath, 'rb') as f:
+        raw = f.read(100000)
+    return chardet.detect(raw)['encoding'] or 'utf-8'
+
+
+def decodes_correctly(filepath, encoding, expected):
+    try:
+        with open(filepath, 'rb') as f:
+            return f.read().decode(encoding) == expected
+    except (UnicodeDecodeError, LookupError):
+        return False
+
+
+def measure(detect, filepath, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        encoding = detect(filepath)
+    return encoding, (time.perf_counter() - start) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description='编码探测性能对比')
+    parser.add_argument('--corpus', help='真实 txt 样本目录')
+    parser.add_argument('--size-kb', type=int, default=512, help='合成样本大小（KB）')
+    parser.add_argument('--repeat', type=int, default=3, help='每个文件重复探测次数')
+    parser.add_argument('--output', help='结果写入的 JSON 文件')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp()
+    files = []
+    try:
+        for kind, chars, encoding in SAMPLES:
+            text = make_text(chars, args.size_kb)
+            path = os.path.join(workdir, f'{kind}.{encoding}.txt')
+            with open(path, 'wb') as f:
+                f.write(text.encode(encoding))
+            files.append((path, text))
+        if args.corpus:
+            for name in sorted(os.listdir(args.corpus)):
+                if name.endswith('.txt'):
+                    path = os.path.join(args.corpus, name)
+                    parts = name.split('.')
+                    text = None
+                    if len(parts) >= 3:
+                        with open(path, 'rb') as f:
+                            text = f.read().decode(parts[-2], errors='replace')
+                    files.append((path, text))
+
+        results = []
+        totals = {'chardet': 0.0, 'detect_encoding': 0.0}
+        correct = {'chardet': 0, 'detect_encoding': 0}
+        checked = 0
+        for path, text in files:
+            row = {'file': os.path.basename(path)}
+            for name, detect in (('chardet', old_detect), ('detect_encoding', detect_encoding)):
+                encoding, seconds = measure(detect, path, args.repeat)
+                ok = decodes_correctly(path, encoding, text) if text is not None else None
+                row[name] = {'encoding': encoding, 'ms': round(seconds * 1000, 3), 'correct': ok}
+                totals[name] += seconds
+                correct[name] += bool(ok)
+            checked += text is not None
+            results.append(row)
+            print(f"{row['file']:<32} chardet {row['chardet']['encoding'] or '-':<10} {row['chardet']['ms']:9.2f} ms"
+                  f"  |  detect_encoding {row['detect_encoding']['encoding']:<10} {row['detect_encoding']['ms']:9.2f} ms")
+
+        for name in totals:
+            print(f"{name:<16} 总耗时 {totals[name] * 1000:9.2f} ms  正确 {correct[name]}/{checked}")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({'files': results, 'total_ms': {k: v * 1000 for k, v in totals.items()},
+                       'correct': correct, 'checked': checked}, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,153 @@
+"""
+dybz 抓取后端对比：HTTP 会话（HttpDriver）vs 浏览器（undetected_chromedriver）。
+
+启动本地替身站点（benchmarks/fixture_server.py），每种后端在独立子进程中下载同一本合成小说，
+记录页面数/秒，以及子进程连同其启动的浏览器进程在内的峰值内存（RSS 之和）。
+未安装浏览器相关依赖时跳过浏览器后端。
+
+用法：python benchmarks/bench_fetch.py [--chapters 100] [--pages 3] [--workers 1 4] [--latency 0.02] [--output fetch.json]
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import threading
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fixture_server import start_server
+
+
+def _children(pid):
+    """pid 的全部子孙进程（读取 /proc，仅 Linux）"""
+    parents = {}
+    for name in os.listdir('/proc'):
+        if not name.isdigit():
+            continue
+        try:
+            with open(f'/proc/{name}/stat', 'rb') as f:
+                # 进程名可能含空格，取最后一个 ')' 之后的字段
+                ppid = int(f.read().rsplit(b')', 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        parents.setdefault(ppid, []).append(int(name))
+    result, stack = [], [pid]
+    while stack:
+        for child in parents.get(stack.pop(), []):
+            result.append(child)
+            stack.append(child)
+    return result
+
+
+def _rss_kb(pid):
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return 0
+
+
+def run_child(backend, base_url, workers, out_dir):
+    """在子进程中用一种后端下载，返回子进程输出的结果与进程树峰值 RSS（MB）"""
+    proc = subprocess.Popen(
+        [sys.executable, os.path.abspath(__file__), '--child', backend, base_url, str(workers), out_dir],
+        stdout=subprocess.PIPE)
+    peak = [0]
+
+    def sample():
+        while proc.poll() is None:
+            pids = [proc.pid] + _children(proc.pid)
+            peak[0] = max(peak[0], sum(_rss_kb(pid) for pid in pids))
+            time.sleep(0.1)
+
+    sampler = threading.Thread(target=sample, daemon=True)
+    sampler.start()
+    output = proc.stdout.read()
+    proc.wait()
+    sampler.join()
+    if proc.returncode != 0:
+        return None, 0
+    return json.loads(output), peak[0] / 1024
+
+
+def child_main(backend, base_url, workers, out_dir):
+    os.makedirs(out_dir, exist_ok=True)
+    os.chdir(out_dir)
+    import contextlib
+    import dybz
+
+    pages = [0]
+    open_url = dybz.open_url
+
+    def counting_open_url(driver, url):
+        pages[0] += 1
+        open_url(driver, url)
+
+    dybz.open_url = counting_open_url
+    factory = dybz.create_http_driver if backend == 'http' else dybz.create_driver
+    drivers = [factory() for _ in range(int(workers))]
+    try:
+        with contextlib.redirect_stdout(sys.stderr if os.environ.get('BENCH_VERBOSE') else open(os.devnull, 'w')):
+            start = time.perf_counter()
+            title, chapter_urls = dybz.get_chapter_urls(drivers[0], f'{base_url}/list/1.html')
+            failed = dybz.download_chapters(drivers, chapter_urls, os.path.join('novels', title))
+            seconds = time.perf_counter() - start
+    finally:
+        for driver in drivers:
+            driver.quit()
+    print(json.dumps({'seconds': seconds, 'pages': pages[0], 'chapters': len(chapter_urls),
+                      'failed': len(failed)}))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='dybz 抓取后端对比')
+    parser.add_argument('--chapters', type=int, default=100, help='合成小说章节数')
+    parser.add_argument('--pages', type=int, default=3, help='每章分页数')
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 4], help='并发数')
+    parser.add_argument('--latency', type=float, default=0.02, help='替身站点每个请求的模拟延迟（秒）')
+    parser.add_argument('--backends', nargs='+', default=['http', 'browser'], choices=['http', 'browser'])
+    parser.add_argument('--output', help='结果写入的 JSON 文件')
+    args = parser.parse_args()
+
+    server, base_url = start_server(chapters=args.chapters, pages=args.pages, latency=args.latency)
+    workdir = tempfile.mkdtemp()
+    results = []
+    try:
+        for workers in args.workers:
+            for backend in args.backends:
+                out_dir = os.path.join(workdir, f'{backend}_{workers}')
+                result, rss = run_child(backend, base_url, workers, out_dir)
+                if result is None:
+                    print(f"{backend:<8} x{workers}  运行失败（未安装浏览器？），跳过")
+                    continue
+                pages_per_sec = result['pages'] / result['seconds']
+                row = {'backend': backend, 'workers': workers, 'seconds': round(result['seconds'], 3),
+                       'pages': result['pages'], 'pages_per_sec': round(pages_per_sec, 1),
+                       'chapters': result['chapters'], 'failed': result['failed'], 'peak_rss_mb': round(rss, 1)}
+                results.append(row)
+                print(f"{backend:<8} x{workers}  {result['seconds']:7.2f} s  {pages_per_sec:7.1f} 页/秒  "
+                      f"{rss:7.1f} MB  {result['chapters']} 章")
+                shutil.rmtree(out_dir, ignore_errors=True)
+    finally:
+        server.shutdown()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) == 6 and sys.argv[1] == '--child':
+        child_main(*sys.argv[2:])
+    else:
+        main()
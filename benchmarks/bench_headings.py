@@ -0,0 +1,168 @@
+"""
+章节标题识别：原先的逐行正则 vs headings.HeadingMatcher。
+
+benchmarks/headings/ 下每个 .txt 样本配一个同名 .headings 文件，逐行列出应识别出的标题。
+先核对各做法在样本上的识别结果（HeadingMatcher 有漏识别或误识别时退出码为 1），
+再在合成的大文件上扫描，比较原正则逐行 search、HeadingMatcher.match 逐行匹配、
+HeadingMatcher.scan 整块查找（分章时的用法）每秒处理的行数和 MB 数。
+
+用法：python benchmarks/bench_headings.py [--size-mb 50] [--repeat 3] [--output headings.json]
+"""
+import os
+import re
+import sys
+import json
+import time
+import random
+import argparse
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from headings import HeadingMatcher
+from bench_split import CHARS
+
+CORPUS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'headings')
+
+# 原 function.py 中的章节标题正则（逐行 search）
+OLD_CHAPTER_PATTERN = re.compile(r'(第[一二三四五六七八九十百千0-9]+[章回集节]\s*.*)', re.IGNORECASE)
+
+
+def old_headings(lines, text):
+    titles = []
+    for line in lines:
+        match = OLD_CHAPTER_PATTERN.search(line)
+        if match:
+            titles.append(match.group(1).strip())
+    return titles
+
+
+def match_headings(lines, text):
+    """HeadingMatcher.match 逐行判断"""
+    matcher = HeadingMatcher()
+    titles = []
+    for line in lines:
+        heading = matcher.match(line)
+        if heading:
+            titles.append(heading[1])
+    return titles
+
+
+def scan_headings(lines, text, matcher=None):
+    """HeadingMatcher.scan 整块查找（分章时的用法，分块读取得到的就是整块文本）"""
+    matcher = matcher or HeadingMatcher()
+    return [title for _, _, _, title in matcher.scan(text)]
+
+
+SCANNERS = (('old', old_headings), ('match', match_headings), ('scan', scan_headings))
+
+
+def load_corpus():
+    samples = []
+    for name in sorted(os.listdir(CORPUS_DIR)):
+        if name.endswith('.txt'):
+            base = os.path.join(CORPUS_DIR, name[:-4])
+            with open(base + '.txt', 'r', encoding='utf-8') as f:
+                lines = f.read().splitlines()
+            with open(base + '.headings', 'r', encoding='utf-8') as f:
+                expected = [line.strip() for line in f if line.strip()]
+            samples.append((name[:-4], lines, '\n'.join(lines), expected))
+    return samples
+
+
+def score(found, expected):
+    """(正确数, 误识别数, 漏识别数)"""
+    remaining = list(expected)
+    correct = 0
+    for title in found:
+        if title in remaining:
+            remaining.remove(title)
+            correct += 1
+    return correct, len(found) - correct, len(remaining)
+
+
+def make_lines(size_mb, seed=0):
+    """约 size_mb MB 的合成小说行：各种标题混排，正文段落长短不一"""
+    rng = random.Random(seed)
+    target = size_mb * 1024 * 1024
+    lines = ['书名：合成小说', '作者：benchmark', '', '序章 开端']
+    written = 0
+    chapter = 1
+    while written < target:
+        if chapter % 50 == 1:
+            lines.append(f'第{chapter // 50 + 1}卷 卷名')
+        lines.append(f'第{chapter}章 标题{chapter}')
+        lines.append('')
+        for _ in range(rng.randint(20, 200)):
+            line = '　　' + ''.join(rng.choice(CHARS) for _ in range(rng.randint(8, 160)))
+            lines.append(line + '。')
+            lines.append('')
+            written += len(line.encode('utf-8'))
+        chapter += 1
+    lines += ['番外一 后日谈', '　　番外正文。', '后记', '　　感谢。']
+    return lines
+
+
+def measure(scan, lines, text, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        scan(lines, text)
+        seconds = time.perf_counter() - start
+        best = seconds if best is None else min(best, seconds)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description='章节标题识别对比')
+    parser.add_argument('--size-mb', type=int, default=50, help='合成小说大小（MB）')
+    parser.add_argument('--repeat', type=int, default=3, help='重复扫描次数（取最快一次）')
+    parser.add_argument('--output', help='结果写入的 JSON 文件')
+    args = parser.parse_args()
+
+    accuracy = {label: [0, 0, 0] for label, _ in SCANNERS}
+    failed = []
+    for name, lines, text, expected in load_corpus():
+        row = []
+        for label, scan in SCANNERS:
+            result = score(scan(lines, text), expected)
+            accuracy[label] = [total + n for total, n in zip(accuracy[label], result)]
+            if label != 'match':
+                row.append(f"{label} 正确 {result[0]} 误识别 {result[1]} 漏识别 {result[2]}")
+            if label != 'old' and result[1:] != (0, 0):
+                failed.append(f'{name} ({label})')
+        print(f"{name:<12} 应识别 {len(expected):>3}  " + '  |  '.join(row))
+    for label, (correct, wrong, missed) in accuracy.items():
+        precision = correct / (correct + wrong) if correct + wrong else 0.0
+        recall = correct / (correct + missed) if correct + missed else 0.0
+        accuracy[label] = {'correct': correct, 'wrong': wrong, 'missed': missed,
+                           'precision': round(precision, 3), 'recall': round(recall, 3)}
+        print(f"{label:<6} 准确率 {precision:.1%}  召回率 {recall:.1%}")
+
+    lines = make_lines(args.size_mb)
+    text = '\n'.join(lines)
+    megabytes = len(text.encode('utf-8')) / 1024 / 1024
+    throughput = {}
+    for label, scan in SCANNERS:
+        seconds = measure(scan, lines, text, args.repeat)
+        throughput[label] = {'seconds': round(seconds, 3), 'lines_per_sec': round(len(lines) / seconds),
+                             'mb_per_sec': round(megabytes / seconds, 1)}
+        print(f"{label:<6} {seconds:8.3f} 秒  {len(lines) / seconds:12.0f} 行/秒  {megabytes / seconds:8.1f} MB/秒")
+    matcher = HeadingMatcher()
+    scan_headings(lines, text, matcher)
+    print(f"识别统计：{matcher.stats()}")
+    speedup = throughput['old']['seconds'] / throughput['scan']['seconds']
+    print(f"scan 相对原正则加速 {speedup:.2f} 倍")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({'accuracy': accuracy, 'size_mb': round(megabytes, 1), 'lines': len(lines),
+                       'throughput': throughput, 'speedup': round(speedup, 2), 'stats': matcher.stats()},
+                      f, ensure_ascii=False, indent=2)
+    if failed:
+        print("[ERROR] 识别结果与 .headings 不一致：" + '、'.join(failed))
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
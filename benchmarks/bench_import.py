@@ -0,0 +1,165 @@
+"""
+批量导入的并行扩展性测试。
+
+生成一批合成 txt 小说，分别用 1、2、4……个工作进程导入到空书库，
+记录每秒文件数、MB 数和相对单进程的加速比。
+
+另有两个大文件场景，检查多个进程同时写搜索索引时不会丢书（失败数应为 0，全部登记到书架且可搜索）：
+- --large N：N 本 --large-mb MB 的大小说，用 --workers 中大于 1 的进程数批量导入；
+- --uploads N：N 本大小说同时走网页上传的后台队列（jobs.submit_upload）。
+
+用法：python benchmarks/bench_import.py [--files 200] [--size-kb 512] [--workers 1 2 4 8]
+                                        [--large 6] [--large-mb 20] [--uploads 2] [--output import.json]
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import threading
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from bench_app import TextMaker
+from bulk_import import bulk_import, find_txt_files
+import jobs
+import search
+import catalog
+
+
+def make_corpus(folder, files, size_kb):
+    """生成 files 本约 size_kb KB 的小说，分散在几个子目录中"""
+    maker = TextMaker()
+    for n in range(files):
+        subdir = os.path.join(folder, f'batch{n % 4}')
+        os.makedirs(subdir, exist_ok=True)
+        with open(os.path.join(subdir, f'合成小说{n:05d}.txt'), 'w', encoding='utf-8') as f:
+            written = 0
+            chapter = 1
+            while written < size_kb * 1024:
+                text = maker.chapter(f'第{chapter}章 标题{chapter}', 8 * 1024) + '\n\n'
+                f.write(text)
+                written += len(text.encode('utf-8'))
+                chapter += 1
+
+
+def check_library(root, titles):
+    """返回未登记到书架或搜不到的小说名（每本合成小说都恰有一处“第1章”）"""
+    found = {result['novel'] for result in search.search(root, '第1章', limit=len(titles) + 1)}
+    return [title for title in titles if catalog.get_novel(root, title) is None or title not in found]
+
+
+def run_bulk(corpus, workdir, workers, index):
+    root = os.path.join(workdir, f'novels{workers}')
+    summary = bulk_import(corpus, root, workers, index=index, verbose=False)
+    row = {key: summary[key] for key in ('workers', 'imported', 'failed', 'deferred', 'megabytes', 'seconds',
+                                         'files_per_sec', 'mb_per_sec')}
+    if index:
+        titles = [os.path.splitext(os.path.basename(path))[0] for path in find_txt_files(corpus)]
+        row['missing'] = len(check_library(root, titles))
+    shutil.rmtree(root, ignore_errors=True)
+    search.close_connections()
+    catalog.close_connections()
+    return row
+
+
+def run_uploads(corpus, workdir, uploads):
+    """把 corpus 中的小说同时提交到上传队列，等全部任务结束"""
+    root = os.path.join(workdir, 'uploads')
+    os.makedirs(root)
+    catalog.version(root)
+    search.ensure_index(root)
+    catalog.close_connections()
+    search.close_connections()
+    jobs.UPLOAD_WORKERS = uploads
+
+    finished = threading.Semaphore(0)
+    job_ids = []
+    start = time.perf_counter()
+    for n, path in enumerate(find_txt_files(corpus)):
+        # submit_upload 结束后会删除上传文件所在的目录，先复制一份
+        upload_dir = os.path.join(workdir, f'upload{n}')
+        os.makedirs(upload_dir)
+        save_path = os.path.join(upload_dir, os.path.basename(path))
+        shutil.copy(path, save_path)
+        job_ids.append(jobs.submit_upload(save_path, root, on_done=lambda job: finished.release()))
+
+    # 失败的任务不会调用 on_done，轮询任务状态
+    while True:
+        states = [jobs.get_job(job_id, root) for job_id in job_ids]
+        if all(job['status'] in ('done', 'failed') for job in states):
+            break
+        finished.acquire(timeout=1)
+    seconds = time.perf_counter() - start
+
+    failures = [f"{job['novel']}：{job['message']}" for job in states if job['status'] == 'failed']
+    missing = check_library(root, [job['novel'] for job in states])
+    megabytes = sum(job['bytes_total'] for job in states) / 1024 / 1024
+    return {'uploads': len(job_ids), 'failed': len(failures), 'missing': len(missing), 'failures': failures,
+            'megabytes': round(megabytes, 2), 'seconds': round(seconds, 3),
+            'mb_per_sec': round(megabytes / seconds, 2)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='批量导入并行扩展性测试')
+    parser.add_argument('--files', type=int, default=200, help='合成小说数')
+    parser.add_argument('--size-kb', type=int, default=512, help='每本小说大小（KB）')
+    parser.add_argument('--workers', type=int, nargs='+',
+                        default=sorted({1, 2, 4, os.cpu_count() or 1}), help='依次测试的工作进程数')
+    parser.add_argument('--no-index', action='store_true', help='不建立搜索索引')
+    parser.add_argument('--large', type=int, default=0, help='大小说批量导入场景的小说数，0 为不测')
+    parser.add_argument('--large-mb', type=int, default=20, help='大小说的大小（MB）')
+    parser.add_argument('--uploads', type=int, default=0, help='同时上传的大小说数，0 为不测')
+    parser.add_argument('--output', help='结果写入的 JSON 文件')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp()
+    results = []
+    large_results = []
+    upload_result = None
+    try:
+        if args.files:
+            corpus = os.path.join(workdir, 'corpus')
+            make_corpus(corpus, args.files, args.size_kb)
+            for workers in args.workers:
+                row = run_bulk(corpus, workdir, workers, not args.no_index)
+                row['speedup'] = round(results[0]['seconds'] / row['seconds'], 2) if results else 1.0
+                results.append(row)
+                print(f"{workers:>3} 进程  {row['seconds']:8.2f} 秒  {row['files_per_sec']:8.2f} 文件/秒"
+                      f"  {row['mb_per_sec']:8.2f} MB/秒  加速 {row['speedup']:.2f}  失败 {row['failed']}")
+            shutil.rmtree(corpus)
+
+        if args.large:
+            large_corpus = os.path.join(workdir, 'large')
+            make_corpus(large_corpus, args.large, args.large_mb * 1024)
+            for workers in [workers for workers in args.workers if workers > 1]:
+                row = run_bulk(large_corpus, workdir, workers, not args.no_index)
+                large_results.append(row)
+                print(f"{args.large} 本 {args.large_mb} MB，{workers:>3} 进程  {row['seconds']:8.2f} 秒"
+                      f"  {row['mb_per_sec']:8.2f} MB/秒  失败 {row['failed']}  主进程补建 {row['deferred']}"
+                      f"  缺失 {row.get('missing', '-')}")
+
+        if args.uploads:
+            upload_corpus = os.path.join(workdir, 'upload')
+            make_corpus(upload_corpus, args.uploads, args.large_mb * 1024)
+            upload_result = run_uploads(upload_corpus, workdir, args.uploads)
+            print(f"同时上传 {upload_result['uploads']} 本 {args.large_mb} MB  {upload_result['seconds']:8.2f} 秒"
+                  f"  {upload_result['mb_per_sec']:8.2f} MB/秒  失败 {upload_result['failed']}"
+                  f"  缺失 {upload_result['missing']}")
+            for failure in upload_result['failures']:
+                print(f"  [FAIL] {failure}")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({'files': args.files, 'size_kb': args.size_kb, 'large_mb': args.large_mb,
+                       'cpus': os.cpu_count(), 'results': results, 'large': large_results,
+                       'uploads': upload_result}, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,112 @@
+"""
+正文提取性能对比：原 get_page_text 的 BeautifulSoup 做法 vs dybz.clean_page_html。
+
+benchmarks/pages/ 下保存了正文区块（#nr1）的 innerHTML 样本，同名 .txt 为原做法的输出（golden 文件）。
+先校验两种做法的输出都与 golden 文件逐字节一致（不一致时退出码为 1），再重复提取统计每页耗时。
+
+用法：python benchmarks/bench_page_text.py [--repeat 200] [--update] [--output page_text.json]
+"""
+import os
+import re
+import sys
+import json
+import time
+import argparse
+
+from bs4 import BeautifulSoup
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from dybz import clean_page_html, _clean_page_html_fast, _Fallback
+
+PAGES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'pages')
+
+
+def old_page_text(html):
+    """原 get_page_text 的做法"""
+    html = html.replace("\n", "")
+    soup = BeautifulSoup(html, 'html.parser')
+    for tag in soup.select("center.chapterPages, font, br+center"):
+        tag.decompose()
+    for br in soup.find_all("br"):
+        br.replace_with("\n")
+    raw_text = soup.get_text()
+    cleaned_text = re.sub(r'\n(?=\S)', '', raw_text)
+    cleaned_text = re.sub(r'\n(?=\S)', '', cleaned_text)
+    return cleaned_text.strip()
+
+
+def load_pages():
+    pages = []
+    for name in sorted(os.listdir(PAGES_DIR)):
+        if name.endswith('.html'):
+            with open(os.path.join(PAGES_DIR, name), 'r', encoding='utf-8') as f:
+                pages.append((name[:-5], f.read()))
+    return pages
+
+
+def golden_path(name):
+    return os.path.join(PAGES_DIR, name + '.txt')
+
+
+def uses_fast_path(html):
+    try:
+        _clean_page_html_fast(html.replace("\n", ""))
+        return True
+    except _Fallback:
+        return False
+
+
+def measure(extract, pages, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for _, html in pages:
+            extract(html)
+    return (time.perf_counter() - start) / (repeat * len(pages))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='正文提取性能对比')
+    parser.add_argument('--repeat', type=int, default=200, help='每个样本重复提取次数')
+    parser.add_argument('--update', action='store_true', help='用原做法重新生成 golden 文件')
+    parser.add_argument('--output', help='结果写入的 JSON 文件')
+    args = parser.parse_args()
+
+    pages = load_pages()
+    if args.update:
+        for name, html in pages:
+            with open(golden_path(name), 'w', encoding='utf-8', newline='') as f:
+                f.write(old_page_text(html))
+        print(f"已更新 {len(pages)} 个 golden 文件")
+        return
+
+    mismatches = []
+    for name, html in pages:
+        with open(golden_path(name), 'r', encoding='utf-8', newline='') as f:
+            expected = f.read()
+        for label, extract in (('old', old_page_text), ('clean_page_html', clean_page_html)):
+            if extract(html).encode('utf-8') != expected.encode('utf-8'):
+                mismatches.append(f'{name} ({label})')
+        print(f"{name:<24} {'快速路径' if uses_fast_path(html) else 'BeautifulSoup'}")
+    if mismatches:
+        print("[ERROR] 与 golden 文件不一致：" + '、'.join(mismatches))
+        sys.exit(1)
+    print(f"{len(pages)} 个样本输出与 golden 文件一致")
+
+    results = {}
+    for label, extract in (('old', old_page_text), ('clean_page_html', clean_page_html)):
+        seconds = measure(extract, pages, args.repeat)
+        results[label] = {'ms_per_page': round(seconds * 1000, 4), 'pages_per_sec': round(1 / seconds, 1)}
+        print(f"{label:<16} {seconds * 1000:8.3f} ms/页  {1 / seconds:10.1f} 页/秒")
+    speedup = results['old']['ms_per_page'] / results['clean_page_html']['ms_per_page']
+    print(f"加速 {speedup:.1f} 倍")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({'pages': len(pages), 'results': results, 'speedup': round(speedup, 2)},
+                      f, ensure_ascii=False, indent=2)
+
+
+if __name__ == '__main__':
+    main()
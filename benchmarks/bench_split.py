@@ -0,0 +1,153 @@
+"""
+分章性能对比：原先整本读入 + 正则切分 vs 流式分章。
+
+生成指定大小的合成小说，每种实现在独立子进程中运行，记录耗时与峰值内存（RSS），
+并核对两种实现切出的章节内容一致。
+
+用法：python benchmarks/bench_split.py [--sizes 10 100 500] [--output split.json]
+"""
+import os
+import re
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import tempfile
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+CHARS = '的一是不了人我在有他这中大来上个国到说们为子和你地出会也时要就可以对生能而那得于着下自之年过发后作里用道行所然家种事成方多经么去法学如都同现没'
+
+
+def make_novel(path, size_mb, seed=0):
+    """生成约 size_mb MB 的合成小说（GBK 无关，统一 utf-8）"""
+    rng = random.Random(seed)
+    target = size_mb * 1024 * 1024
+    written = 0
+    chapter = 1
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('书名：合成小说\n作者：benchmark\n\n')
+        while written < target:
+            parts = [f'第{chapter}章 标题{chapter}\n\n']
+            for _ in range(rng.randint(20, 200)):
+                parts.append('　　' + ''.join(rng.choice(CHARS) for _ in range(rng.randint(20, 120))) + '\n\n')
+            text = ''.join(parts)
+            f.write(text)
+            written += len(text.encode('utf-8'))
+            chapter += 1
+
+
+def legacy_split(file_path, novel_folder):
+    """改造前的 split_novel_by_chapter：整本读入，MULTILINE 正则切分"""
+    try:
+        with open(file_path, 'r', encoding='utf-8') as f:
+            content = f.read()
+    except UnicodeDecodeError:
+        with open(file_path, 'r', encoding='gbk') as f:
+            content = f.read()
+
+    chapter_pattern = re.compile(
+        r'(第[一二三四五六七八九十百千0-9]+[章回集节]\s*.*)',
+        re.IGNORECASE | re.MULTILINE
+    )
+    chapters = [(match.group(1).strip(), match.start()) for match in chapter_pattern.finditer(content)]
+    if not chapters:
+        raise ValueError("未能识别出任何章节")
+
+    title = os.path.splitext(os.path.basename(file_path))[0]
+    book_folder = os.path.join(novel_folder, title)
+    os.makedirs(book_folder, exist_ok=True)
+    saved_files = []
+    for i, (chapter_title, start_pos) in enumerate(chapters):
+        end_pos = chapters[i + 1][1] if i + 1 < len(chapters) else len(content)
+        chapter_content = content[start_pos:end_pos].strip()
+        safe_title = re.sub(r'[<>:"/\\|?*\x00-\x1F]', '_', chapter_title)[:50]
+        chapter_path = os.path.join(book_folder, f"{i:04d}_{safe_title}.txt")
+        with open(chapter_path, 'w', encoding='utf-8') as cf:
+            cf.write(chapter_content)
+        saved_files.append(chapter_path)
+    return saved_files
+
+
+def run_child(impl, file_path, out_dir):
+    """在子进程中运行一种实现，返回 (耗时秒, 章节数, 峰值RSS MB)"""
+    proc = subprocess.Popen(
+        [sys.executable, os.path.abspath(__file__), '--child', impl, file_path, out_dir],
+        stdout=subprocess.PIPE)
+    output = proc.stdout.read()
+    _, status, rusage = os.wait4(proc.pid, 0)
+    if status != 0:
+        raise RuntimeError(f"{impl} 运行失败")
+    result = json.loads(output)
+    # Linux 下 ru_maxrss 单位为 KB
+    return result['seconds'], result['chapters'], rusage.ru_maxrss / 1024
+
+
+def child_main(impl, file_path, out_dir):
+    if impl == 'legacy':
+        split = legacy_split
+    else:
+        from function import split_novel_by_chapter as split
+    start = time.perf_counter()
+    chapters = split(file_path, out_dir)
+    seconds = time.perf_counter() - start
+    print(json.dumps({'seconds': seconds, 'chapters': len(chapters)}))
+
+
+def same_chapters(dir_a, dir_b):
+    """核对两种实现切出的章节内容是否一致"""
+    files_a = sorted(f for f in os.listdir(dir_a) if f.endswith('.txt'))
+    files_b = sorted(f for f in os.listdir(dir_b) if f.endswith('.txt'))
+    if files_a != files_b:
+        return False
+    for name in files_a:
+        with open(os.path.join(dir_a, name), 'rb') as fa, open(os.path.join(dir_b, name), 'rb') as fb:
+            if fa.read() != fb.read():
+                return False
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description='分章性能对比')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10, 100, 500], help='合成小说大小（MB）')
+    parser.add_argument('--output', help='结果写入的 JSON 文件')
+    parser.add_argument('--workdir', help='临时目录（默认系统临时目录）')
+    args = parser.parse_args()
+
+    results = []
+    workdir = tempfile.mkdtemp(dir=args.workdir)
+    try:
+        for size in args.sizes:
+            novel_path = os.path.join(workdir, f'synthetic_{size}MB.txt')
+            make_novel(novel_path, size)
+            row = {'size_mb': size}
+            for impl in ('legacy', 'stream'):
+                out_dir = os.path.join(workdir, impl)
+                seconds, chapters, rss = run_child(impl, novel_path, out_dir)
+                row[impl] = {'seconds': round(seconds, 3), 'chapters': chapters, 'peak_rss_mb': round(rss, 1)}
+                print(f"{size:>5} MB  {impl:<7} {seconds:8.2f} s  {rss:8.1f} MB  {chapters} 章")
+            title = os.path.splitext(os.path.basename(novel_path))[0]
+            row['identical'] = same_chapters(os.path.join(workdir, 'legacy', title),
+                                             os.path.join(workdir, 'stream', title))
+            print(f"{size:>5} MB  章节内容一致：{row['identical']}")
+            results.append(row)
+            for impl in ('legacy', 'stream'):
+                shutil.rmtree(os.path.join(workdir, impl))
+            os.remove(novel_path)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) == 5 and sys.argv[1] == '--child':
+        child_main(*sys.argv[2:])
+    else:
+        main()
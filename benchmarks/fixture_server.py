@@ -0,0 +1,186 @@
+"""
+本地替身站点：按第一版主手机站的页面结构、pixiv 小说 ajax 接口生成合成小说，供爬虫的测试与对比。
+
+页面与选择器对应关系（与 dybz.py 一致）：
+- 目录页 /list/<书id>.html、/list/<书id>_<n>.html：div.right h1 书名、select[name=pagelist] 目录分页、
+  div.mod.block.update.chapter-list ul.list li a 章节链接（第一个块是“最近更新”）
+- 章节页 /view/<章id>.html、/view/<章id>_<n>.html：h1.page-title 章节名、#nr1 正文、
+  center.chapterPages a 章节分页
+
+pixiv 接口（需带 PHPSESSID cookie，否则返回 403）：
+- /ajax/novel/<小说id>：id >= 1000000 的属于系列 id // 1000，在系列中排第 id % 1000 篇；其余为单篇
+- /ajax/novel/series/<系列id>、/ajax/novel/series_content/<系列id>?limit=&last_order=
+
+内容由书id、章节、分页确定性生成，多次请求结果相同。
+
+用法：python benchmarks/fixture_server.py [--port 8765] [--chapters 200] [--pages 3] [--latency 0.05]
+"""
+import re
+import json
+import time
+import random
+import argparse
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qs
+
+CHARS = '的一是不了人我在有他这中大来上个国到说们为子和你地出会也时要就可以对生能而那得于着下自之年过发后作里用道行所然家种事成方多经么去法学如都同现没'
+
+# 每个目录分页列出的章节数
+CHAPTERS_PER_LIST_PAGE = 50
+
+
+def page_text(book_id, chapter, page):
+    """某一章某一分页的正文段落"""
+    rng = random.Random(f'{book_id}-{chapter}-{page}')
+    return ['　　' + ''.join(rng.choice(CHARS) for _ in range(rng.randint(20, 120)))
+            for _ in range(rng.randint(10, 40))]
+
+
+def chapter_id(book_id, chapter):
+    return book_id * 100000 + chapter
+
+
+def render_list_page(book_id, list_page, chapters):
+    list_pages = (chapters + CHAPTERS_PER_LIST_PAGE - 1) // CHAPTERS_PER_LIST_PAGE
+    first = (list_page - 1) * CHAPTERS_PER_LIST_PAGE + 1
+    last = min(chapters, list_page * CHAPTERS_PER_LIST_PAGE)
+    options = ''.join(
+        f'<option value="/list/{book_id}{"" if n == 1 else f"_{n}"}.html">第{n}页</option>'
+        for n in range(1, list_pages + 1))
+    latest = ''.join(f'<li><a href="/view/{chapter_id(book_id, c)}.html">第{c}章 合成章节{c}</a></li>'
+                     for c in range(chapters, max(0, chapters - 5), -1))
+    links = ''.join(f'<li><a href="/view/{chapter_id(book_id, c)}.html">第{c}章 合成章节{c}</a></li>'
+                    for c in range(first, last + 1))
+    return (f'<html><head><meta charset="utf-8"><title>合成小说{book_id}</title></head><body>'
+            f'<div class="right"><h1>合成小说{book_id}</h1></div>'
+            f'<div class="mod block update chapter-list"><ul class="list">{latest}</ul></div>'
+            f'<div class="mod block update chapter-list"><ul class="list">{links}</ul></div>'
+            f'<select name="pagelist">{options}</select>'
+            f'</body></html>')
+
+
+def render_chapter_page(book_id, chapter, page, pages):
+    cid = chapter_id(book_id, chapter)
+    body = '<br><br>\n'.join(page_text(book_id, chapter, page))
+    page_links = ''.join(f'<a href="/view/{cid}_{n}.html">{n}</a>' for n in range(2, pages + 1))
+    return (f'<html><head><meta charset="utf-8"><title>第{chapter}章</title></head><body>'
+            f'<div class="container"><h1 class="page-title">第{chapter}章 合成章节{chapter}</h1>'
+            f'<div id="nr1">\n{body}<br>\n<font>本章未完，点击下一页继续阅读</font>'
+            f'<center class="chapterPages">{page_links}</center></div></div>'
+            f'</body></html>')
+
+
+def pixiv_novel(novel_id, chapters):
+    """pixiv 小说详情接口的 body"""
+    series_id, order = divmod(novel_id, 1000)
+    in_series = novel_id >= 1000000 and 1 <= order <= chapters
+    title = f'合成系列{series_id}·第{order}篇' if in_series else f'合成短篇{novel_id}'
+    paragraphs = page_text(novel_id, 1, 1) + ['[newpage]'] + page_text(novel_id, 1, 2)
+    body = {'id': str(novel_id), 'title': title, 'content': '\n'.join(paragraphs)}
+    body['seriesNavData'] = {'seriesId': series_id, 'title': f'合成系列{series_id}'} if in_series else None
+    return body
+
+
+def pixiv_series_content(series_id, chapters, limit, last_order):
+    """系列章节列表接口的 body（按 last_order 分页）"""
+    orders = range(last_order + 1, min(chapters, last_order + limit) + 1)
+    return {'page': {'seriesContents': [
+        {'id': str(series_id * 1000 + order), 'title': f'合成系列{series_id}·第{order}篇',
+         'series': {'contentOrder': order}}
+        for order in orders]}}
+
+
+class FixtureHandler(BaseHTTPRequestHandler):
+    chapters = 200
+    pages = 3
+    latency = 0.0
+
+    def do_GET(self):
+        if self.latency:
+            time.sleep(self.latency)
+        if self.path.startswith('/ajax/'):
+            self.pixiv_ajax()
+            return
+        m = re.fullmatch(r'/list/(\d+)(?:_(\d+))?\.html', self.path)
+        if m:
+            html = render_list_page(int(m.group(1)), int(m.group(2) or 1), self.chapters)
+        else:
+            m = re.fullmatch(r'/view/(\d+)(?:_(\d+))?\.html', self.path)
+            if not m:
+                self.send_error(404)
+                return
+            book_id, chapter = divmod(int(m.group(1)), 100000)
+            if not 1 <= chapter <= self.chapters:
+                self.send_error(404)
+                return
+            html = render_chapter_page(book_id, chapter, int(m.group(2) or 1), self.pages)
+        data = html.encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def pixiv_ajax(self):
+        if 'PHPSESSID=' not in self.headers.get('Cookie', ''):
+            self.send_json(403, {'error': True, 'message': '未登录', 'body': []})
+            return
+        url = urlsplit(self.path)
+        query = parse_qs(url.query)
+        m = re.fullmatch(r'/ajax/novel/(?:(series|series_content)/)?(\d+)', url.path)
+        if m and m.group(1) is None:
+            body = pixiv_novel(int(m.group(2)), self.chapters)
+        elif m and m.group(1) == 'series':
+            body = {'id': m.group(2), 'title': f'合成系列{m.group(2)}', 'total': self.chapters}
+        elif m:
+            body = pixiv_series_content(int(m.group(2)), self.chapters,
+                                        int(query.get('limit', ['30'])[0]), int(query.get('last_order', ['0'])[0]))
+        else:
+            self.send_json(404, {'error': True, 'message': 'not found', 'body': []})
+            return
+        self.send_json(200, {'error': False, 'message': '', 'body': body})
+
+    def send_json(self, status, payload):
+        data = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_server(port=0, chapters=200, pages=3, latency=0.0):
+    """
+    在后台线程中启动替身站点。
+
+    :param port: 端口，0 为随机端口
+    :param chapters: 每本书的章节数
+    :param pages: 每章的分页数
+    :param latency: 每个请求的模拟延迟（秒）
+    :return: (server, 站点根地址)，用完调用 server.shutdown()
+    """
+    handler = type('Handler', (FixtureHandler,), {'chapters': chapters, 'pages': pages, 'latency': latency})
+    server = ThreadingHTTPServer(('127.0.0.1', port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f'http://127.0.0.1:{server.server_address[1]}'
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='爬虫测试用本地替身站点')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--chapters', type=int, default=200, help='每本书的章节数')
+    parser.add_argument('--pages', type=int, default=3, help='每章的分页数')
+    parser.add_argument('--latency', type=float, default=0.0, help='每个请求的模拟延迟（秒）')
+    args = parser.parse_args()
+
+    server, base_url = start_server(args.port, args.chapters, args.pages, args.latency)
+    print(f"替身站点已启动：{base_url}/list/1.html  （Ctrl+C 退出）")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -0,0 +1,172 @@
+"""
+批量导入 txt 小说。
+
+遍历目录（含子目录）下的全部 .txt 文件，用多进程并行分章（与网页上传同一套编码探测和分章逻辑），
+建立搜索索引并登记到书架目录。书库中已有的小说跳过，同名文件只导入第一个。
+结束时输出导入数、跳过数、每秒文件数与 MB 数，以及失败的文件和原因。
+
+用法：python bulk_import.py <目录> [--root novels] [--workers N] [--no-index] [--report import.json]
+"""
+import os
+import sys
+import json
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from jobs import import_novel, register_novel, REGISTER_RETRIES
+import search
+import catalog
+
+
+def find_txt_files(source):
+    """目录下全部 txt 文件（按路径排序），source 也可以是单个文件"""
+    if os.path.isfile(source):
+        return [source]
+    files = []
+    for dirpath, dirnames, filenames in os.walk(source):
+        dirnames.sort()
+        files.extend(os.path.join(dirpath, name) for name in sorted(filenames) if name.lower().endswith('.txt'))
+    return files
+
+
+def is_imported(root, title):
+    """
+    书库中已有这本小说。
+
+    以书架目录为准：导入成功后才登记到书架，中途中断（Ctrl-C、读写出错）留下的目录不算，下次会重新导入。
+    """
+    return catalog.get_novel(root, title) is not None
+
+
+def _import_file(file_path, root, index):
+    """工作进程中导入一个文件，返回 (章节数, 是否已登记, 耗时秒数)"""
+    start = time.perf_counter()
+    chapters, registered = import_novel(file_path, root, index=index)
+    return len(chapters), registered, time.perf_counter() - start
+
+
+def bulk_import(source, root='novels', workers=None, index=True, verbose=True):
+    """
+    并行导入目录下的全部 txt 小说。
+
+    :param source: 待导入的目录或文件
+    :param root: 书库目录
+    :param workers: 工作进程数，默认为 CPU 核数
+    :param index: 是否建立搜索索引（不建时可之后用 python search.py rebuild 重建）
+    :return: 汇总信息字典
+    """
+    os.makedirs(root, exist_ok=True)
+    workers = workers or os.cpu_count() or 1
+    files = find_txt_files(source)
+
+    # 已导入的、与本次其他文件重名的先剔除，不交给工作进程
+    pending = []
+    skipped = []
+    failures = []
+    titles = set()
+    for path in files:
+        title = os.path.splitext(os.path.basename(path))[0]
+        if title in titles:
+            failures.append({'file': path, 'error': '与本次导入的其他文件重名'})
+        elif is_imported(root, title):
+            skipped.append(path)
+        else:
+            titles.add(title)
+            pending.append(path)
+
+    # 数据库先在主进程中建好，免得多个工作进程同时建表；连接关闭后再创建子进程
+    catalog.version(root)
+    catalog.close_connections()
+    if index:
+        search.ensure_index(root)
+        search.close_connections()
+
+    imported = []
+    deferred = []
+    total_bytes = 0
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(_import_file, path, root, index): path for path in pending}
+        for done, future in enumerate(as_completed(futures), 1):
+            path = futures[future]
+            try:
+                chapters, registered, seconds = future.result()
+            except Exception as e:
+                failures.append({'file': path, 'error': f'{type(e).__name__}: {e}'})
+                if verbose:
+                    print(f"[FAIL] ({done}/{len(pending)}) {path}：{e}")
+                continue
+            item = {'file': path, 'chapters': chapters, 'bytes': os.path.getsize(path), 'seconds': round(seconds, 3)}
+            if not registered:
+                deferred.append(item)
+                if verbose:
+                    print(f"[DEFER] ({done}/{len(pending)}) {path}：{chapters} 章已保存，等待建立索引")
+                continue
+            total_bytes += item['bytes']
+            imported.append(item)
+            if verbose:
+                print(f"[OK] ({done}/{len(pending)}) {path}：{chapters} 章，{seconds:.2f} 秒")
+
+    # 工作进程等不到写锁的小说，章节已在磁盘上，工作池结束后在主进程中逐本补建索引、登记
+    for item in deferred:
+        title = os.path.splitext(os.path.basename(item['file']))[0]
+        try:
+            register_novel(root, title, index=index, retries=REGISTER_RETRIES)
+        except Exception as e:
+            failures.append({'file': item['file'], 'error': f'章节已保存，建立索引失败：{type(e).__name__}: {e}'})
+            if verbose:
+                print(f"[FAIL] {item['file']}：{e}")
+            continue
+        total_bytes += item['bytes']
+        imported.append(item)
+        if verbose:
+            print(f"[OK] {item['file']}：{item['chapters']} 章（主进程建立索引）")
+    elapsed = time.perf_counter() - start
+
+    return {
+        'workers': workers,
+        'files': len(files),
+        'imported': len(imported),
+        'skipped': len(skipped),
+        'failed': len(failures),
+        'deferred': len(deferred),
+        'chapters': sum(item['chapters'] for item in imported),
+        'megabytes': round(total_bytes / 1024 / 1024, 2),
+        'seconds': round(elapsed, 3),
+        'files_per_sec': round(len(imported) / elapsed, 2) if elapsed else 0.0,
+        'mb_per_sec': round(total_bytes / 1024 / 1024 / elapsed, 2) if elapsed else 0.0,
+        'failures': failures,
+        'details': imported,
+    }
+
+
+def print_summary(summary, max_failures=50):
+    print(f"[SUMMARY] 共 {summary['files']} 个文件：导入 {summary['imported']}（{summary['chapters']} 章，"
+          f"{summary['megabytes']} MB），跳过 {summary['skipped']}，失败 {summary['failed']}；"
+          f"{summary['workers']} 个进程用时 {summary['seconds']:.1f} 秒，"
+          f"{summary['files_per_sec']} 文件/秒，{summary['mb_per_sec']} MB/秒")
+    if summary['deferred']:
+        print(f"  其中 {summary['deferred']} 本在工作进程中等不到数据库写锁，由主进程补建索引")
+    for failure in summary['failures'][:max_failures]:
+        print(f"  [FAIL] {failure['file']}：{failure['error']}")
+    if summary['failed'] > max_failures:
+        print(f"  ……另有 {summary['failed'] - max_failures} 个失败，详见 --report")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='批量导入 txt 小说')
+    parser.add_argument('source', help='待导入的目录（含子目录）或单个 txt 文件')
+    parser.add_argument('--root', default='novels', help='书库目录')
+    parser.add_argument('--workers', type=int, help='工作进程数，默认为 CPU 核数')
+    parser.add_argument('--no-index', action='store_true', help='不建立搜索索引（之后可用 python search.py rebuild 重建）')
+    parser.add_argument('--quiet', action='store_true', help='只输出汇总')
+    parser.add_argument('--report', help='汇总信息（含每个文件的结果）写入的 JSON 文件')
+    args = parser.parse_args()
+
+    summary = bulk_import(args.source, args.root, args.workers, index=not args.no_index, verbose=not args.quiet)
+    print_summary(summary)
+    if args.report:
+        with open(args.report, 'w', encoding='utf-8') as f:
+            json.dump(summary, f, ensure_ascii=False, indent=2)
+    sys.exit(1 if summary['failed'] else 0)
@@ -0,0 +1,94 @@
+"""
+渲染结果缓存。
+
+热门章节的同一页会被很多读者反复打开，把渲染好的页面按字节数限制放在进程内存里，
+超出上限时淘汰最久未访问的页面（LRU）。
+"""
+import threading
+from collections import OrderedDict
+
+
+class LRUCache:
+    """
+    按字节数限制大小的 LRU 缓存，线程安全。
+
+    每个值附带一个版本标记（如 ETag），读取时版本不符视为未命中，
+    这样即使别的进程改写了小说，也不会返回过期内容。
+    """
+
+    def __init__(self, max_bytes):
+        """
+        :param max_bytes: 缓存内容总字节数上限，为 0 时不缓存
+        """
+        self.max_bytes = max_bytes
+        self._items = OrderedDict()  # {key: (version, value)}
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, version):
+        """
+        取缓存内容。
+
+        :param key: 缓存键
+        :param version: 当前版本标记
+        :return: 命中时返回缓存的 bytes，否则返回 None
+        """
+        with self._lock:
+            item = self._items.get(key)
+            if item is None or item[0] != version:
+                if item is not None:
+                    self._remove(key)
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            return item[1]
+
+    def contains(self, key, version):
+        """是否缓存了该版本的内容（不计入命中统计，也不改变淘汰顺序）"""
+        with self._lock:
+            item = self._items.get(key)
+            return item is not None and item[0] == version
+
+    def put(self, key, version, value):
+        """存入缓存内容（bytes），单个值超过上限时不缓存"""
+        if len(value) > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._items:
+                self._remove(key)
+            self._items[key] = (version, value)
+            self._bytes += len(value)
+            while self._bytes > self.max_bytes:
+                self._remove(next(iter(self._items)))
+                self.evictions += 1
+
+    def invalidate(self, match):
+        """删除所有 match(key) 为真的缓存"""
+        with self._lock:
+            for key in [key for key in self._items if match(key)]:
+                self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self._bytes = 0
+
+    def stats(self):
+        """命中、未命中、淘汰次数及当前占用"""
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'entries': len(self._items),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+            }
+
+    def _remove(self, key):
+        version, value = self._items.pop(key)
+        self._bytes -= len(value)
@@ -0,0 +1,286 @@
+"""
+书架目录（小说清单）。
+
+每本小说一行记录：名字、章节数、总大小、添加/更新时间、上次阅读位置，
+存放在 novels/.catalog.db（SQLite），上传分章、爬虫保存章节、删除、重命名、阅读时同步更新。
+书架页按排序键的索引做 keyset 分页（记住上一页最后一本书，从它之后继续取），
+翻到第几页都只读取一页的记录，不再遍历书库目录。
+上传任务的状态也存放在这里，多进程部署时所有工作进程看到的任务进度一致。
+
+目录文件不存在时自动扫描书库生成；与磁盘不一致时可手动同步：python catalog.py sync [--root novels]
+"""
+import os
+import time
+import sqlite3
+import argparse
+import threading
+
+from storage import load_manifest
+
+CATALOG_NAME = '.catalog.db'
+
+# 排序方式：{名称: (排序列, 是否倒序)}，同值时按书名排序，保证分页位置唯一
+SORTS = {
+    'name': ('name', False),
+    'added': ('added', True),
+    'read': ('read_time', True),
+}
+
+# 阅读位置没变时，最多每隔这么多秒刷新一次阅读时间（“最近阅读”排序用）
+READ_TOUCH_INTERVAL = 600
+
+_local = threading.local()
+
+
+def _connect(root):
+    """每个线程、每个书库各用一个连接"""
+    connections = getattr(_local, 'connections', None)
+    if connections is None:
+        connections = _local.connections = {}
+    conn = connections.get(root)
+    if conn is None:
+        path = os.path.join(root, CATALOG_NAME)
+        created = not os.path.exists(path)
+        conn = sqlite3.connect(path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.executescript('''
+            CREATE TABLE IF NOT EXISTS novels (
+                name TEXT PRIMARY KEY,
+                chapters INTEGER NOT NULL,
+                size INTEGER NOT NULL,
+                added REAL NOT NULL,
+                updated REAL NOT NULL,
+                read_chapter INTEGER,
+                read_page INTEGER,
+                read_time REAL
+            );
+            CREATE INDEX IF NOT EXISTS novels_added ON novels (added, name);
+            CREATE INDEX IF NOT EXISTS novels_read ON novels (read_time, name);
+            -- 目录版本号：记录有任何变动就加一，书架页用它做 HTTP 缓存校验
+            CREATE TABLE IF NOT EXISTS meta (id INTEGER PRIMARY KEY CHECK (id = 0), version INTEGER NOT NULL);
+            INSERT OR IGNORE INTO meta (id, version) VALUES (0, 0);
+            CREATE TRIGGER IF NOT EXISTS novels_insert AFTER INSERT ON novels
+                BEGIN UPDATE meta SET version = version + 1; END;
+            CREATE TRIGGER IF NOT EXISTS novels_update AFTER UPDATE ON novels
+                BEGIN UPDATE meta SET version = version + 1; END;
+            CREATE TRIGGER IF NOT EXISTS novels_delete AFTER DELETE ON novels
+                BEGIN UPDATE meta SET version = version + 1; END;
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                filename TEXT NOT NULL,
+                novel TEXT NOT NULL,
+                status TEXT NOT NULL,
+                bytes_total INTEGER NOT NULL,
+                bytes_processed INTEGER NOT NULL,
+                chapters INTEGER NOT NULL,
+                message TEXT NOT NULL,
+                created REAL NOT NULL,
+                finished REAL
+            );
+            CREATE INDEX IF NOT EXISTS jobs_created ON jobs (created);
+        ''')
+        connections[root] = conn
+        if created:
+            sync(root)
+    return conn
+
+
+def close_connections():
+    """关闭当前线程打开的连接（fork 工作进程前调用，SQLite 连接不能跨进程共用）"""
+    connections = getattr(_local, 'connections', None) or {}
+    for conn in connections.values():
+        conn.close()
+    connections.clear()
+
+
+def _split(book_folder):
+    root, name = os.path.split(os.path.normpath(book_folder))
+    return root, name
+
+
+def update_novel(book_folder):
+    """
+    按章节清单刷新一本小说的记录（新小说则添加）。
+
+    :param book_folder: 小说目录
+    """
+    root, name = _split(book_folder)
+    chapters = load_manifest(book_folder)['chapters']
+    size = sum(entry['size'] for entry in chapters)
+    now = time.time()
+    conn = _connect(root)
+    with conn:
+        conn.execute('''
+            INSERT INTO novels (name, chapters, size, added, updated) VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT (name) DO UPDATE SET chapters = excluded.chapters, size = excluded.size,
+                                             updated = excluded.updated
+        ''', (name, len(chapters), size, now, now))
+
+
+def remove_novel(book_folder):
+    """删除小说的记录"""
+    root, name = _split(book_folder)
+    conn = _connect(root)
+    with conn:
+        conn.execute('DELETE FROM novels WHERE name = ?', (name,))
+
+
+def rename_novel(old_folder, new_folder):
+    """小说改名后同步记录（保留添加时间和阅读位置）"""
+    root, old_name = _split(old_folder)
+    new_name = _split(new_folder)[1]
+    conn = _connect(root)
+    with conn:
+        conn.execute('UPDATE novels SET name = ? WHERE name = ?', (new_name, old_name))
+
+
+def record_read(book_folder, chapter_index, page):
+    """
+    记录阅读位置。
+
+    每次打开章节页都会调用：位置没变且上次记录不到 READ_TOUCH_INTERVAL 秒时只读不写，
+    重复请求（刷新、304）不产生写事务，也不会改变目录版本号。
+    """
+    root, name = _split(book_folder)
+    conn = _connect(root)
+    row = conn.execute('SELECT read_chapter, read_page, read_time FROM novels WHERE name = ?', (name,)).fetchone()
+    if row is None:
+        return
+    if (row['read_chapter'], row['read_page']) == (chapter_index, page) and row['read_time'] \
+            and time.time() - row['read_time'] < READ_TOUCH_INTERVAL:
+        return
+    with conn:
+        conn.execute('UPDATE novels SET read_chapter = ?, read_page = ?, read_time = ? WHERE name = ?',
+                     (chapter_index, page, time.time(), name))
+
+
+def list_novels(root, sort='name', after=None, before=None, limit=20):
+    """
+    取书架的一页。
+
+    :param root: 书库目录
+    :param sort: 排序方式，见 SORTS（'read' 只列出读过的小说）
+    :param after: 上一页最后一本书的书名，取它之后的一页
+    :param before: 下一页第一本书的书名，取它之前的一页
+    :param limit: 每页本数
+    :return: (本页小说记录列表, 是否有上一页, 是否有下一页)
+    """
+    column, descending = SORTS[sort]
+    cursor = after or before
+    # 往前翻页时反向取，再把结果倒回来
+    backward = before is not None and after is None
+    reverse = descending != backward
+
+    conditions = ['read_time IS NOT NULL'] if sort == 'read' else []
+    params = []
+    if cursor is not None:
+        op = '<' if reverse else '>'
+        if column == 'name':
+            conditions.append(f'name {op} ?')
+            params.append(cursor)
+        else:
+            conditions.append(f'({column}, name) {op} (SELECT {column}, name FROM novels WHERE name = ?)')
+            params.append(cursor)
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+    direction = 'DESC' if reverse else 'ASC'
+    order = 'name' if column == 'name' else f'{column} {direction}, name'
+    rows = _connect(root).execute(
+        f'SELECT * FROM novels {where} ORDER BY {order} {direction} LIMIT ?',
+        params + [limit + 1]).fetchall()
+
+    novels = [dict(row) for row in rows[:limit]]
+    more = len(rows) > limit
+    if backward:
+        novels.reverse()
+        return novels, more, True
+    return novels, cursor is not None, more
+
+
+def all_novels(root):
+    """按书名列出全部小说记录（管理页用）"""
+    return [dict(row) for row in _connect(root).execute('SELECT * FROM novels ORDER BY name')]
+
+
+def get_novel(root, name):
+    """单本小说的记录，不存在时返回 None"""
+    row = _connect(root).execute('SELECT * FROM novels WHERE name = ?', (name,)).fetchone()
+    return dict(row) if row else None
+
+
+def add_job(root, job, keep=100):
+    """
+    登记上传任务，并只保留最近 keep 个已结束的任务。
+
+    :param job: 任务状态字典，键与 jobs 表的列相同
+    """
+    conn = _connect(root)
+    with conn:
+        conn.execute(f"INSERT INTO jobs ({', '.join(job)}) VALUES ({', '.join('?' * len(job))})",
+                     tuple(job.values()))
+        conn.execute('''
+            DELETE FROM jobs WHERE status IN ('done', 'failed') AND id NOT IN (
+                SELECT id FROM jobs WHERE status IN ('done', 'failed') ORDER BY finished DESC LIMIT ?)
+        ''', (keep,))
+
+
+def update_job(root, job_id, active_only=False, **fields):
+    """
+    更新任务状态。
+
+    :param active_only: 只更新未结束（queued/running）的任务，进度消息可能晚于任务结束到达
+    """
+    condition = " AND status IN ('queued', 'running')" if active_only else ''
+    conn = _connect(root)
+    with conn:
+        conn.execute(f"UPDATE jobs SET {', '.join(f'{key} = ?' for key in fields)} WHERE id = ?{condition}",
+                     (*fields.values(), job_id))
+
+
+def fail_active_jobs(root, message):
+    """把所有未结束的任务标记为失败（服务启动时调用：上次运行中的任务已随进程中断）"""
+    conn = _connect(root)
+    with conn:
+        conn.execute("UPDATE jobs SET status = 'failed', message = ?, finished = ? "
+                     "WHERE status IN ('queued', 'running')", (message, time.time()))
+
+
+def get_job(root, job_id):
+    """任务状态，不存在时返回 None"""
+    row = _connect(root).execute('SELECT * FROM jobs WHERE id = ?', (job_id,)).fetchone()
+    return dict(row) if row else None
+
+
+def list_jobs(root):
+    """所有任务状态（新任务在前）"""
+    return [dict(row) for row in _connect(root).execute('SELECT * FROM jobs ORDER BY created DESC')]
+
+
+def version(root):
+    """目录版本号，任何记录变动后都会增加"""
+    return _connect(root).execute('SELECT version FROM meta').fetchone()[0]
+
+
+def sync(root):
+    """扫描书库，补上缺失的小说、删去已不存在的记录"""
+    names = {name for name in os.listdir(root)
+             if not name.startswith('.') and os.path.isdir(os.path.join(root, name))}
+    conn = _connect(root)
+    known = {row['name'] for row in conn.execute('SELECT name FROM novels')}
+    for name in sorted(names - known):
+        update_novel(os.path.join(root, name))
+        print(f"[CATALOG] {name}")
+    with conn:
+        conn.executemany('DELETE FROM novels WHERE name = ?', ((name,) for name in known - names))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='书架目录工具')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    sync_parser = subparsers.add_parser('sync', help='扫描书库同步书架目录')
+    sync_parser.add_argument('--root', default='novels', help='书库目录')
+    args = parser.parse_args()
+
+    if args.command == 'sync':
+        sync(args.root)
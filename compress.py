@@ -0,0 +1,60 @@
+"""
+响应压缩。
+
+中文正文能压缩到原来的 1/3 到 1/4。按请求的 Accept-Encoding 协商压缩格式：
+安装了 brotli 时优先 br，否则 gzip；客户端都不接受时返回原文。
+同一资源的不同压缩版本内容不同，ETag 各自加上格式后缀，响应都带 Vary: Accept-Encoding。
+
+环境变量 COMPRESS=0 关闭压缩，GZIP_LEVEL、BROTLI_QUALITY 设置压缩级别。
+"""
+import os
+import gzip
+
+try:
+    import brotli
+except ImportError:  # brotli 为可选依赖，没有时只用 gzip
+    brotli = None
+
+COMPRESS = os.environ.get('COMPRESS', '1') != '0'
+GZIP_LEVEL = int(os.environ.get('GZIP_LEVEL', 6))
+BROTLI_QUALITY = int(os.environ.get('BROTLI_QUALITY', 5))
+
+# 可用的压缩格式，按服务器的优先顺序
+ENCODINGS = ('br', 'gzip') if brotli is not None else ('gzip',)
+
+
+def negotiate(accept_encodings):
+    """
+    选出响应使用的压缩格式。
+
+    :param accept_encodings: 请求的 Accept-Encoding（werkzeug 的 request.accept_encodings）
+    :return: 'br' / 'gzip'；不压缩时返回 None
+    """
+    if not COMPRESS:
+        return None
+    best, best_quality = None, 0
+    for encoding in ENCODINGS:
+        # 客户端给出的权重高者优先，相同时按服务器的顺序
+        quality = accept_encodings[encoding]
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+
+def compress(body, encoding):
+    """
+    :param body: 响应体 bytes
+    :param encoding: negotiate 选出的格式
+    :return: 压缩后的 bytes
+    """
+    if encoding == 'br':
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    if encoding == 'gzip':
+        # mtime 固定为 0，同样的内容压缩结果也相同
+        return gzip.compress(body, GZIP_LEVEL, mtime=0)
+    raise ValueError(f"不支持的压缩格式：{encoding}")
+
+
+def encoded_etag(etag, encoding):
+    """压缩后的版本使用的 ETag"""
+    return f'{etag}-{encoding}' if encoding else etag
@@ -1,4 +1,7 @@
-import undetected_chromedriver as uc
+try:
+    import undetected_chromedriver as uc
+except ImportError:  # 只用 HTTP 抓取后端时可以不装浏览器相关依赖
+    uc = None
 from selenium.webdriver.common.by import By
 from bs4 import BeautifulSoup
 from selenium.webdriver.support.ui import WebDriverWait
@@ -6,40 +9,218 @@ from selenium.webdriver.support import expected_conditions as EC
 import time
 import os
 import re
+import queue
+import argparse
+import threading
+from urllib.parse import urlsplit, urljoin
+from storage import save_chapter
+import search
+from catalog import update_novel
+from journal import DownloadJournal, with_retries
+from fetch import HttpDriver
 
-def get_page_text(driver, curr_url):
-    """
-    Purpose: 获取本页小说内容
-    """
-    driver.get(curr_url)
-    nr1_element = WebDriverWait(driver, 10).until(
-        EC.presence_of_element_located((By.ID, "nr1"))
-    )
-    html = nr1_element.get_attribute("innerHTML")
-    # 删除 HTML 原本的换行符
-    html = html.replace("\n", "")
+BASE_URL = 'https://m.diyibanzhu.space'
+
+# 每个页面至少含有其中一个元素（章节正文、目录标题、章节列表），否则说明要靠 JS 渲染，改用浏览器
+REQUIRED_ELEMENTS = '#nr1, div.right h1, div.chapter-list'
+
+
+class RateLimiter:
+    """按站点限速：同一站点两次请求之间至少间隔 interval 秒，多个下载线程共享"""
 
+    def __init__(self, interval=0.0):
+        self.interval = interval
+        self._next = {}
+        self._lock = threading.Lock()
+
+    def wait(self, url):
+        if self.interval <= 0:
+            return
+        host = urlsplit(url).netloc
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next.get(host, 0.0))
+            self._next[host] = start + self.interval
+        if start > now:
+            time.sleep(start - now)
+
+
+rate_limiter = RateLimiter()
+
+
+def open_url(driver, url):
+    """限速后打开页面"""
+    rate_limiter.wait(url)
+    driver.get(url)
+
+
+def _clean_page_html_bs4(html):
+    """clean_page_html 的 BeautifulSoup 实现，快速路径处理不了的页面交给它"""
     soup = BeautifulSoup(html, 'html.parser')
 
     # 去掉分页区块和提示内容
     for tag in soup.select("center.chapterPages, font, br+center"):
-        tag.decompose()    
-    
+        tag.decompose()
+
     # 将所有 <br> 替换成换行
     for br in soup.find_all("br"):
         br.replace_with("\n")
 
-    # 提取纯文本
-    raw_text = soup.get_text()
-    # with open("raw.txt",'w',encoding='utf-8') as f:
-    #     f.write(raw_text)
-    # 根据规则：删除换行符后面紧跟文字的情况
-    cleaned_text = re.sub(r'\n(?=\S)', '', raw_text)
-    cleaned_text = re.sub(r'\n(?=\S)', '', cleaned_text)
-    # with open("cl.txt",'w',encoding='utf-8') as f:
-    #     f.write(cleaned_text.strip())
-    # exit()
-    return cleaned_text.strip()
+    # 提取纯文本，根据规则：删除换行符后面紧跟文字的情况（最多两个）
+    return BREAK_BEFORE_TEXT.sub('', soup.get_text()).strip()
+
+
+# 正文 HTML 的词法单元：注释、开始标签（含属性）、结束标签、文本
+PAGE_TOKEN = re.compile(r'''
+    <!--(?!-?>)(?P<comment>.*?)-->
+  | <(?P<start>[a-zA-Z][-.a-zA-Z0-9:_]*)(?P<attrs>(?:\s(?:[^<>"'/]|/(?!>)|"[^"]*"|'[^']*')*)?)(?P<close>/?)>
+  | </(?P<end>[a-zA-Z][-.a-zA-Z0-9:_]*)\s*>
+  | (?P<text>[^<&]+|&(?:\#[0-9]{1,7}|\#[xX][0-9a-fA-F]{1,6}|nbsp|amp|lt|gt|quot);|<(?![a-zA-Z/!?]))
+''', re.S | re.X)
+ATTRIBUTE = re.compile(r'''\s*(?:([^\s"'<>/=]+)(?:\s*=\s*(?:"([^"]*)"|'([^']*)'|([^\s"'=<>`]+)))?|/(?!>))''')
+NAMED_ENTITIES = {'&nbsp;': '\xa0', '&amp;': '&', '&lt;': '<', '&gt;': '>', '&quot;': '"'}
+# 空元素，没有结束标签
+VOID_ELEMENTS = {'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'keygen', 'link', 'menuitem',
+                 'meta', 'param', 'source', 'track', 'wbr', 'basefont', 'bgsound', 'command', 'frame',
+                 'image', 'isindex', 'nextid', 'spacer'}
+# 内容按原样解析（不识别标签）或保留空白的元素，出现时交给 BeautifulSoup
+SLOW_PATH_ELEMENTS = {'script', 'style', 'textarea', 'title', 'xmp', 'iframe', 'noembed', 'noframes',
+                      'noscript', 'plaintext', 'pre'}
+ASCII_SPACES = ' \n\t\f\r'
+BREAK_BEFORE_TEXT = re.compile(r'\n{1,2}(?=\S)')
+
+
+class _Fallback(Exception):
+    pass
+
+
+def _class_tokens(attrs, self_closing=False):
+    """属性串中 class 的各个类名（同名属性以最后一个为准）"""
+    classes = None
+    pos = 0
+    m = None
+    while pos < len(attrs):
+        m = ATTRIBUTE.match(attrs, pos)
+        if not m or m.end() == pos:
+            if attrs[pos:].strip():
+                raise _Fallback
+            break
+        pos = m.end()
+        if m.group(1) and m.group(1).lower() == 'class':
+            value = next((v for v in m.group(2, 3, 4) if v is not None), '')
+            if '&' in value:
+                raise _Fallback
+            classes = value.split()
+    if self_closing and m and m.group(4) is not None and m.end() == len(attrs):
+        # <a b=c/>：html.parser 把 / 算进不带引号的属性值，标签也不算自闭合
+        raise _Fallback
+    return classes or []
+
+
+def _charref(token):
+    if token in NAMED_ENTITIES:
+        return NAMED_ENTITIES[token]
+    code = int(token[3:-1], 16) if token[2] in 'xX' else int(token[2:-1])
+    # 控制字符、代理区等按 HTML 规范要替换的码位交给 BeautifulSoup
+    if code < 0x20 or 0x7f <= code <= 0x9f or 0xd800 <= code <= 0xdfff or code > 0x10ffff:
+        raise _Fallback
+    return chr(code)
+
+
+def _clean_page_html_fast(html):
+    """
+    单遍扫描提取正文：按 html.parser 的建树规则维护元素栈，
+    被删除的元素（font、center.chapterPages、紧跟 <br> 的 center）连同内容一起跳过，<br> 输出换行。
+    """
+    out = []
+    data = []  # 当前文本节点（相邻的文本和实体）
+    # 元素栈：(标签名, 是否被删除)；每层记录上一个兄弟元素的标签名（用于 br+center）
+    stack = []
+    previous = [None]
+    removed = 0  # 栈中被删除的元素个数，大于 0 时不输出
+    pos = 0
+    for m in PAGE_TOKEN.finditer(html):
+        if m.start() != pos:
+            raise _Fallback
+        pos = m.end()
+        text = m.group('text')
+        if text is not None:
+            data.append(_charref(text) if text[0] == '&' else text)
+            continue
+        if data:
+            _flush_text(data, out, removed)
+        name = m.group('start')
+        if name is not None:
+            name = name.lower()
+            if name in SLOW_PATH_ELEMENTS:
+                raise _Fallback
+            classes = _class_tokens(m.group('attrs'), bool(m.group('close')))
+            drop = name == 'font' or name == 'center' and (previous[-1] == 'br' or 'chapterPages' in classes)
+            previous[-1] = name
+            if name in VOID_ELEMENTS:
+                if name == 'br' and not removed:
+                    out.append('\n')
+                continue
+            if m.group('close'):
+                continue  # <div/>：空元素，立即关闭
+            stack.append((name, drop))
+            previous.append(None)
+            removed += drop
+            continue
+        name = m.group('end')
+        if name is not None:
+            name = name.lower()
+            if name in VOID_ELEMENTS:
+                raise _Fallback
+            # 关闭最近的同名元素及其内部未关闭的元素，没有同名元素时忽略
+            for i in range(len(stack) - 1, -1, -1):
+                if stack[i][0] == name:
+                    removed -= sum(drop for _, drop in stack[i:])
+                    del stack[i:]
+                    del previous[i + 1:]
+                    break
+    if pos != len(html):
+        raise _Fallback
+    if data:
+        _flush_text(data, out, removed)
+    return BREAK_BEFORE_TEXT.sub('', ''.join(out)).strip()
+
+
+def _flush_text(data, out, removed):
+    """结束一个文本节点：与 BeautifulSoup 一样，只含 ASCII 空白的节点合并成一个空格或换行"""
+    text = ''.join(data)
+    data.clear()
+    if removed:
+        return
+    if not text.strip(ASCII_SPACES):
+        text = '\n' if '\n' in text else ' '
+    out.append(text)
+
+
+def clean_page_html(html):
+    """
+    从正文区块（#nr1）的 innerHTML 提取纯文本：去掉分页区块和提示内容，<br> 换行，
+    删除换行符后面紧跟文字的情况。
+
+    一般页面走单遍扫描的快速路径，含脚本、CDATA、非常规实体等的页面交给 BeautifulSoup，两者输出相同。
+    """
+    # 删除 HTML 原本的换行符
+    html = html.replace("\n", "")
+    try:
+        return _clean_page_html_fast(html)
+    except _Fallback:
+        return _clean_page_html_bs4(html)
+
+
+def get_page_text(driver, curr_url):
+    """
+    Purpose: 获取本页小说内容
+    """
+    open_url(driver, curr_url)
+    nr1_element = WebDriverWait(driver, 10).until(
+        EC.presence_of_element_located((By.ID, "nr1"))
+    )
+    return clean_page_html(nr1_element.get_attribute("innerHTML"))
 # end def
 
 def get_chapter_text(driver, chapter_url):
@@ -47,7 +228,7 @@ def get_chapter_text(driver, chapter_url):
     Purpose:整合小说分页内容，单章保存 
     """
     print("正在加载章节...")
-    driver.get(chapter_url)
+    open_url(driver, chapter_url)
     # time.sleep(1)
     # 获取章节名
     chapter_title = driver.find_element(By.CSS_SELECTOR, "h1.page-title").text
@@ -70,13 +251,15 @@ def get_chapter_text(driver, chapter_url):
     return chapter
 # end def
 
-def get_novel_by_catalog(driver, catalog_url):
+def get_chapter_urls(driver, catalog_url):
     """
-    Purpose: 根据目录获取所有章节
+    Purpose: 读取全部目录分页，返回 (小说标题, 按目录顺序排列的章节链接)，获取标题失败时返回 (None, [])
     """
     print("正在加载目录...")
-    driver.get(catalog_url)
-    time.sleep(2)
+    open_url(driver, catalog_url)
+    if not isinstance(driver, HttpDriver):
+        # 等待浏览器渲染
+        time.sleep(2)
     # driver.save_screenshot('diyibanzhu.png')
     # 获取小说标题（在 <h1> 中）
     try:
@@ -84,11 +267,7 @@ def get_novel_by_catalog(driver, catalog_url):
         print("获取小说：" + novel_title)
     except Exception as e:
         print("❌ 无法获取小说标题:", e)
-        return    
-    # 创建以小说标题为名的文件夹
-    folder_path = os.path.join("novels", novel_title)
-    os.makedirs(folder_path, exist_ok=True)
-    print(f"📁 小说目录已创建：{folder_path}")
+        return None, []
     # 从目录获取全部目录分页
     # 定位select标签
     select_element = driver.find_element(By.CSS_SELECTOR, 'select[name="pagelist"]')
@@ -96,9 +275,11 @@ def get_novel_by_catalog(driver, catalog_url):
     option_elements = select_element.find_elements(By.TAG_NAME, "option")
     option_links = [option.get_attribute("value") for option in option_elements]
 
-    index = 1
+    # 目录分页链接相对于站点根目录
+    site_root = '{0.scheme}://{0.netloc}/'.format(urlsplit(catalog_url))
+    chapter_urls = []
     for link in option_links:
-        driver.get(f"https://m.diyibanzhu.space/{link}")
+        open_url(driver, urljoin(site_root, link.lstrip('/')))
         # 章节链接位于 ul.list li a 中
         chapter_list_div = driver.find_elements(By.CSS_SELECTOR, "div.mod.block.update.chapter-list")
         if len(chapter_list_div) == 2:
@@ -107,35 +288,182 @@ def get_novel_by_catalog(driver, catalog_url):
             chapter_links = chapter_list_div[0].find_elements(By.CSS_SELECTOR, "ul.list li a")
         
         # 按照所有目录分页，制作chapter_urls
-        chapter_urls = []
         for chapter_link in chapter_links:
             chapter_urls.append(chapter_link.get_attribute("href"))
-        # 读取每章内容
-        for chapter_url in chapter_urls:
-            chapter_text = get_chapter_text(driver, chapter_url)
-            chapter_title = driver.find_element(By.CSS_SELECTOR, "div.container h1").text
-            safe_title = re.sub(r'[\\/:*?"<>|]', '', chapter_title).strip() 
-            filename = os.path.join(folder_path, f"{index:04d}_{safe_title}.txt")
-            with open(filename, 'w', encoding='UTF-8') as f:
-                for page_text in chapter_text:
-                    f.write(page_text)
-            print(f"✅ 已保存章节：{filename}")
-            f.close()
-            index += 1
+    return novel_title, chapter_urls
 # end def
 
-if __name__ == "__main__":
+def download_chapter(driver, chapter_url):
+    """
+    Purpose: 下载一章（含全部分页），返回 (章节名, 正文)
+    """
+    chapter_text = get_chapter_text(driver, chapter_url)
+    chapter_title = driver.find_element(By.CSS_SELECTOR, "div.container h1").text
+    return chapter_title, ''.join(chapter_text)
+# end def
 
-    # chapter_url = 'https://m.diyibanzhu.space/view/777076.html'
-    # catalog_url = 'https://m.diyibanzhu.space/list/12170.html'
+def save_downloaded_chapter(folder_path, index, chapter_title, chapter_content):
+    """
+    Purpose: 以 NNNN_章节名.txt 保存一章，并更新书架目录，返回保存的文件名
+    """
+    safe_title = re.sub(r'[\\/:*?"<>|]', '', chapter_title).strip() 
+    chapter_filename = f"{index:04d}_{safe_title}.txt"
+    filename = os.path.join(folder_path, chapter_filename)
+    # 通过存储层保存（按小说的存储格式写入并登记到章节清单）
+    save_chapter(folder_path, chapter_filename, chapter_content)
+    update_novel(folder_path)
+    print(f"✅ 已保存章节：{filename}")
+    return chapter_filename
+# end def
+
+def download_chapters(drivers, chapter_urls, folder_path, start_index=1, journal=None, indexes=None):
+    """
+    Purpose: 多个 driver 并发下载章节，按目录顺序保存
+
+    每个下载线程独占一个 driver（浏览器或 HttpDriver），从共享队列中领取章节；主线程按目录顺序依次保存，
+    先下载完的后续章节在内存中等待，保证 NNNN_ 序号和章节清单顺序与目录一致。
+    每章失败时按指数退避重试，仍失败的章节跳过（序号保留），不影响后续章节。
+    传入下载日志时跳过日志中已完成的章节，并把每章的结果记入日志，中断后重新运行可以续传。
+
+    :param drivers: driver 列表，并发数即 driver 个数
+    :param chapter_urls: 按目录顺序排列的章节链接
+    :param folder_path: 小说目录
+    :param start_index: 第一章的序号
+    :param journal: 下载日志（DownloadJournal），可选
+    :param indexes: 各章的序号（与 chapter_urls 一一对应），默认从 start_index 起按目录位置编号
+    :return: 下载失败的章节链接列表
+    """
+    tasks = queue.Queue()
+    skipped = set()
+    for position, chapter_url in enumerate(chapter_urls):
+        if journal and journal.is_done(chapter_url):
+            skipped.add(position)
+        else:
+            tasks.put((position, chapter_url))
+    if skipped:
+        print(f"⏭ 跳过已下载的 {len(skipped)} 章")
+    results = {}
+    done = threading.Condition()
+
+    def worker(driver):
+        while True:
+            try:
+                position, chapter_url = tasks.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                result = with_retries(download_chapter, driver, chapter_url)
+            except Exception as e:
+                print(f"❌ 章节下载失败：{chapter_url} {e}")
+                result = e
+            with done:
+                results[position] = result
+                done.notify()
+
+    threads = [threading.Thread(target=worker, args=(driver,), daemon=True) for driver in drivers]
+    for thread in threads:
+        thread.start()
 
+    failed = []
+    for position, chapter_url in enumerate(chapter_urls):
+        if position in skipped:
+            continue
+        with done:
+            while position not in results:
+                done.wait()
+            result = results.pop(position)
+        if isinstance(result, Exception):
+            failed.append(chapter_url)
+            if journal:
+                journal.mark_failed(chapter_url, result)
+        else:
+            index = indexes[position] if indexes else start_index + position
+            chapter_filename = save_downloaded_chapter(folder_path, index, *result)
+            if journal:
+                journal.mark_done(chapter_url, chapter_filename, result[1])
+    for thread in threads:
+        thread.join()
+    return failed
+# end def
+
+def get_novel_by_catalog(driver, catalog_url, extra_drivers=(), folder_path=None):
+    """
+    Purpose: 根据目录获取章节：只下载还没保存的章节（新书即全部章节），新章节的序号接在已有章节之后
+
+    :param driver: 浏览器或 HttpDriver（读取目录并参与下载）
+    :param extra_drivers: 额外的 driver，与 driver 一起并发下载章节
+    :param folder_path: 保存到的小说目录，默认为 novels/<站点上的书名>；
+                        sync.py 更新时传入已记录来源的目录，小说在阅读器中改过名也不会重新下载整本
+    :return: {'title', 'chapters': 目录章节数, 'skipped': 已保存跳过的章节数, 'fetched': 下载的章节数,
+              'failed': 下载失败的章节数}；获取目录失败时返回 None
+    """
+    novel_title, chapter_urls = get_chapter_urls(driver, catalog_url)
+    if novel_title is None:
+        return None
+    # 创建以小说标题为名的文件夹
+    if folder_path is None:
+        folder_path = os.path.join("novels", novel_title)
+    os.makedirs(folder_path, exist_ok=True)
+    print(f"📁 小说目录：{folder_path}")
+
+    # 下载日志记录已完成的章节和小说来源，重新运行或 sync.py 更新时只下载新增和缺失的章节
+    journal = DownloadJournal(folder_path)
+    if journal.source != {'site': 'dybz', 'url': catalog_url}:
+        journal.set_source('dybz', catalog_url)
+    pending, skipped = journal.plan(chapter_urls)
+    if skipped:
+        print(f"⏭ 跳过已下载的 {skipped} 章")
+    failed = []
+    if pending:
+        indexes = [index for index, _ in pending]
+        failed = download_chapters([driver, *extra_drivers], [url for _, url in pending], folder_path,
+                                   journal=journal, indexes=indexes)
+        # 整本下载完再统一建搜索索引，比逐章合并倒排表快得多
+        search.index_novel(os.path.dirname(folder_path), os.path.basename(folder_path))
+    print(f"共 {len(chapter_urls)} 章，跳过 {skipped} 章，下载 {len(pending) - len(failed)} 章，失败 {len(failed)} 章")
+    for chapter_url in failed:
+        print(f"  ❌ {chapter_url}")
+    return {'title': novel_title, 'chapters': len(chapter_urls), 'skipped': skipped,
+            'fetched': len(pending) - len(failed), 'failed': len(failed)}
+# end def
+
+def create_driver():
+    """
+    Purpose: 启动一个无头浏览器
+    """
+    if uc is None:
+        raise RuntimeError("未安装 undetected_chromedriver，无法启动浏览器")
     options = uc.ChromeOptions()
     options.add_argument('--headless') # 无头模式
     options.add_argument('lang=zh_CN.UTF-8') # 中文
     options.add_argument('--disable-gpu') # 禁用gpu加速
     options.add_argument('--blink-settings=imagesEnabled=False') # 禁止加载图片，降低性能需求
+    return uc.Chrome(options=options)
+# end def
+
+def create_http_driver():
+    """
+    Purpose: HTTP 抓取后端，页面需要 JS 时才启动浏览器
+    """
+    return HttpDriver(required=REQUIRED_ELEMENTS, browser_factory=create_driver)
+# end def
+
+if __name__ == "__main__":
+
+    # chapter_url = 'https://m.diyibanzhu.space/view/777076.html'
+    # catalog_url = 'https://m.diyibanzhu.space/list/12170.html'
+
+    parser = argparse.ArgumentParser(description='第一版主小说下载')
+    parser.add_argument('--backend', choices=['http', 'browser'], default='http',
+                        help='抓取后端：http 直接请求页面（需要 JS 时自动改用浏览器），browser 全部用浏览器')
+    parser.add_argument('--workers', type=int, default=1, help='并发下载数')
+    parser.add_argument('--delay', type=float, default=0.0, help='同一站点两次请求的最小间隔（秒）')
+    parser.add_argument('--base-url', default=BASE_URL, help='站点地址（测试时可指向本地替身站点）')
+    args = parser.parse_args()
+    rate_limiter.interval = args.delay
 
-    driver = uc.Chrome(options=options)
+    factory = create_http_driver if args.backend == 'http' else create_driver
+    drivers = [factory() for _ in range(max(1, args.workers))]
     
     try:
         while True:
@@ -143,9 +471,10 @@ if __name__ == "__main__":
             if not novel_id:
                 print("退出程序")
                 break
-            catalog_url = f'https://m.diyibanzhu.space/list/{novel_id}.html'
-            get_novel_by_catalog(driver, catalog_url)
+            catalog_url = f'{args.base_url}/list/{novel_id}.html'
+            get_novel_by_catalog(drivers[0], catalog_url, drivers[1:])
     except KeyboardInterrupt:
         print("\n手动中断程序")
     finally:
-        driver.quit()
\ No newline at end of file
+        for driver in drivers:
+            driver.quit()
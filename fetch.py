@@ -0,0 +1,134 @@
+"""
+轻量抓取后端。
+
+不需要执行 JS 的页面直接用 HTTP 会话（keep-alive、gzip）取回 HTML，
+用 BeautifulSoup 实现爬虫用到的那部分 Selenium driver 接口（get、find_element(s)、
+元素的 text / get_attribute），原有的页面解析代码无需修改即可运行。
+页面缺少预期的元素（说明内容要靠 JS 渲染）时，该页自动改用浏览器打开。
+"""
+from urllib.parse import urljoin
+
+import requests
+from bs4 import BeautifulSoup
+from selenium.webdriver.common.by import By
+from selenium.common.exceptions import NoSuchElementException
+
+try:
+    import lxml  # noqa: F401
+    HTML_PARSER = 'lxml'
+except ImportError:  # lxml 为可选依赖，解析更快
+    HTML_PARSER = 'html.parser'
+
+USER_AGENT = ('Mozilla/5.0 (Linux; Android 10; K) AppleWebKit/537.36 '
+              '(KHTML, like Gecko) Chrome/120.0 Mobile Safari/537.36')
+
+
+def _css(by, value):
+    """把 Selenium 的定位方式转换为 CSS 选择器"""
+    if by == By.CSS_SELECTOR:
+        return value
+    if by == By.ID:
+        return f'#{value}'
+    if by == By.TAG_NAME:
+        return value
+    if by == By.CLASS_NAME:
+        return '.' + value
+    raise ValueError(f"不支持的定位方式：{by}")
+
+
+class HttpElement:
+    """对应 Selenium WebElement 的常用接口"""
+
+    def __init__(self, tag, base_url):
+        self.tag = tag
+        self.base_url = base_url
+
+    @property
+    def text(self):
+        # 与浏览器一致：合并连续空白
+        return ' '.join(self.tag.get_text().split())
+
+    def get_attribute(self, name):
+        if name == 'innerHTML':
+            return self.tag.decode_contents()
+        value = self.tag.get(name)
+        if name in ('href', 'src') and value is not None:
+            # 浏览器返回的是绝对地址
+            return urljoin(self.base_url, value)
+        return value
+
+    def find_element(self, by, value):
+        return _first(self.find_elements(by, value), by, value)
+
+    def find_elements(self, by, value):
+        return [HttpElement(tag, self.base_url) for tag in self.tag.select(_css(by, value))]
+
+
+def declared_charset(response):
+    """
+    响应头 Content-Type 中声明的字符集。
+
+    没有声明时返回 None，由 BeautifulSoup 读取页面的 <meta charset>；
+    不能用 response.encoding，requests 对没有声明字符集的 text/* 一律当作 ISO-8859-1。
+    """
+    for param in response.headers.get('Content-Type', '').split(';')[1:]:
+        key, _, value = param.partition('=')
+        if key.strip().lower() == 'charset':
+            return value.strip().strip('"\'') or None
+    return None
+
+
+def _first(elements, by, value):
+    if not elements:
+        raise NoSuchElementException(f"找不到元素：{by}={value}")
+    return elements[0]
+
+
+class HttpDriver:
+    """
+    用 HTTP 会话模拟 Selenium driver。
+
+    :param required: CSS 选择器，页面中一个都匹配不到时视为需要 JS 渲染，改用浏览器打开该页
+    :param browser_factory: 创建浏览器的函数，第一次需要时才调用；为 None 时不回退
+    :param timeout: 请求超时秒数
+    """
+
+    def __init__(self, required=None, browser_factory=None, timeout=15):
+        self.session = requests.Session()
+        self.session.headers['User-Agent'] = USER_AGENT
+        self.required = required
+        self.browser_factory = browser_factory
+        self.timeout = timeout
+        self.browser = None
+        self.current_url = None
+        self.fallbacks = 0
+        self._soup = None
+        self._on_browser = False
+
+    def get(self, url):
+        response = self.session.get(url, timeout=self.timeout)
+        response.raise_for_status()
+        self.current_url = response.url
+        self._soup = BeautifulSoup(response.content, HTML_PARSER, from_encoding=declared_charset(response))
+        self._on_browser = False
+        if self.required and self.browser_factory and not self._soup.select_one(self.required):
+            if self.browser is None:
+                self.browser = self.browser_factory()
+            self.browser.get(url)
+            self._on_browser = True
+            self.fallbacks += 1
+
+    def find_element(self, by, value):
+        if self._on_browser:
+            return self.browser.find_element(by, value)
+        return _first(self.find_elements(by, value), by, value)
+
+    def find_elements(self, by, value):
+        if self._on_browser:
+            return self.browser.find_elements(by, value)
+        return [HttpElement(tag, self.current_url) for tag in self._soup.select(_css(by, value))]
+
+    def quit(self):
+        self.session.close()
+        if self.browser is not None:
+            self.browser.quit()
@@ -1,99 +1,262 @@
 import re
 import chardet
 import os
+import codecs
+from storage import open_writer
+from headings import HeadingMatcher
+
+# 流式分章时每次读取的字节数
+SPLIT_CHUNK_SIZE = 1 << 20
+
+# 编码探测的取样字节数
+DETECT_SAMPLE_SIZE = 64 * 1024
+
+# 按 BOM 判断编码（utf-32 的 BOM 以 utf-16 的 BOM 开头，需先判断）
+BOM_ENCODINGS = [
+    (codecs.BOM_UTF32_LE, 'utf-32'),
+    (codecs.BOM_UTF32_BE, 'utf-32'),
+    (codecs.BOM_UTF8, 'utf-8-sig'),
+    (codecs.BOM_UTF16_LE, 'utf-16'),
+    (codecs.BOM_UTF16_BE, 'utf-16'),
+]
+
+# 按 GB18030 解码后，常用简体字（GB2312）或繁体字（Big5）的占比下限；
+# 把 Big5 文本误当作 GB18030 解码会得到大量生僻字，占比明显偏低
+COMMON_CHAR_MIN_RATIO = 0.9
+
+
+def _try_decode(sample, encoding):
+    """用增量解码器校验取样（末尾被截断的多字节字符不算错误），失败返回 None"""
+    try:
+        return codecs.getincrementaldecoder(encoding)().decode(sample, final=False)
+    except UnicodeDecodeError:
+        return None
+
+
+def _charset_ratio(text, charset):
+    """非 ASCII 字符中能用 charset 编码的比例（整段在 C 层完成编解码，不逐字循环）"""
+    narrow = len(text.encode('ascii', errors='ignore'))
+    total = len(text) - narrow
+    if total == 0:
+        return 1.0
+    covered = len(text.encode(charset, errors='ignore').decode(charset)) - narrow
+    return covered / total
+
+
+def detect_encoding(filepath):
+    """
+    探测文本文件编码，只读取开头一小段。
+
+    依次尝试：BOM -> utf-8 校验 -> GB18030 / Big5 试解码，都无法确定时才调用 chardet。
+
+    :param filepath: 文件路径
+    :return: 可传给 open/codecs 的编码名
+    """
+    with open(filepath, 'rb') as f:
+        sample = f.read(DETECT_SAMPLE_SIZE)
+
+    for bom, encoding in BOM_ENCODINGS:
+        if sample.startswith(bom):
+            return encoding
+
+    if _try_decode(sample, 'utf-8') is not None:
+        return 'utf-8'
+
+    gb_text = _try_decode(sample, 'gb18030')
+    if gb_text is not None and (_charset_ratio(gb_text, 'gb2312') >= COMMON_CHAR_MIN_RATIO
+                                or _charset_ratio(gb_text, 'big5') >= COMMON_CHAR_MIN_RATIO):
+        return 'gb18030'
+    if _try_decode(sample, 'big5') is not None:
+        return 'big5'
+
+    # 无法确定时才使用较慢的 chardet
+    guess = chardet.detect(sample)['encoding']
+    if guess:
+        try:
+            encoding = codecs.lookup(guess).name
+        except LookupError:
+            encoding = None
+        # GB2312/GBK 统一用超集 GB18030 解码，ASCII 按 utf-8 处理
+        if encoding in ('gb2312', 'gbk'):
+            return 'gb18030'
+        if encoding == 'ascii':
+            return 'utf-8'
+        if encoding:
+            return encoding
+    return 'gb18030' if gb_text is not None else 'utf-8'
+
 
 def read_file_auto(filepath):
     # 自动检测编码
-    with open(filepath, 'rb') as f:
-        raw = f.read(100000)  # 最多读取 100KB
-    result = chardet.detect(raw)
-    encoding = result['encoding'] or 'utf-8'
-    
+    encoding = detect_encoding(filepath)
+
     # 读取文件内容
     with open(filepath, 'r', encoding=encoding, errors='ignore') as f:
         return f.read()
 
-def split_chapters(text):
-    pattern = re.compile(r'(第[一二三四五六七八九十百千万0-9]+章.*?)\n')
-    matches = list(pattern.finditer(text))
+def split_chapters(text, headings=None):
+    """
+    把整段文本按章节标题切分，标题识别与 split_novel_by_chapter 相同。
 
-    if not matches:
+    :param text: 小说全文
+    :param headings: 标题识别器 HeadingMatcher，默认新建（传入时可在之后读取其统计）
+    :return: [{'title': 标题, 'content': 正文（不含标题行）}]，没有识别到标题时整本作为一个章节
+    """
+    headings = headings or HeadingMatcher()
+    chapters = []
+    pos = 0
+    for start, end, _, title in headings.scan(text):
+        if chapters:
+            chapters[-1]['content'] = text[pos:start].strip('\n')
+        chapters.append({'title': title, 'content': ''})
+        pos = end
+
+    if not chapters:
         # 如果没有匹配到章节标题，就整本作为一个章节返回
         return [{
             'title': '全文',
             'content': text.strip()
         }]
+    chapters[-1]['content'] = text[pos:].strip('\n')
+    return chapters
 
-    chapters = []
-    for i in range(len(matches)):
-        start = matches[i].end()
-        end = matches[i + 1].start() if i + 1 < len(matches) else len(text)
-        title = matches[i].group(1)
-        content = text[start:end].strip('\n')
-        chapters.append({
-            'title': title,
-            'content': content
-        })
+def iter_blocks(file_path, encoding, chunk_size=SPLIT_CHUNK_SIZE, on_chunk=None, errors='strict'):
+    """
+    分块读取文本文件，每读一块产出其中的若干整行（以 \\n 分隔，末尾不含换行符），内存占用与文件大小无关。
+
+    换行规则与文本模式读取一致：\r\n 和单独的 \r 都视为换行。
+
+    :param file_path: 文件路径
+    :param encoding: 文件编码
+    :param chunk_size: 每次读取的字节数
+    :param on_chunk: 每读完一块后调用 on_chunk(已读取字节数)
+    :param errors: 解码错误处理方式，'strict' 时抛出 UnicodeDecodeError
+    """
+    decoder = codecs.getincrementaldecoder(encoding)(errors)
+    held = ''      # 块末尾的 \r，可能与下一块开头的 \n 组成一个换行
+    pending = ''   # 尚未遇到换行的行尾部分
+    with open(file_path, 'rb') as f:
+        while True:
+            chunk = f.read(chunk_size)
+            text = held + decoder.decode(chunk, final=not chunk)
+            held = ''
+            if chunk and text.endswith('\r'):
+                text, held = text[:-1], '\r'
+            text = pending + text.replace('\r\n', '\n').replace('\r', '\n')
+            cut = text.rfind('\n')
+            if cut >= 0:
+                yield text[:cut]
+                pending = text[cut + 1:]
+            else:
+                pending = text
+            if on_chunk:
+                on_chunk(f.tell())
+            if not chunk:
+                break
+    if pending:
+        yield pending
+
+
+def iter_lines(file_path, encoding, chunk_size=SPLIT_CHUNK_SIZE, on_chunk=None, errors='strict'):
+    """
+    分块读取文本文件并逐行产出（不含换行符），参数见 iter_blocks。
+    """
+    for block in iter_blocks(file_path, encoding, chunk_size, on_chunk, errors):
+        yield from block.split('\n')
 
-    return chapters
 
-def split_novel_by_chapter(file_path, novel_folder):
+def split_novel_by_chapter(file_path, novel_folder, progress=None, headings=None):
     """
     将上传的txt小说按章节分割并保存到以小说标题命名的文件夹中。
 
+    分块读取、逐行识别章节标题，章节边写边存，大文件也不会整本读入内存。
+    编码由 detect_encoding 根据文件开头探测，个别无法解码的字节以替换字符代替，不会整本重读。
+
     :param file_path: 上传的小说文件路径
     :param novel_folder: 存放小说的根目录
-    :return: 分割后的章节文件路径列表
+    :param progress: 进度回调 progress(已处理字节数, 已识别章节数)，每读完一块调用一次
+    :param headings: 标题识别器 HeadingMatcher，默认新建（传入时可在之后读取其统计）
+    :return: 分割后的章节名列表（章节通过 storage 按配置的存储格式保存）
     """
-    # 读取文件内容
-    try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            content = f.read()
-    except UnicodeDecodeError:
-        # 如果 utf-8 失败，尝试 gbk（中文常见编码）
-        with open(file_path, 'r', encoding='gbk') as f:
-            content = f.read()
-
-    # 使用正则匹配章节标题，支持多种格式
-    chapter_pattern = re.compile(
-        r'(第[一二三四五六七八九十百千0-9]+[章回集节]\s*.*)',
-        re.IGNORECASE | re.MULTILINE
-    )
+    return _split_stream(file_path, novel_folder, detect_encoding(file_path), progress, headings)
 
-    # 找到所有章节标题和位置
-    chapters = [(match.group(1).strip(), match.start()) for match in chapter_pattern.finditer(content)]
 
-    if not chapters:
-        raise ValueError("未能识别出任何章节，请确保小说以“第X章”等格式分章。")
+def _split_stream(file_path, novel_folder, encoding, progress=None, headings=None):
+    headings = headings or HeadingMatcher()
 
     # 获取小说标题（去掉路径和 .txt 后缀）
     filename = os.path.basename(file_path)
     title = os.path.splitext(filename)[0]
 
-    # 创建小说标题命名的文件夹
+    # 小说标题命名的文件夹
     book_folder = os.path.join(novel_folder, title)
-    os.makedirs(book_folder, exist_ok=True)
 
-    # 保存章节文件路径列表
+    # 保存的章节名列表
     saved_files = []
 
-    # 遍历章节，切分内容并保存
-    for i, (chapter_title, start_pos) in enumerate(chapters):
-        # 下一章的起始位置，或文件末尾
-        end_pos = chapters[i + 1][1] if i + 1 < len(chapters) else len(content)
+    # 识别到第一个章节标题时才打开写入器，标题之前的内容丢弃
+    writer = None
+    # 章节内容要去掉首尾空白：空白先暂存，遇到后续正文时再写出，章节结束时丢弃
+    pending = ''
+    # 待写出的内容攒够一定大小再交给写入器，减少小块写入的开销
+    buffer = []
+    buffered = 0
 
-        # 提取章节内容（包含标题）
-        chapter_content = content[start_pos:end_pos].strip()
+    def emit(piece):
+        nonlocal pending, buffered
+        stripped = piece.rstrip()
+        if stripped:
+            buffer.append(pending)
+            buffer.append(stripped)
+            buffered += len(stripped)
+            pending = piece[len(stripped):]
+            if buffered >= SPLIT_CHUNK_SIZE:
+                flush()
+        else:
+            pending += piece
+
+    def flush():
+        nonlocal buffered
+        writer.write(''.join(buffer))
+        buffer.clear()
+        buffered = 0
+
+    try:
+        on_chunk = (lambda processed: progress(processed, len(saved_files))) if progress else None
+        for block in iter_blocks(file_path, encoding, on_chunk=on_chunk, errors='replace'):
+            # 整块交给 headings.scan 一次找出标题行，标题之间的正文整段写出，不逐行处理
+            pos = 0
+            for start, end, _, chapter_title in headings.scan(block):
+                if writer:
+                    if start > pos:
+                        emit('\n' + block[pos:start - 1])
+                    flush()
+                    writer.finish_chapter()
+                else:
+                    writer = open_writer(book_folder)
+                pending = ''
 
-        # 构造安全的文件名（避免特殊字符）
-        safe_title = re.sub(r'[<>:"/\\|?*\x00-\x1F]', '_', chapter_title)
-        safe_title = safe_title[:50]  # 限制长度
-        chapter_filename = f"{i:04d}_{safe_title}.txt"
-        chapter_path = os.path.join(book_folder, chapter_filename)
+                # 构造安全的文件名（避免特殊字符）
+                safe_title = re.sub(r'[<>:"/\\|?*\x00-\x1F]', '_', chapter_title)
+                safe_title = safe_title[:50]  # 限制长度
+                chapter_filename = f"{len(saved_files):04d}_{safe_title}.txt"
 
-        with open(chapter_path, 'w', encoding='utf-8') as cf:
-            cf.write(chapter_content)
+                # 章节内容包含标题
+                writer.start_chapter(chapter_filename)
+                emit(chapter_title)
+                saved_files.append(chapter_filename)
+                pos = end + 1
+            if writer and pos <= len(block):
+                emit('\n' + block[pos:])
+    except BaseException:
+        if writer:
+            writer.abort()
+        raise
 
-        saved_files.append(chapter_path)
+    if not writer:
+        raise ValueError("未能识别出任何章节，请确保小说以“第X章”“卷X”“序章”“番外”“Chapter N”等格式分章。")
 
-    return saved_files
\ No newline at end of file
+    flush()
+    writer.finish_chapter()
+    writer.close()
+    return saved_files
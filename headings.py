@@ -0,0 +1,116 @@
+"""
+章节标题识别。
+
+支持的标题种类全部编译进一个从行首锚定的正则，每行只匹配一次：
+- chapter：第X章 / 回 / 集 / 节 / 话（X 可为中文数字、半角或全角阿拉伯数字；“第X回合”不算）
+- volume：第X卷 / 部 / 篇、卷X
+- prologue：序章、序言、序、楔子、引子、前言、引言
+- extra：番外、后记、尾声、终章、完本感言
+- english：Chapter N（N 为阿拉伯或罗马数字）
+
+环境变量 CHAPTER_HEADINGS 选择启用的种类（逗号分隔，默认全部），
+HEADING_MAX_LENGTH 为标题行的最大字数，超过的行和以句末标点结尾的行视为正文。
+"""
+import os
+import re
+from collections import Counter
+from functools import lru_cache
+
+# 数字：中文数字、半角与全角阿拉伯数字
+DIGITS = '零〇一二两三四五六七八九十百千万0-9０-９'
+NUMBER = f'[{DIGITS}]+'
+# 罗马数字（I 到 MMMCMXCIX）
+ROMAN = r'(?=[mdclxvi])m{0,3}(?:c[md]|d?c{0,3})(?:x[cl]|l?x{0,3})(?:i[xv]|v?i{0,3})(?![a-z])'
+# 关键词之后必须是行尾、空白、标点或数字，避免“序幕拉开”“后记得”之类的正文被当作标题
+KEYWORD_END = rf'(?=$|[\s:：·.．,，、\-—_(（【\[《「{DIGITS}])'
+# 以句末标点结尾的行是正文（如“第三章里说过的那位师兄没有来。”）
+NOT_SENTENCE = r'(?!.*[。，；][ \t\u3000”」』]*(?:\n|\Z))'
+
+# {种类: (标题可能的首字, 正则)}；首字合成一个字符集放在最前面，绝大多数正文行在第一个字就被排除
+HEADING_PATTERNS = {
+    'chapter': ('第', rf'第{NUMBER}(?:[章集节節话話]|回(?!合))'),
+    'volume': ('第卷', rf'第{NUMBER}[卷部篇]|卷{NUMBER}'),
+    'prologue': ('序楔引前', rf'(?:序章|序言|序|楔子|引子|前言|引言){KEYWORD_END}'),
+    'extra': ('番后後尾终終完', rf'(?:番外篇?|后记|後記|尾声|尾聲|终章|終章|完本感言){KEYWORD_END}'),
+    'english': ('Cc', rf'(?i:chapter[ \t]*(?:[0-9０-９]+|{ROMAN}))'),
+}
+
+CHAPTER_HEADINGS = tuple(kind.strip() for kind in os.environ.get(
+    'CHAPTER_HEADINGS', ','.join(HEADING_PATTERNS)).split(',') if kind.strip())
+HEADING_MAX_LENGTH = int(os.environ.get('HEADING_MAX_LENGTH', 60))
+
+
+@lru_cache(maxsize=None)
+def compile_headings(kinds):
+    """
+    把选中的标题种类编译成正则，每种对应一个命名分组。
+
+    :param kinds: 种类名元组，见 HEADING_PATTERNS
+    :return: (匹配单行开头的正则, 在多行文本中查找“换行 + 标题”的正则)
+    """
+    unknown = [kind for kind in kinds if kind not in HEADING_PATTERNS]
+    if unknown:
+        raise ValueError(f"未知的章节标题种类：{'、'.join(unknown)}")
+    starts = ''.join(sorted({char for kind in kinds for char in HEADING_PATTERNS[kind][0]}))
+    alternatives = '|'.join(f'(?P<{kind}>{HEADING_PATTERNS[kind][1]})' for kind in kinds)
+    heading = rf'[ \t\u3000\ufeff]*(?=[{starts}])(?:{alternatives}){NOT_SENTENCE}'
+    # 以换行符开头的正则有字面前缀，正则引擎在 C 层跳到每个换行处再尝试匹配，比逐行调用快得多
+    return re.compile(heading), re.compile(rf'\n{heading}')
+
+
+class HeadingMatcher:
+    """
+    识别章节标题，并统计扫描的行数和各种类标题的数量。
+
+    match 逐行判断；scan 在整块文本中一次找出所有标题行，分章时按块调用。
+
+    :param kinds: 启用的标题种类，默认为 CHAPTER_HEADINGS
+    :param max_length: 标题行的最大字数，默认为 HEADING_MAX_LENGTH
+    """
+
+    def __init__(self, kinds=None, max_length=None):
+        self.kinds = tuple(kinds or CHAPTER_HEADINGS)
+        self.max_length = max_length or HEADING_MAX_LENGTH
+        self._line, self._block = compile_headings(self.kinds)
+        self.lines = 0
+        self.counts = Counter()
+
+    def match(self, line):
+        """
+        :param line: 一行文本（不含换行符）
+        :return: 是标题时返回 (种类, 去掉首尾空白的标题)，否则返回 None
+        """
+        self.lines += 1
+        if len(line) > self.max_length:
+            return None
+        match = self._line.match(line)
+        if match is None:
+            return None
+        self.counts[match.lastgroup] += 1
+        return match.lastgroup, line.strip()
+
+    def scan(self, text):
+        """
+        找出多行文本中的全部标题行。
+
+        :param text: 以换行符分隔的若干整行
+        :return: 逐个产出 (行首位置, 行尾位置, 种类, 去掉首尾空白的标题)
+        """
+        self.lines += text.count('\n') + 1
+        first = self._line.match(text)
+        starts = [(0, first.lastgroup)] if first else []
+        for start, kind in starts + [(match.start() + 1, match.lastgroup) for match in self._block.finditer(text)]:
+            end = text.find('\n', start)
+            if end < 0:
+                end = len(text)
+            if end - start <= self.max_length:
+                self.counts[kind] += 1
+                yield start, end, kind, text[start:end].strip()
+
+    def stats(self):
+        """扫描行数、识别出的标题总数和各种类的数量"""
+        return {
+            'lines': self.lines,
+            'headings': sum(self.counts.values()),
+            'kinds': {kind: self.counts[kind] for kind in self.kinds if self.counts[kind]},
+        }
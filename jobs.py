@@ -0,0 +1,211 @@
+"""
+上传后台处理队列。
+
+上传的 txt 先落盘，再交给后台工作池分章，请求立即返回任务 id；
+管理页通过 /jobs 接口轮询处理进度（已处理字节数、已识别章节数）。
+
+工作池默认为进程池，多本小说可以在多个 CPU 核心上同时分章；
+设置环境变量 UPLOAD_EXECUTOR=thread 可改用线程池。
+任务状态和进度存放在书架目录数据库中，gunicorn 多进程部署时任一工作进程都能查到。
+"""
+import os
+import time
+import uuid
+import shutil
+import sqlite3
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from function import split_novel_by_chapter
+import search
+import catalog
+import metrics
+
+# 工作池类型与并发数
+UPLOAD_EXECUTOR = os.environ.get('UPLOAD_EXECUTOR', 'process')
+UPLOAD_WORKERS = int(os.environ.get('UPLOAD_WORKERS', os.cpu_count() or 1))
+
+# 最多保留的已结束任务数
+MAX_FINISHED_JOBS = 100
+
+# 补建索引、登记时等不到数据库写锁（每次等待 30 秒）的重试次数
+REGISTER_RETRIES = 3
+
+# 任务状态存放在书架目录数据库（catalog.add_job 等）中，多进程部署时各工作进程共享
+_lock = threading.Lock()
+_executor = None
+# 分章进程等不到数据库写锁时，由主进程用这个单线程池依次补建索引、登记
+_register_executor = None
+
+
+def _init_worker():
+    # fork 出的分章进程不能沿用父进程的 SQLite 连接，用到时重新连接
+    catalog.close_connections()
+    search.close_connections()
+
+
+def _report(novel_folder, job_id, processed, chapters):
+    """工作进程/线程中调用：回报分章进度"""
+    catalog.update_job(novel_folder, job_id, active_only=True,
+                       status='running', bytes_processed=processed, chapters=chapters)
+
+
+def is_locked(error):
+    """SQLite 等待写锁超时（database is locked）"""
+    return isinstance(error, sqlite3.OperationalError) and 'locked' in str(error)
+
+
+def register_novel(novel_folder, novel_name, index=True, retries=0):
+    """
+    为已分章保存的小说建立搜索索引并登记到书架目录。
+
+    :param novel_folder: 存放小说的根目录
+    :param novel_name: 小说名
+    :param index: 是否建立搜索索引
+    :param retries: 等不到数据库写锁时的重试次数
+    """
+    for attempt in range(retries + 1):
+        try:
+            if index:
+                search.index_novel(novel_folder, novel_name)
+            catalog.update_novel(os.path.join(novel_folder, novel_name))
+            return
+        except sqlite3.OperationalError as e:
+            if not is_locked(e) or attempt == retries:
+                raise
+            print(f"[RETRY] {novel_name}：{e}（{attempt + 1}/{retries}）")
+
+
+def import_novel(file_path, novel_folder, progress=None, index=True):
+    """
+    导入一本 txt 小说：分章保存，建立搜索索引并登记到书架目录（上传和批量导入共用）。
+
+    多个进程同时导入大文件时，写索引可能等不到数据库写锁。这时已分好的章节保留在磁盘上，
+    返回未登记，由调用方在主进程中依次调用 register_novel 补上，不会留下书架上看不到的小说。
+
+    :param file_path: txt 文件路径（文件名即小说名）
+    :param novel_folder: 存放小说的根目录
+    :param progress: 分章进度回调，见 split_novel_by_chapter
+    :param index: 是否建立搜索索引
+    :return: (分割后的章节名列表, 是否已登记)
+    """
+    chapter_files = split_novel_by_chapter(file_path, novel_folder, progress=progress)
+    novel_name = os.path.splitext(os.path.basename(file_path))[0]
+    try:
+        register_novel(novel_folder, novel_name, index=index)
+    except sqlite3.OperationalError as e:
+        if not is_locked(e):
+            raise
+        print(f"[DEFER] {novel_name}：{e}，稍后由主进程建立索引")
+        return chapter_files, False
+    return chapter_files, True
+
+
+def _run_split(job_id, save_path, novel_folder):
+    """在工作池中执行分章，建立搜索索引并登记到书架目录，返回 (章节数, 是否已登记, 耗时秒数)"""
+    start = time.perf_counter()
+    chapter_files, registered = import_novel(
+        save_path, novel_folder,
+        progress=lambda processed, chapters: _report(novel_folder, job_id, processed, chapters))
+    return len(chapter_files), registered, time.perf_counter() - start
+
+
+def _get_executor():
+    global _executor
+    with _lock:
+        if _executor is None:
+            if UPLOAD_EXECUTOR == 'thread':
+                _executor = ThreadPoolExecutor(max_workers=UPLOAD_WORKERS)
+            else:
+                _executor = ProcessPoolExecutor(max_workers=UPLOAD_WORKERS, initializer=_init_worker)
+        return _executor
+
+
+def _get_register_executor():
+    global _register_executor
+    with _lock:
+        if _register_executor is None:
+            _register_executor = ThreadPoolExecutor(max_workers=1)
+        return _register_executor
+
+
+def submit_upload(save_path, novel_folder, on_done=None):
+    """
+    把已保存的上传文件加入分章队列。
+
+    :param save_path: 上传文件路径（文件名即小说名），处理结束后连同所在目录一起删除
+    :param novel_folder: 存放小说的根目录
+    :param on_done: 分章成功后在主进程中调用 on_done(job)
+    :return: 任务 id
+    """
+    job_id = uuid.uuid4().hex
+    job = {
+        'id': job_id,
+        'filename': os.path.basename(save_path),
+        'novel': os.path.splitext(os.path.basename(save_path))[0],
+        'status': 'queued',
+        'bytes_total': os.path.getsize(save_path),
+        'bytes_processed': 0,
+        'chapters': 0,
+        'message': '',
+        'created': time.time(),
+        'finished': None,
+    }
+    catalog.add_job(novel_folder, job, keep=MAX_FINISHED_JOBS)
+
+    future = _get_executor().submit(_run_split, job_id, save_path, novel_folder)
+
+    def finish(chapters, seconds):
+        metrics.record_upload('done', job['bytes_total'], seconds)
+        catalog.update_job(novel_folder, job_id, status='done', chapters=chapters,
+                           bytes_processed=job['bytes_total'],
+                           message=f'共分割出 {chapters} 个章节。', finished=time.time())
+        if on_done:
+            on_done(get_job(job_id, novel_folder))
+
+    def fail(message):
+        catalog.update_job(novel_folder, job_id, status='failed', message=message, finished=time.time())
+        metrics.record_upload('failed', job['bytes_total'])
+
+    def register(chapters, seconds):
+        # 主进程中逐本补建索引、登记，与其他分章进程的写入错开
+        start = time.perf_counter()
+        try:
+            register_novel(novel_folder, job['novel'], retries=REGISTER_RETRIES)
+        except Exception as e:
+            fail(f'章节已保存，建立索引失败：{e}')
+        else:
+            finish(chapters, seconds + time.perf_counter() - start)
+
+    def done(future):
+        try:
+            chapters, registered, seconds = future.result()
+        except Exception as e:
+            fail(f'分章节失败：{e}')
+        else:
+            if registered:
+                finish(chapters, seconds)
+            else:
+                catalog.update_job(novel_folder, job_id, active_only=True, chapters=chapters,
+                                   message='分章完成，等待建立索引……')
+                _get_register_executor().submit(register, chapters, seconds)
+        # 删除原始整本文件
+        shutil.rmtree(os.path.dirname(save_path), ignore_errors=True)
+
+    future.add_done_callback(done)
+    return job_id
+
+
+def abandon_unfinished(novel_folder):
+    """服务启动时调用：上次未完成的任务已随进程中断，标记为失败"""
+    catalog.fail_active_jobs(novel_folder, '服务重启，分章节中断，请重新上传。')
+
+
+def get_job(job_id, novel_folder):
+    """返回任务状态，任务不存在时返回 None"""
+    return catalog.get_job(novel_folder, job_id)
+
+
+def list_jobs(novel_folder):
+    """返回所有任务状态（新任务在前）"""
+    return catalog.list_jobs(novel_folder)
@@ -0,0 +1,179 @@
+"""
+爬虫下载日志（断点续传）。
+
+每本小说目录下一个 .journal.json，记录每个章节链接的下载结果：
+已完成的章节（保存的文件名、内容哈希）、失败的章节（失败次数、错误信息），
+以及小说的来源（站点和目录/系列地址），sync.py 据此定期更新连载中的小说。
+重新运行时跳过已完成且仍在章节清单中的章节，只下载缺失和失败的章节，
+新章节的 NNNN_ 序号接在已保存章节之后。
+日志每次更新都先写临时文件再替换，中途崩溃不会留下半截日志。
+"""
+import os
+import re
+import json
+import time
+import asyncio
+import hashlib
+import threading
+
+from storage import load_manifest
+
+JOURNAL_NAME = '.journal.json'
+
+# 章节文件名的序号前缀
+INDEX_PATTERN = re.compile(r'^(\d+)_')
+
+# 单个章节的重试次数与首次重试前的等待秒数（之后每次翻倍）
+RETRIES = 3
+BACKOFF = 2.0
+
+
+def content_hash(text):
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+
+def with_retries(func, *args, retries=RETRIES, backoff=BACKOFF):
+    """
+    调用 func(*args)，失败时按指数退避重试。
+
+    :param retries: 最多重试次数
+    :param backoff: 第一次重试前等待的秒数，之后每次翻倍
+    :return: func 的返回值；重试用尽时抛出最后一次的异常
+    """
+    for attempt in range(retries + 1):
+        try:
+            return func(*args)
+        except Exception as e:
+            if attempt == retries:
+                raise
+            delay = backoff * (2 ** attempt)
+            print(f"[RETRY] {e}，{delay:.0f} 秒后重试（{attempt + 1}/{retries}）")
+            time.sleep(delay)
+
+
+async def with_retries_async(func, *args, retries=RETRIES, backoff=BACKOFF):
+    """with_retries 的协程版本：await func(*args)，失败时按指数退避重试"""
+    for attempt in range(retries + 1):
+        try:
+            return await func(*args)
+        except Exception as e:
+            if attempt == retries:
+                raise
+            delay = backoff * (2 ** attempt)
+            print(f"[RETRY] {e}，{delay:.0f} 秒后重试（{attempt + 1}/{retries}）")
+            await asyncio.sleep(delay)
+
+
+class DownloadJournal:
+    """一本小说的下载日志，多个下载线程可共享"""
+
+    def __init__(self, folder_path):
+        self.folder_path = folder_path
+        self.path = os.path.join(folder_path, JOURNAL_NAME)
+        self._lock = threading.Lock()
+        self.chapters = {}
+        self.source = None
+        if os.path.exists(self.path):
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            self.chapters = data['chapters']
+            self.source = data.get('source')
+
+    def set_source(self, site, url):
+        """记录小说的来源（站点名、目录或系列地址），之后可用 sync.py 增量更新"""
+        with self._lock:
+            self.source = {'site': site, 'url': url}
+            self._save()
+
+    def plan(self, urls, start_index=1):
+        """
+        对比目录（或系列列表）与已保存的章节，决定要下载哪些章节、各用什么序号。
+
+        已完成且仍在章节清单中的章节跳过；最后一个已保存章节之后的新章节，序号接在已有的最大序号之后；
+        之前失败、夹在已保存章节之间的章节按目录位置编号（与整本下载时相同）。
+        没有下载日志、但目录中已有章节的小说（日志功能之前下载的），视为目录中前若干章已保存。
+
+        :param urls: 按目录顺序排列的章节链接
+        :param start_index: 第一章的序号
+        :return: ([(序号, 链接)], 跳过的章节数)
+        """
+        chapters = load_manifest(self.folder_path)['chapters']
+        saved = {c['file'] for c in chapters}
+        if self.chapters:
+            stored = [self._done(url, saved) for url in urls]
+        else:
+            stored = [position < len(chapters) for position in range(len(urls))]
+        last_stored = max((position for position, done in enumerate(stored) if done), default=-1)
+
+        indexes = [int(match.group(1)) for match in (INDEX_PATTERN.match(c['file']) for c in chapters) if match]
+        next_index = max(indexes, default=start_index - 1) + 1
+        pending = []
+        for position, (url, done) in enumerate(zip(urls, stored)):
+            if done:
+                continue
+            if position < last_stored:
+                pending.append((start_index + position, url))
+            else:
+                pending.append((next_index, url))
+                next_index += 1
+        return pending, sum(stored)
+
+    def is_done(self, url):
+        """章节已下载完成，且保存的文件仍在章节清单中"""
+        return self._done(url, {c['file'] for c in load_manifest(self.folder_path)['chapters']})
+
+    def _done(self, url, saved):
+        record = self.chapters.get(url)
+        return bool(record) and record['status'] == 'done' and record['file'] in saved
+
+    def mark_done(self, url, filename, text):
+        with self._lock:
+            self.chapters[url] = {
+                'status': 'done',
+                'file': filename,
+                'sha1': content_hash(text),
+                'time': time.time(),
+            }
+            self._save()
+
+    def mark_failed(self, url, error):
+        with self._lock:
+            record = self.chapters.get(url) or {}
+            self.chapters[url] = {
+                'status': 'failed',
+                'attempts': record.get('attempts', 0) + 1,
+                'error': str(error),
+                'time': time.time(),
+            }
+            self._save()
+
+    def failed(self):
+        """失败章节的链接列表"""
+        return [url for url, record in self.chapters.items() if record['status'] == 'failed']
+
+    def _save(self):
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'source': self.source, 'chapters': self.chapters}, f, ensure_ascii=False, separators=(',', ':'))
+        os.replace(tmp_path, self.path)
+
+
+def tracked_novels(root='novels', site=None):
+    """
+    记录了来源的小说（可增量更新的连载）。
+
+    :param site: 只列出该站点的小说，默认全部
+    :return: [(小说目录, 来源 {'site', 'url'})]，按书名排序
+    """
+    tracked = []
+    if not os.path.isdir(root):
+        return tracked
+    for name in sorted(os.listdir(root)):
+        path = os.path.join(root, name, JOURNAL_NAME)
+        if not os.path.exists(path):
+            continue
+        with open(path, 'r', encoding='utf-8') as f:
+            source = json.load(f).get('source')
+        if source and (site is None or source['site'] == site):
+            tracked.append((os.path.join(root, name), source))
+    return tracked
@@ -0,0 +1,260 @@
+"""
+运行指标。
+
+请求耗时和各处理阶段（读清单、读正文、渲染模板等）的耗时按路由记入直方图，
+连同上传分章的耗时与字节数、页面缓存命中情况，以 Prometheus 文本格式在 /metrics 输出。
+
+设置环境变量 PROFILE_SLOW_MS 后启用采样分析：后台线程每隔 PROFILE_INTERVAL_MS 毫秒采集一次
+正在处理请求的线程的调用栈，耗时超过阈值的请求把采样结果写到 PROFILE_DIR 目录
+（折叠栈格式，每行“调用栈 次数”，可直接用 flamegraph.pl 等工具生成火焰图）。
+"""
+import os
+import re
+import sys
+import time
+import threading
+from collections import Counter as _Tally
+from contextlib import contextmanager
+
+# 请求耗时直方图的分桶（秒）
+REQUEST_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+# 上传分章耗时的分桶（秒）
+UPLOAD_BUCKETS = (0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+PROFILE_SLOW_MS = float(os.environ.get('PROFILE_SLOW_MS', 0))  # 为 0 时不采样
+PROFILE_INTERVAL_MS = float(os.environ.get('PROFILE_INTERVAL_MS', 5))
+PROFILE_DIR = os.environ.get('PROFILE_DIR', 'profiles')
+
+
+def _format_labels(names, values):
+    if not names:
+        return ''
+    pairs = ','.join('{}="{}"'.format(name, str(value).replace('\\', '\\\\').replace('"', '\\"'))
+                     for name, value in zip(names, values))
+    return '{' + pairs + '}'
+
+
+def _format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """只增不减的计数，线程安全"""
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels[name] for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def expose(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} counter']
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f'{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}')
+        return lines
+
+
+class Histogram:
+    """按分桶统计观测值的分布，线程安全"""
+
+    def __init__(self, name, help, labelnames=(), buckets=REQUEST_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._values = {}  # {标签值: [各分桶计数..., 总数, 总和]}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels[name] for name in self.labelnames)
+        with self._lock:
+            counts = self._values.get(key)
+            if counts is None:
+                counts = self._values[key] = [0] * len(self.buckets) + [0, 0.0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            counts[-2] += 1
+            counts[-1] += value
+
+    def expose(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        names = self.labelnames + ('le',)
+        with self._lock:
+            for key, counts in sorted(self._values.items()):
+                for bound, count in zip(self.buckets, counts):
+                    lines.append(f'{self.name}_bucket{_format_labels(names, key + (bound,))} {count}')
+                lines.append(f'{self.name}_bucket{_format_labels(names, key + ("+Inf",))} {counts[-2]}')
+                labels = _format_labels(self.labelnames, key)
+                lines.append(f'{self.name}_count{labels} {counts[-2]}')
+                lines.append(f'{self.name}_sum{labels} {_format_value(counts[-1])}')
+        return lines
+
+
+REQUEST_SECONDS = Histogram('novel_reader_request_seconds', '请求处理耗时（秒）', ('route', 'status'))
+STAGE_SECONDS = Histogram('novel_reader_stage_seconds', '请求各处理阶段的耗时（秒）', ('route', 'stage'))
+UPLOADS = Counter('novel_reader_uploads_total', '处理结束的上传分章任务数', ('status',))
+UPLOAD_BYTES = Counter('novel_reader_upload_bytes_total', '已分章的上传文件字节数')
+UPLOAD_SECONDS = Histogram('novel_reader_upload_split_seconds', '上传文件分章耗时（秒）', buckets=UPLOAD_BUCKETS)
+SLOW_PROFILES = Counter('novel_reader_slow_request_profiles_total', '写出的慢请求采样文件数', ('route',))
+
+METRICS = [REQUEST_SECONDS, STAGE_SECONDS, UPLOADS, UPLOAD_BYTES, UPLOAD_SECONDS, SLOW_PROFILES]
+
+
+class SamplingProfiler:
+    """
+    采样分析器：一个后台线程定时读取已登记线程的调用栈并计数，对被采样的线程几乎没有额外开销。
+
+    :param interval: 采样间隔（秒）
+    """
+
+    def __init__(self, interval):
+        self.interval = interval
+        self._threads = {}  # {线程 id: 调用栈计数}
+        self._lock = threading.Lock()
+        self._sampler = None
+
+    def start(self, thread_id):
+        with self._lock:
+            self._threads[thread_id] = _Tally()
+            if self._sampler is None:
+                self._sampler = threading.Thread(target=self._run, name='profiler', daemon=True)
+                self._sampler.start()
+
+    def stop(self, thread_id):
+        """停止采样该线程，返回 {折叠调用栈: 采样次数}"""
+        with self._lock:
+            return self._threads.pop(thread_id, _Tally())
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            frames = sys._current_frames()
+            with self._lock:
+                for thread_id, tally in self._threads.items():
+                    frame = frames.get(thread_id)
+                    if frame is not None:
+                        tally[_collapse(frame)] += 1
+
+
+def _collapse(frame):
+    stack = []
+    while frame is not None:
+        code = frame.f_code
+        stack.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})')
+        frame = frame.f_back
+    return ';'.join(reversed(stack))
+
+
+profiler = SamplingProfiler(PROFILE_INTERVAL_MS / 1000) if PROFILE_SLOW_MS > 0 else None
+_request = threading.local()
+
+
+def start_request(route):
+    """请求开始时调用（在处理请求的线程中）"""
+    _request.route = route or 'unknown'
+    _request.start = time.perf_counter()
+    _request.stages = []
+    if profiler:
+        profiler.start(threading.get_ident())
+
+
+def finish_request(status, description=''):
+    """
+    请求结束时调用，记录耗时；超过采样阈值时写出调用栈采样。
+
+    :param status: HTTP 状态码
+    :param description: 写入采样文件首行的说明（如请求方法和地址）
+    :return: [(阶段, 耗时秒数)]，用于 Server-Timing 响应头
+    """
+    start = getattr(_request, 'start', None)
+    if start is None:
+        return []
+    elapsed = time.perf_counter() - start
+    route = _request.route
+    stages = _request.stages
+    _request.start = None
+    REQUEST_SECONDS.observe(elapsed, route=route, status=status)
+    if profiler:
+        samples = profiler.stop(threading.get_ident())
+        if elapsed * 1000 >= PROFILE_SLOW_MS and samples:
+            _write_profile(route, elapsed, samples, description)
+    return stages + [('total', elapsed)]
+
+
+@contextmanager
+def stage(name):
+    """统计当前请求中一个处理阶段的耗时：with stage('read'): ..."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        route = getattr(_request, 'route', None)
+        if route is not None and getattr(_request, 'start', None) is not None:
+            _request.stages.append((name, elapsed))
+            STAGE_SECONDS.observe(elapsed, route=route, stage=name)
+
+
+def record_upload(status, size, seconds=None):
+    """记录一个结束的上传分章任务"""
+    UPLOADS.inc(status=status)
+    if status == 'done':
+        UPLOAD_BYTES.inc(size)
+        if seconds is not None:
+            UPLOAD_SECONDS.observe(seconds)
+
+
+def _write_profile(route, elapsed, samples, description):
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    filename = '{}-{}-{:.0f}ms.txt'.format(
+        time.strftime('%Y%m%d-%H%M%S'), re.sub(r'[^\w.-]', '_', route), elapsed * 1000)
+    with open(os.path.join(PROFILE_DIR, filename), 'w', encoding='utf-8') as f:
+        f.write(f'# {description} {elapsed * 1000:.1f} ms，采样 {sum(samples.values())} 次\n')
+        for stack, count in samples.most_common():
+            f.write(f'{stack} {count}\n')
+    SLOW_PROFILES.inc(route=route)
+
+
+def render(caches=None, prefetch=None):
+    """
+    Prometheus 文本格式的全部指标。
+
+    :param caches: {缓存名: LRUCache}，输出各缓存的命中、未命中、淘汰次数、占用和命中率
+    :param prefetch: Prefetcher.stats() 的返回值，输出预取次数与命中率
+    """
+    lines = []
+    for metric in METRICS:
+        lines.extend(metric.expose())
+    if caches:
+        stats = {name: cache.stats() for name, cache in caches.items()}
+        for field, kind, help in (('hits', 'counter', '缓存命中次数'),
+                                  ('misses', 'counter', '缓存未命中次数'),
+                                  ('evictions', 'counter', '缓存淘汰次数'),
+                                  ('entries', 'gauge', '缓存条目数'),
+                                  ('bytes', 'gauge', '缓存占用字节数'),
+                                  ('max_bytes', 'gauge', '缓存字节数上限')):
+            name = f'novel_reader_cache_{field}' + ('_total' if kind == 'counter' else '')
+            lines += [f'# HELP {name} {help}', f'# TYPE {name} {kind}']
+            lines += [f'{name}{{cache="{cache}"}} {s[field]}' for cache, s in stats.items()]
+        name = 'novel_reader_cache_hit_ratio'
+        lines += [f'# HELP {name} 缓存命中率', f'# TYPE {name} gauge']
+        for cache, s in stats.items():
+            lookups = s['hits'] + s['misses']
+            lines.append(f'{name}{{cache="{cache}"}} {s["hits"] / lookups if lookups else 0.0}')
+    if prefetch:
+        for field, help in (('scheduled', '加入预取队列的页面数'), ('completed', '预取完成的页面数'),
+                            ('dropped', '队列已满丢弃的预取数'), ('failed', '预取失败数'),
+                            ('hits', '预取后被读者打开的页面数')):
+            name = f'novel_reader_prefetch_{field}_total'
+            lines += [f'# HELP {name} {help}', f'# TYPE {name} counter', f'{name} {prefetch[field]}']
+        name = 'novel_reader_prefetch_hit_ratio'
+        lines += [f'# HELP {name} 预取命中率', f'# TYPE {name} gauge', f'{name} {prefetch["hit_rate"]}']
+    return '\n'.join(lines) + '\n'
@@ -1,4 +1,7 @@
-import undetected_chromedriver as uc
+try:
+    import undetected_chromedriver as uc
+except ImportError:  # 只用异步下载（pixiv_async.py）时可以不装浏览器相关依赖
+    uc = None
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
@@ -6,6 +9,10 @@ from selenium.common.exceptions import TimeoutException, NoSuchElementException
 import os
 import time
 import re
+from storage import save_chapter
+from search import index_chapter
+from catalog import update_novel
+from journal import DownloadJournal, with_retries
 
 def safe_get(driver, url, wait_time=10):
     """
@@ -58,26 +65,61 @@ def get_chapter_text(driver, chapter_url, novel_title=""):
 
 
 def save_text(folder_path, index, title, text):
-    """保存章节内容到文件"""
+    """保存章节内容到文件，返回保存的文件名"""
     safe_title = sanitize_filename(title)
-    filename = os.path.join(folder_path, f"{index:04d}_{safe_title}.txt")
-    with open(filename, 'w', encoding='utf-8') as f:
-        f.write(text)
+    chapter_filename = f"{index:04d}_{safe_title}.txt"
+    filename = os.path.join(folder_path, chapter_filename)
+    # 通过存储层保存（按小说的存储格式写入并登记到章节清单）
+    save_chapter(folder_path, chapter_filename, text)
+    index_chapter(folder_path, chapter_filename, text)
+    update_novel(folder_path)
     print(f"[SAVE] 已保存章节：{filename}")
+    return chapter_filename
+
+
+def download_text(driver, journal, url, folder_path, index, title):
+    """
+    下载并保存一章，结果记入下载日志；已下载过的章节直接跳过
+
+    :return: 成功（含跳过）返回 True，重试后仍失败返回 False
+    """
+    if journal.is_done(url):
+        print(f"[SKIP] 已下载，跳过：{title}")
+        return True
+    try:
+        chapter_text = with_retries(get_chapter_text, driver, url, title)
+    except Exception as e:
+        print(f"[ERROR] 章节下载失败：{url} {e}")
+        journal.mark_failed(url, e)
+        return False
+    chapter_filename = save_text(folder_path, index, title, chapter_text)
+    journal.mark_done(url, chapter_filename, chapter_text)
+    return True
 
 
 def get_series_text(driver, series_url, folder_path):
-    """获取系列所有章节"""
+    """
+    获取系列章节：只下载还没保存的章节，新章节的序号接在已有章节之后
+
+    :return: {'chapters': 系列章节数, 'skipped': 已保存跳过的章节数, 'fetched': 下载的章节数, 'failed': 失败的章节数}
+    """
     print("[INFO] 开始获取系列章节列表...")
     safe_get(driver, series_url)
     li_elements = driver.find_elements(By.CSS_SELECTOR, 'li.sc-72a2a0c5-2.bdsPlW')
     urls = [li.find_element(By.TAG_NAME, "a").get_attribute("href") for li in li_elements]
-    titles = [li.find_elements(By.TAG_NAME, "a")[1].text.strip() for li in li_elements]
+    titles = dict(zip(urls, (li.find_elements(By.TAG_NAME, "a")[1].text.strip() for li in li_elements)))
     print(f"[INFO] 共检测到 {len(urls)} 章")
-    for index, (url, title) in enumerate(zip(urls, titles), start=1):
-        chapter_text = get_chapter_text(driver, url, title)
-        save_text(folder_path, index, title, chapter_text)
-    print("[INFO] 系列章节下载完成！")
+    # 下载日志记录已完成的章节和系列地址，重新运行或 sync.py 更新时只下载新增和缺失的章节
+    journal = DownloadJournal(folder_path)
+    if journal.source != {'site': 'pixiv', 'url': series_url}:
+        journal.set_source('pixiv', series_url)
+    pending, skipped = journal.plan(urls)
+    failed = 0
+    for index, url in pending:
+        if not download_text(driver, journal, url, folder_path, index, titles[url]):
+            failed += 1
+    print(f"[INFO] 系列章节下载完成！跳过 {skipped} 章，下载 {len(pending) - failed} 章，失败 {failed} 章")
+    return {'chapters': len(urls), 'skipped': skipped, 'fetched': len(pending) - failed, 'failed': failed}
 
 
 def create_folder(path, title):
@@ -93,8 +135,7 @@ def get_novel_text(driver, url, tag, title):
     folder_path = create_folder("novels", title)
     if tag == "chapter":
         print("[INFO] 检测到单章模式，开始下载...")
-        chapter_text = get_chapter_text(driver, url, title)
-        save_text(folder_path, 1, title, chapter_text)
+        download_text(driver, DownloadJournal(folder_path), url, folder_path, 1, title)
     elif tag == "series":
         print("[INFO] 检测到系列模式，开始下载...")
         get_series_text(driver, url, folder_path)
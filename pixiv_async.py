@@ -0,0 +1,244 @@
+"""
+pixiv 异步批量下载。
+
+不启动浏览器，直接用 Cookie 登录态请求 pixiv 的小说 ajax 接口：
+id.txt 中的多个小说 id 同时处理，系列的章节列表和各章正文并发获取，按系列顺序保存。
+与 pixiv.py 共用保存逻辑（save_text）和下载日志，断点续传、id.txt 进度回写的行为一致。
+sync_series 供 sync.py 增量更新已下载的系列。
+
+用法：python pixiv_async.py [--ids id.txt] [--cookies cookies.txt] [--novels 3] [--requests 8]
+"""
+import os
+import re
+import time
+import asyncio
+import argparse
+
+import aiohttp
+
+from pixiv import convert_cookies, create_folder, save_text
+from journal import DownloadJournal, with_retries_async
+
+PIXIV_URL = 'https://www.pixiv.net'
+USER_AGENT = ('Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 '
+              '(KHTML, like Gecko) Chrome/120.0 Safari/537.36')
+# 系列章节列表接口每页条数
+SERIES_PAGE_SIZE = 30
+# 系列地址中的系列 id
+SERIES_URL_PATTERN = re.compile(r'/novel/series/(\d+)')
+
+# pixiv 正文标记：[[rb:汉字 > 注音]]、[[jumpuri:文字 > 链接]] 保留文字，其余标记整行或整段去掉
+RUBY_PATTERN = re.compile(r'\[\[(?:rb|jumpuri):\s*(.*?)\s*>.*?\]\]')
+CHAPTER_MARK_PATTERN = re.compile(r'\[chapter:\s*(.*?)\]')
+DROP_MARK_PATTERN = re.compile(r'\[(?:newpage|jump:\d+|pixivimage:[^\]]*|uploadedimage:[^\]]*)\]')
+
+
+def clean_text(content):
+    """把接口返回的正文转换成与网页版相同的纯文本：去掉标记、空行和省略号行"""
+    lines = []
+    for line in content.splitlines():
+        line = RUBY_PATTERN.sub(r'\1', line)
+        line = CHAPTER_MARK_PATTERN.sub(r'\1', line)
+        line = DROP_MARK_PATTERN.sub('', line).strip()
+        if line and line != '…':
+            lines.append(line)
+    return '\n'.join(lines)
+
+
+class PixivDownloader:
+    """
+    共享同一个已登录会话的异步下载器。
+
+    :param session: 带 Cookie 的 aiohttp 会话
+    :param base_url: 站点地址（测试时可指向本地替身站点）
+    :param max_requests: 同时进行的请求数上限
+    """
+
+    def __init__(self, session, base_url=PIXIV_URL, max_requests=8):
+        self.session = session
+        self.base_url = base_url
+        self._requests = asyncio.Semaphore(max_requests)
+        self.saved = 0
+        self.skipped = 0
+        self.failed = 0
+
+    async def get_json(self, path, params=None):
+        async with self._requests:
+            async with self.session.get(self.base_url + path, params=params) as response:
+                data = await response.json(content_type=None)
+        if response.status != 200 or data.get('error'):
+            raise RuntimeError(f"{path} 请求失败：{data.get('message') or response.status}")
+        return data['body']
+
+    async def get_novel(self, novel_id):
+        return await with_retries_async(self.get_json, f'/ajax/novel/{novel_id}')
+
+    async def get_series_contents(self, series_id):
+        """系列全部章节 [(id, 标题)]，按系列顺序"""
+        contents = []
+        while True:
+            body = await with_retries_async(
+                self.get_json, f'/ajax/novel/series_content/{series_id}',
+                {'limit': SERIES_PAGE_SIZE, 'last_order': len(contents), 'order_by': 'asc'})
+            page = body['page']['seriesContents']
+            contents.extend((item['id'], item['title']) for item in page)
+            if len(page) < SERIES_PAGE_SIZE:
+                return contents
+
+    def chapter_url(self, novel_id):
+        return f'{self.base_url}/novel/show.php?id={novel_id}'
+
+    async def download(self, novel_id):
+        """下载一个 id：属于系列时下载整个系列，否则作为单章下载"""
+        novel = await self.get_novel(novel_id)
+        series = novel.get('seriesNavData')
+        if series:
+            print(f"[INFO] 检测到系列：{series['title']}")
+            await self.download_series(series['seriesId'], series['title'])
+        else:
+            print(f"[INFO] 单章：{novel['title']}")
+            folder_path = create_folder("novels", novel['title'])
+            journal = DownloadJournal(folder_path)
+            url = self.chapter_url(novel_id)
+            if journal.is_done(url):
+                self.skipped += 1
+            else:
+                await self.save(journal, url, folder_path, 1, novel['title'], clean_text(novel['content']))
+
+    def series_url(self, series_id):
+        return f'{self.base_url}/novel/series/{series_id}'
+
+    async def download_series(self, series_id, title):
+        """
+        下载系列中还没保存的章节，新章节的序号接在已有章节之后
+
+        :return: {'chapters': 系列章节数, 'skipped': 已保存跳过的章节数, 'fetched': 下载的章节数, 'failed': 失败的章节数}
+        """
+        folder_path = create_folder("novels", title)
+        journal = DownloadJournal(folder_path)
+        series_url = self.series_url(series_id)
+        if journal.source != {'site': 'pixiv', 'url': series_url}:
+            journal.set_source('pixiv', series_url)
+        contents = await self.get_series_contents(series_id)
+        print(f"[INFO] 《{title}》共 {len(contents)} 章")
+        chapters = {self.chapter_url(chapter_id): (chapter_id, chapter_title) for chapter_id, chapter_title in contents}
+        pending, skipped = journal.plan(list(chapters))
+        self.skipped += skipped
+
+        # 未下载的章节同时请求，按系列顺序依次保存
+        tasks = [(index, url, asyncio.ensure_future(self.get_novel(chapters[url][0]))) for index, url in pending]
+        failed = 0
+        for index, url, task in tasks:
+            try:
+                novel = await task
+            except Exception as e:
+                print(f"[ERROR] 章节下载失败：{url} {e}")
+                journal.mark_failed(url, e)
+                self.failed += 1
+                failed += 1
+                continue
+            await self.save(journal, url, folder_path, index, chapters[url][1], clean_text(novel['content']))
+        return {'chapters': len(contents), 'skipped': skipped, 'fetched': len(pending) - failed, 'failed': failed}
+
+    async def save(self, journal, url, folder_path, index, title, text):
+        # 写文件、更新索引是阻塞操作，放到线程中执行，不阻塞其他下载
+        chapter_filename = await asyncio.to_thread(save_text, folder_path, index, title, text)
+        journal.mark_done(url, chapter_filename, text)
+        self.saved += 1
+
+
+def open_session(cookies, max_requests=8):
+    """带登录 Cookie 的 aiohttp 会话"""
+    headers = {'User-Agent': USER_AGENT, 'Referer': PIXIV_URL + '/'}
+    jar = {cookie['name']: cookie['value'] for cookie in cookies}
+    connector = aiohttp.TCPConnector(limit=max_requests)
+    return aiohttp.ClientSession(headers=headers, cookies=jar, connector=connector)
+
+
+async def sync_series(tracked, cookies, base_url=PIXIV_URL, max_novels=3, max_requests=8):
+    """
+    增量更新已记录来源的系列：只请求系列章节列表，下载新增和之前失败的章节。
+
+    :param tracked: [(小说目录, 来源)]，即 journal.tracked_novels(site='pixiv')
+    :return: {小说目录: download_series 的结果}，出错的系列为 {'error': 错误信息}
+    """
+    results = {}
+    async with open_session(cookies, max_requests) as session:
+        downloader = PixivDownloader(session, base_url, max_requests)
+        novels = asyncio.Semaphore(max_novels)
+
+        async def run(folder_path, source):
+            async with novels:
+                match = SERIES_URL_PATTERN.search(source['url'])
+                try:
+                    if not match:
+                        raise ValueError(f"无法识别的系列地址：{source['url']}")
+                    results[folder_path] = await downloader.download_series(match.group(1),
+                                                                            os.path.basename(folder_path))
+                except Exception as e:
+                    print(f"[ERROR] {folder_path} 更新失败：{e}")
+                    results[folder_path] = {'error': str(e)}
+
+        await asyncio.gather(*(run(folder_path, source) for folder_path, source in tracked))
+    return results
+
+
+def _write_ids(filename, novel_ids, sep):
+    with open(filename, "w", encoding="utf-8") as f:
+        f.write(sep.join(novel_ids))
+
+
+async def process_by_file(filename, cookies, base_url=PIXIV_URL, max_novels=3, max_requests=8):
+    """
+    同时下载 id 文件中的多个小说，每完成一个就从文件中删除（与 pixiv.process_by_file 一致）。
+
+    :param cookies: convert_cookies 的返回值
+    :param max_novels: 同时处理的小说 id 数
+    :param max_requests: 同时进行的请求数上限
+    :return: 下载器（含保存、跳过、失败的章节数）
+    """
+    with open(filename, "r", encoding="utf-8") as f:
+        content = f.read().strip()
+    sep = "\n" if "\n" in content else " "
+    novel_ids = content.split(sep) if content else []
+    remaining = list(novel_ids)
+
+    async with open_session(cookies, max_requests) as session:
+        downloader = PixivDownloader(session, base_url, max_requests)
+        novels = asyncio.Semaphore(max_novels)
+
+        async def run(novel_id):
+            async with novels:
+                start_time = time.time()
+                try:
+                    await downloader.download(novel_id.strip())
+                except Exception as e:
+                    print(f"[ERROR] 小说 {novel_id} 下载失败：{e}")
+                    return
+                print(f"[DONE] {novel_id} 用时: {time.time() - start_time:.2f} 秒")
+                remaining.remove(novel_id)
+                _write_ids(filename, remaining, sep)
+
+        await asyncio.gather(*(run(novel_id) for novel_id in novel_ids))
+    return downloader
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='pixiv 异步批量下载')
+    parser.add_argument('--ids', default='id.txt', help='小说 id 文件')
+    parser.add_argument('--cookies', default='cookies.txt', help='Cookie 文件')
+    parser.add_argument('--novels', type=int, default=3, help='同时处理的小说 id 数')
+    parser.add_argument('--requests', type=int, default=8, help='同时进行的请求数上限')
+    parser.add_argument('--base-url', default=PIXIV_URL, help='站点地址（测试时可指向本地替身站点）')
+    args = parser.parse_args()
+
+    start_time = time.time()
+    try:
+        result = asyncio.run(process_by_file(args.ids, convert_cookies(args.cookies), args.base_url,
+                                             args.novels, args.requests))
+    except KeyboardInterrupt:
+        print("\n[EXIT] 手动中断程序")
+    else:
+        minutes = (time.time() - start_time) / 60
+        print(f"[REPORT] 保存 {result.saved} 章，跳过 {result.skipped} 章，失败 {result.failed} 章，"
+              f"用时 {minutes * 60:.1f} 秒，{result.saved / minutes if minutes else 0:.1f} 章/分钟")
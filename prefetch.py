@@ -0,0 +1,87 @@
+"""
+阅读预取。
+
+阅读基本是顺序的：返回一页之后，在后台线程里把下一页（或下一章第一页）提前渲染进页面缓存，
+读者翻页时直接命中缓存。统计预取了多少页、其中多少页后来真的被读到（命中率）。
+"""
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+# 记住最近预取的页面数，用于统计命中（超出后最早的记录丢弃，视为未命中）
+MAX_TRACKED = 10000
+
+
+class Prefetcher:
+    """
+    后台预取队列，同一页面在队列中只保留一个任务。
+
+    :param workers: 后台线程数
+    :param max_pending: 排队任务数上限，超出时丢弃新的预取（预取只是优化，不能拖慢正常请求）
+    """
+
+    def __init__(self, workers=1, max_pending=64):
+        self.max_pending = max_pending
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='prefetch')
+        self._pending = set()
+        self._prefetched = OrderedDict()  # 已预取、尚未被读到的页面
+        self._lock = threading.Lock()
+        self.scheduled = 0
+        self.completed = 0
+        self.dropped = 0
+        self.failed = 0
+        self.hits = 0
+
+    def schedule(self, key, func, *args):
+        """
+        在后台调用 func(*args) 预取 key 对应的页面。
+
+        func 返回真值表示确实生成了新内容（已在缓存中时应返回假值，不计入预取）。
+        """
+        with self._lock:
+            if key in self._pending:
+                return
+            if len(self._pending) >= self.max_pending:
+                self.dropped += 1
+                return
+            self._pending.add(key)
+            self.scheduled += 1
+        self._executor.submit(self._run, key, func, args)
+
+    def _run(self, key, func, args):
+        try:
+            prefetched = func(*args)
+        except Exception as e:
+            print(f"[PREFETCH] {key} 预取失败：{e}")
+            prefetched = False
+            with self._lock:
+                self.failed += 1
+        with self._lock:
+            self._pending.discard(key)
+            if prefetched:
+                self.completed += 1
+                self._prefetched[key] = True
+                self._prefetched.move_to_end(key)
+                while len(self._prefetched) > MAX_TRACKED:
+                    self._prefetched.popitem(last=False)
+
+    def mark_served(self, key):
+        """页面从缓存返回给读者时调用，若是预取的页面则计为一次命中"""
+        with self._lock:
+            if self._prefetched.pop(key, None):
+                self.hits += 1
+                return True
+            return False
+
+    def stats(self):
+        """预取次数、命中次数与命中率"""
+        with self._lock:
+            return {
+                'scheduled': self.scheduled,
+                'completed': self.completed,
+                'dropped': self.dropped,
+                'failed': self.failed,
+                'hits': self.hits,
+                'hit_rate': self.hits / self.completed if self.completed else 0.0,
+                'pending': len(self._pending),
+            }
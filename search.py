@@ -0,0 +1,365 @@
+"""
+全书库全文搜索。
+
+中文没有空格分词，按字的二元组（bigram，单字查询用单字）建倒排索引，
+存放在 novels/.search.db（SQLite）：每个 (词元, 小说) 一行，记录包含该词元的段落块
+（章节 + 章内每 BLOCK_PARAGRAPHS 个段落为一块）。章节按文件名登记，补下中间缺失的章节后
+其余章节的位置变化不影响索引。
+查询时先对各词元的段落块集合求交，再通过段落索引只读取候选块的几个段落确认命中，
+读取量与章节和书库大小无关。
+
+上传分章、爬虫保存章节时增量建索引，删除、重命名小说时同步更新。
+重建整个索引：python search.py rebuild [--root novels]
+"""
+import os
+import zlib
+import sqlite3
+import argparse
+import threading
+from array import array
+
+from storage import load_manifest, read_chapter, read_paragraphs
+
+INDEX_NAME = '.search.db'
+# 索引格式版本，与数据库中的不同时清空索引，需重新运行 rebuild
+SCHEMA_VERSION = 2
+# 每个段落块的段落数：越小候选越精确，索引也越大
+BLOCK_PARAGRAPHS = 8
+# 倒排表中每项为 uint32：(章节在本书中的编号 << BLOCK_BITS) | 段落块序号，排序后 zlib 压缩存储
+BLOCK_BITS = 16
+BLOCK_MASK = (1 << BLOCK_BITS) - 1
+
+# 每次查询最多返回的结果数
+MAX_RESULTS = 50
+# 结果摘要中命中词前后保留的字数
+SNIPPET_CONTEXT = 30
+# 单条 SQL 中 IN (...) 的最多参数个数
+QUERY_BATCH = 500
+
+_local = threading.local()
+
+
+def _connect(root):
+    """每个线程、每个书库各用一个连接"""
+    connections = getattr(_local, 'connections', None)
+    if connections is None:
+        connections = _local.connections = {}
+    conn = connections.get(root)
+    if conn is None:
+        conn = sqlite3.connect(os.path.join(root, INDEX_NAME), timeout=30)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        if conn.execute('PRAGMA user_version').fetchone()[0] != SCHEMA_VERSION:
+            with conn:
+                stale = conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'postings'").fetchone()
+                conn.executescript(f'''
+                    DROP TABLE IF EXISTS postings;
+                    DROP TABLE IF EXISTS chapters;
+                    DROP TABLE IF EXISTS novels;
+                    PRAGMA user_version = {SCHEMA_VERSION};
+                ''')
+            if stale:
+                print("[INDEX] 搜索索引格式已更新，请运行 python search.py rebuild 重建")
+        conn.executescript('''
+            CREATE TABLE IF NOT EXISTS novels (id INTEGER PRIMARY KEY, name TEXT UNIQUE NOT NULL);
+            CREATE TABLE IF NOT EXISTS chapters (
+                novel INTEGER NOT NULL,
+                seq INTEGER NOT NULL,
+                file TEXT NOT NULL,
+                PRIMARY KEY (novel, seq),
+                UNIQUE (novel, file)
+            );
+            CREATE TABLE IF NOT EXISTS postings (
+                gram TEXT NOT NULL,
+                novel INTEGER NOT NULL,
+                blocks BLOB NOT NULL,
+                PRIMARY KEY (gram, novel)
+            );
+            CREATE INDEX IF NOT EXISTS postings_novel ON postings (novel);
+        ''')
+        connections[root] = conn
+    return conn
+
+
+def ensure_index(root):
+    """建好索引数据库（多个进程同时写入之前，先在一个进程中调用）"""
+    _connect(root)
+
+
+def close_connections():
+    """关闭当前线程打开的连接（创建子进程前调用，SQLite 连接不能跨进程共用）"""
+    connections = getattr(_local, 'connections', None) or {}
+    for conn in connections.values():
+        conn.close()
+    connections.clear()
+
+
+def tokenize(text):
+    """
+    把文本切成词元集合：相邻两字组成的二元组，外加单字（支持单字查询）。
+
+    英文统一小写，空白字符不参与组词。
+    """
+    grams = set()
+    for part in text.lower().split():
+        grams.update(part)
+        grams.update(part[i:i + 2] for i in range(len(part) - 1))
+    return grams
+
+
+def query_grams(query):
+    """查询串对应的词元：多于一个字时只用二元组"""
+    query = query.lower()
+    if len(query) == 1:
+        return {query}
+    return {query[i:i + 2] for i in range(len(query) - 1) if not any(c.isspace() for c in query[i:i + 2])}
+
+
+def _begin_write(conn):
+    """
+    在 with conn: 中开始写事务并立即取得写锁。
+
+    先读后写的延迟事务在其他连接提交后无法升级为写事务，会直接报 database is locked；
+    BEGIN IMMEDIATE 则在开始时按连接的 timeout 排队等待写锁。
+    """
+    conn.execute('BEGIN IMMEDIATE')
+
+
+def _novel_id(conn, name, create=False):
+    row = conn.execute('SELECT id FROM novels WHERE name = ?', (name,)).fetchone()
+    if row:
+        return row[0]
+    if create:
+        return conn.execute('INSERT INTO novels (name) VALUES (?)', (name,)).lastrowid
+    return None
+
+
+def _chapter_seq(conn, novel, filename):
+    """章节在本书中的编号（按登记顺序分配，与章节在目录中的位置无关）"""
+    row = conn.execute('SELECT seq FROM chapters WHERE novel = ? AND file = ?', (novel, filename)).fetchone()
+    if row:
+        return row[0]
+    seq = conn.execute('SELECT COALESCE(MAX(seq) + 1, 0) FROM chapters WHERE novel = ?', (novel,)).fetchone()[0]
+    conn.execute('INSERT INTO chapters (novel, seq, file) VALUES (?, ?, ?)', (novel, seq, filename))
+    return seq
+
+
+def _pack_blocks(keys):
+    return zlib.compress(array('I', sorted(keys)).tobytes(), 1)
+
+
+def _unpack_blocks(blob):
+    return array('I', zlib.decompress(blob))
+
+
+def tokenize_blocks(text):
+    """
+    按段落块切分词元（分段规则与阅读页一致：按换行拆分，去掉空白段落）。
+
+    :return: {段落块序号: 词元集合}
+    """
+    paragraphs = [p for p in text.split('\n') if p.strip()]
+    return {i // BLOCK_PARAGRAPHS: tokenize('\n'.join(paragraphs[i:i + BLOCK_PARAGRAPHS]))
+            for i in range(0, len(paragraphs), BLOCK_PARAGRAPHS)}
+
+
+def _add_postings(postings, seq, blocks):
+    """
+    把一章各段落块的词元加入 {词元: array('I')}；超出编号范围的段落块并入最后一块。
+
+    :param blocks: tokenize_blocks 的结果
+    """
+    base = seq << BLOCK_BITS
+    for block, grams in blocks.items():
+        key = base | min(block, BLOCK_MASK)
+        for gram in grams:
+            block_list = postings.get(gram)
+            if block_list is None:
+                block_list = postings[gram] = array('I')
+            if not block_list or block_list[-1] != key:
+                block_list.append(key)
+
+
+def index_novel(root, name):
+    """（重新）索引整本小说"""
+    book_folder = os.path.join(root, name)
+    chapters = load_manifest(book_folder)['chapters']
+
+    # 读取和切分词元都在事务之外完成，写锁只在替换倒排表时持有；章节整本重新登记，编号按清单顺序分配
+    postings = {}
+    for seq, entry in enumerate(chapters):
+        _add_postings(postings, seq, tokenize_blocks(read_chapter(book_folder, entry)))
+    rows = [(gram, _pack_blocks(block_list)) for gram, block_list in postings.items()]
+    del postings
+
+    conn = _connect(root)
+    with conn:
+        _begin_write(conn)
+        novel = _novel_id(conn, name, create=True)
+        conn.execute('DELETE FROM postings WHERE novel = ?', (novel,))
+        conn.execute('DELETE FROM chapters WHERE novel = ?', (novel,))
+        conn.executemany('INSERT INTO chapters (novel, seq, file) VALUES (?, ?, ?)',
+                         ((novel, seq, entry['file']) for seq, entry in enumerate(chapters)))
+        conn.executemany('INSERT INTO postings (gram, novel, blocks) VALUES (?, ?, ?)',
+                         ((gram, novel, blob) for gram, blob in rows))
+
+
+def index_chapter(book_folder, filename, text):
+    """把新保存的一章加入索引（供爬虫逐章保存后调用；同名章节重新保存时替换其段落块）"""
+    root, name = os.path.split(os.path.normpath(book_folder))
+    blocks = tokenize_blocks(text)
+    conn = _connect(root)
+    with conn:
+        # 读出已有倒排表、合并、写回在同一个写事务中完成，同时保存的章节不会互相覆盖
+        _begin_write(conn)
+        novel = _novel_id(conn, name, create=True)
+        seq = _chapter_seq(conn, novel, filename)
+        postings = {}
+        _add_postings(postings, seq, blocks)
+        grams = list(postings)
+        # 分批取出已有的倒排表，合并后一次写回
+        existing = {}
+        for i in range(0, len(grams), QUERY_BATCH):
+            batch = grams[i:i + QUERY_BATCH]
+            existing.update(conn.execute(
+                f"SELECT gram, blocks FROM postings WHERE novel = ? AND gram IN ({','.join('?' * len(batch))})",
+                (novel, *batch)))
+        rows = []
+        for gram, block_list in postings.items():
+            blob = existing.get(gram)
+            if blob:
+                # 去掉本章旧的段落块（内容已变的旧词元留在其他倒排表中，查询确认时会被排除）
+                block_list = [key for key in _unpack_blocks(blob) if key >> BLOCK_BITS != seq] + list(block_list)
+            rows.append((gram, novel, _pack_blocks(block_list)))
+        conn.executemany('INSERT OR REPLACE INTO postings (gram, novel, blocks) VALUES (?, ?, ?)', rows)
+
+
+def remove_novel(root, name):
+    """删除小说的索引"""
+    conn = _connect(root)
+    with conn:
+        novel = _novel_id(conn, name)
+        if novel is not None:
+            conn.execute('DELETE FROM postings WHERE novel = ?', (novel,))
+            conn.execute('DELETE FROM chapters WHERE novel = ?', (novel,))
+            conn.execute('DELETE FROM novels WHERE id = ?', (novel,))
+
+
+def rename_novel(root, old_name, new_name):
+    """小说改名后同步索引（倒排表按小说 id 存储，只需改名字）"""
+    conn = _connect(root)
+    with conn:
+        conn.execute('UPDATE novels SET name = ? WHERE name = ?', (new_name, old_name))
+
+
+def _candidates(conn, grams):
+    """
+    对各词元的段落块集合求交。
+
+    :return: {小说名: {章节文件名: [候选段落块序号]}}
+    """
+    placeholders = ','.join('?' * len(grams))
+    rows = conn.execute(
+        f'SELECT p.novel, n.name, p.blocks FROM postings p JOIN novels n ON n.id = p.novel '
+        f'WHERE p.gram IN ({placeholders})', tuple(grams)).fetchall()
+
+    per_novel = {}
+    for novel, name, blob in rows:
+        per_novel.setdefault((novel, name), []).append(blob)
+
+    result = {}
+    for (novel, name), blobs in per_novel.items():
+        # 所有词元都出现过的小说才可能命中；从最短的倒排表开始求交，长表只做成员判断
+        if len(blobs) < len(grams):
+            continue
+        blobs.sort(key=len)
+        keys = set(_unpack_blocks(blobs[0]))
+        for blob in blobs[1:]:
+            if not keys:
+                break
+            keys = keys.intersection(_unpack_blocks(blob))
+        if not keys:
+            continue
+        files = dict(conn.execute('SELECT seq, file FROM chapters WHERE novel = ?', (novel,)))
+        chapters = {}
+        for key in sorted(keys):
+            filename = files.get(key >> BLOCK_BITS)
+            if filename is not None:
+                chapters.setdefault(filename, []).append(key & BLOCK_MASK)
+        result[name] = chapters
+    return result
+
+
+def search(root, query, limit=MAX_RESULTS):
+    """
+    在全书库中搜索。
+
+    :param root: 书库目录
+    :param query: 查询串
+    :param limit: 最多返回的结果数
+    :return: [{'novel', 'chapter_index', 'chapter_title', 'paragraph', 'snippet'}]，paragraph 为章节内非空段落序号
+    """
+    query = query.strip()
+    grams = query_grams(query)
+    if not grams or not os.path.exists(os.path.join(root, INDEX_NAME)):
+        return []
+
+    needle = query.lower()
+    results = []
+    for name, candidates in sorted(_candidates(_connect(root), grams).items()):
+        book_folder = os.path.join(root, name)
+        if not os.path.isdir(book_folder):
+            continue
+        chapters = load_manifest(book_folder)['chapters']
+        positions = {entry['file']: i for i, entry in enumerate(chapters)}
+        for filename in sorted(candidates, key=lambda f: positions.get(f, -1)):
+            chapter_index = positions.get(filename)
+            if chapter_index is None:
+                continue
+            entry = chapters[chapter_index]
+            for block in candidates[filename]:
+                # 只读取候选段落块的几个段落确认命中位置
+                first = block * BLOCK_PARAGRAPHS
+                # 最后一块包含超出编号范围的全部段落
+                count = entry['paragraphs'] - first if block == BLOCK_MASK else BLOCK_PARAGRAPHS
+                paragraphs = read_paragraphs(book_folder, entry, first, count)
+                for paragraph_index, paragraph in enumerate(paragraphs, first):
+                    pos = paragraph.lower().find(needle)
+                    if pos < 0:
+                        continue
+                    start = max(0, pos - SNIPPET_CONTEXT)
+                    results.append({
+                        'novel': name,
+                        'chapter_index': chapter_index,
+                        'chapter_title': entry['title'],
+                        'paragraph': paragraph_index,
+                        'snippet': paragraph[start:pos + len(query) + SNIPPET_CONTEXT].strip(),
+                    })
+                    if len(results) >= limit:
+                        return results
+    return results
+
+
+def rebuild(root):
+    """重建整个书库的索引"""
+    for name in sorted(os.listdir(root)):
+        if name.startswith('.') or not os.path.isdir(os.path.join(root, name)):
+            continue
+        index_novel(root, name)
+        print(f"[INDEX] {name}")
+    conn = _connect(root)
+    existing = set(n for n in os.listdir(root) if not n.startswith('.'))
+    for (name,) in conn.execute('SELECT name FROM novels').fetchall():
+        if name not in existing:
+            remove_novel(root, name)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='全文搜索索引工具')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    rebuild_parser = subparsers.add_parser('rebuild', help='重建整个书库的搜索索引')
+    rebuild_parser.add_argument('--root', default='novels', help='书库目录')
+    args = parser.parse_args()
+
+    if args.command == 'rebuild':
+        rebuild(args.root)
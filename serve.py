@@ -0,0 +1,112 @@
+"""
+生产环境启动入口。
+
+用 gunicorn 多进程（每个进程多线程）提供服务：主进程先加载书架目录、各小说的章节清单和模板，
+再 fork 出工作进程，这些只读数据以写时复制的方式在进程间共享，工作进程启动后不必各自重新读取。
+没有安装 gunicorn 时（如 Windows）改用 waitress 单进程多线程。
+
+python app.py 仍是带调试器和自动重载的开发服务器。
+
+用法：python serve.py [--bind 0.0.0.0:5000] [--workers 4] [--threads 4]
+"""
+import gc
+import os
+import argparse
+
+try:
+    from gunicorn.app.base import BaseApplication
+except ImportError:  # gunicorn 不支持 Windows，可以只装 waitress
+    BaseApplication = None
+try:
+    import waitress
+except ImportError:
+    waitress = None
+
+from app import app, NOVEL_FOLDER
+from storage import load_manifest
+import catalog
+import jobs
+
+# 静态文件（/static）的浏览器缓存时间（秒）
+STATIC_MAX_AGE = 7 * 24 * 3600
+
+
+def preload(root=NOVEL_FOLDER):
+    """
+    在 fork 工作进程之前加载共享的只读数据：同步书架目录、读入各小说的章节清单、编译模板。
+
+    :return: 预加载的小说数
+    """
+    os.makedirs(root, exist_ok=True)
+    catalog.sync(root)
+    jobs.abandon_unfinished(root)
+    novels = catalog.all_novels(root)
+    for novel in novels:
+        load_manifest(os.path.join(root, novel['name']))
+    for name in app.jinja_env.list_templates():
+        app.jinja_env.get_template(name)
+    # SQLite 连接不能带进子进程，工作进程用到时各自重新连接
+    catalog.close_connections()
+    # 预加载的对象移出垃圾回收的扫描范围，避免工作进程里回收时改写这些内存页、破坏写时复制
+    gc.freeze()
+    return len(novels)
+
+
+def configure():
+    app.config['SEND_FILE_MAX_AGE_DEFAULT'] = STATIC_MAX_AGE
+    app.debug = False
+
+
+if BaseApplication is not None:
+    class ReaderApplication(BaseApplication):
+        """以指定配置运行阅读器的 gunicorn 应用"""
+
+        def __init__(self, options):
+            self.options = options
+            super().__init__()
+
+        def load_config(self):
+            for key, value in self.options.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            # preload_app 时在主进程中调用一次，之后才 fork 工作进程
+            configure()
+            print(f"[SERVE] 预加载 {preload()} 本小说")
+            return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description='以生产模式启动阅读器')
+    parser.add_argument('--bind', default='0.0.0.0:5000', help='监听地址')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='工作进程数')
+    parser.add_argument('--threads', type=int, default=4, help='每个工作进程的线程数')
+    parser.add_argument('--timeout', type=int, default=60, help='请求超时秒数')
+    parser.add_argument('--access-log', help='访问日志文件，- 为标准输出')
+    args = parser.parse_args()
+
+    if BaseApplication is not None:
+        if 'UPLOAD_WORKERS' not in os.environ:
+            # 每个工作进程各有一个分章进程池，合计不超过 CPU 核数
+            jobs.UPLOAD_WORKERS = max(1, (os.cpu_count() or 1) // args.workers)
+        ReaderApplication({
+            'bind': args.bind,
+            'workers': args.workers,
+            'threads': args.threads,
+            'worker_class': 'gthread',
+            'preload_app': True,
+            'timeout': args.timeout,
+            'keepalive': 5,
+            'accesslog': args.access_log,
+        }).run()
+    elif waitress is not None:
+        configure()
+        print(f"[SERVE] 未安装 gunicorn，使用 waitress 单进程 {args.threads} 线程；预加载 {preload()} 本小说")
+        host, _, port = args.bind.rpartition(':')
+        waitress.serve(app, host=host or '0.0.0.0', port=int(port), threads=args.threads)
+    else:
+        raise SystemExit("[ERROR] 生产模式需要安装 gunicorn（Linux/macOS）或 waitress（Windows）")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,1118 @@
+"""
+小说存储层。
+
+每本小说对应 novels/<小说名>/ 目录，支持两种存储格式：
+- dir：每章一个 NNNN_标题.txt，附带章节清单 .manifest.json 与段落索引 .paragraphs.idx
+- pack：整本小说打包为一个 novel.pack（章节内容 + 段落索引 + 目录表），可按章压缩
+
+阅读、上传、删除、重命名和爬虫保存都通过本模块进行，调用方无需关心具体格式。
+
+dir 格式的章节按内容去重：章节内容以 SHA-1 为名只存一份在 novels/.objects/ 中，
+各小说目录下的章节文件是指向它的硬链接，阅读时与普通文件无异。重新上传时内容未变的章节不再写入，
+删除小说后不再被任何小说引用的内容随之删除。环境变量 NOVEL_DEDUP=0 关闭去重。
+
+迁移旧目录：python storage.py migrate [--root novels] [--compress zlib|zstd]
+已有书库去重并输出去重前后的大小：python storage.py dedup [--root novels] [--dry-run]
+"""
+import os
+import sys
+import json
+import mmap
+import time
+import hashlib
+import shutil
+import struct
+import zlib
+import argparse
+from array import array
+
+try:
+    import zstandard
+except ImportError:  # zstd 压缩为可选依赖
+    zstandard = None
+
+try:
+    import fcntl
+except ImportError:  # Windows 下用 msvcrt 加锁
+    fcntl = None
+    import msvcrt
+
+# 每本小说目录下的章节清单文件（隐藏文件，不会被当成章节）
+MANIFEST_NAME = '.manifest.json'
+MANIFEST_VERSION = 2
+
+# 段落偏移索引：每个非空段落占一对 uint64（起始字节, 结束字节），按章节顺序追加。
+# 整本重写时原文件仍在使用，新章节与新索引改用带版本号的文件名，由清单记录（见 DirectoryWriter）
+INDEX_NAME = '.paragraphs.idx'
+PAIR_SIZE = array('Q').itemsize * 2
+
+# 打包格式：魔数 + 各章（内容、段落索引）+ JSON 目录表 + 文件尾（目录表偏移、魔数）
+PACK_NAME = 'novel.pack'
+# 整本重写已有的打包文件时，新文件带版本号（novel.<版本>.pack），由打包清单指向当前使用的文件
+PACK_MANIFEST_NAME = '.pack.json'
+PACK_MAGIC = b'NOVELPK1'
+PACK_FOOTER = struct.Struct('<Q8s')
+PACK_VERSION = 1
+# 追加前备份的原目录表与文件尾；追加中途崩溃时据此恢复打包文件
+PACK_UNDO_NAME = 'novel.pack.undo'
+# 写入打包文件期间持有的锁文件；拿不到锁说明有写入器正在追加，备份目录表不能用于恢复
+PACK_LOCK_NAME = 'novel.pack.lock'
+
+# 新小说的默认存储格式与打包压缩方式，可通过环境变量配置
+DEFAULT_FORMAT = os.environ.get('NOVEL_STORAGE', 'dir')
+DEFAULT_COMPRESSION = os.environ.get('NOVEL_COMPRESSION') or None
+
+# 按内容去重的章节存放在书库下的 .objects/<SHA-1 前两位>/<SHA-1>
+OBJECTS_NAME = '.objects'
+DEDUP = os.environ.get('NOVEL_DEDUP', '1') != '0'
+# 写入中的章节先缓存在内存，超过该大小才写临时文件；内容已存在的章节因此不产生任何写入
+SPILL_BYTES = 1024 * 1024
+
+# 进程内清单缓存：{小说目录: (清单来源文件, mtime, 清单)}
+_manifest_cache = {}
+
+
+def chapter_title_from_filename(filename):
+    """从章节文件名中提取标题（文件名格式：编号_标题.txt）"""
+    return os.path.splitext(filename)[0].split('_', 2)[-1]
+
+
+class ParagraphIndexer:
+    """
+    增量计算章节内每个非空段落的字节范围（与阅读页的分段规则一致：按换行拆分，去掉空白段落）。
+
+    章节内容可以分块 feed，跨块的段落由内部缓存拼接。
+    """
+
+    def __init__(self):
+        self.offsets = array('Q')
+        self.size = 0
+        self._pos = 0       # 未完成段落的起始字节
+        self._carry = []    # 未完成段落已收到的字节块
+
+    def feed(self, data):
+        self.size += len(data)
+        lines = data.split(b'\n')
+        if len(lines) == 1:
+            self._carry.append(data)
+            return
+        self._carry.append(lines[0])
+        lines[0] = b''.join(self._carry)
+        self._carry = [lines.pop()]
+
+        # 热点循环：局部变量加速
+        offsets = self.offsets
+        append = offsets.append
+        pos = self._pos
+        for line in lines:
+            end = pos + len(line)
+            if line.strip() and line.decode('utf-8', errors='ignore').strip():
+                append(pos)
+                # 兼容 \r\n 换行的旧章节文件
+                append(end - 1 if line.endswith(b'\r') else end)
+            pos = end + 1
+        self._pos = pos
+
+    def _add_line(self, line):
+        end = self._pos + len(line)
+        if line.strip() and line.decode('utf-8', errors='ignore').strip():
+            self.offsets.append(self._pos)
+            self.offsets.append(end - 1 if line.endswith(b'\r') else end)
+        self._pos = end + 1
+
+    def close(self):
+        """结束章节，返回 array('Q')，依次为每段的起始、结束字节偏移"""
+        self._add_line(b''.join(self._carry))
+        self._carry = []
+        return self.offsets
+
+
+def paragraph_offsets(data):
+    """
+    计算整章内容的段落字节范围。
+
+    :param data: 章节内容（utf-8 编码的 bytes）
+    :return: array('Q')，依次为每段的起始、结束字节偏移
+    """
+    indexer = ParagraphIndexer()
+    indexer.feed(data)
+    return indexer.close()
+
+
+def _write_offsets(f, offsets):
+    """段落偏移统一以小端序写入，打包文件可跨机器拷贝"""
+    if sys.byteorder == 'big':
+        offsets = array('Q', offsets)
+        offsets.byteswap()
+    offsets.tofile(f)
+
+
+def _read_offsets(f, count):
+    offsets = array('Q')
+    offsets.fromfile(f, count)
+    if sys.byteorder == 'big':
+        offsets.byteswap()
+    return offsets
+
+
+def _compressor(compression):
+    """返回分块压缩对象（compress/flush），不压缩时返回 None"""
+    if compression == 'zlib':
+        return zlib.compressobj()
+    if compression == 'zstd':
+        return zstandard.ZstdCompressor().compressobj()
+    return None
+
+
+def _decompress(blob, compression):
+    if compression == 'zlib':
+        return zlib.decompress(blob)
+    if compression == 'zstd':
+        # 分块压缩的帧头不含原始大小，需用流式解压
+        return zstandard.ZstdDecompressor().decompressobj().decompress(blob)
+    return blob
+
+
+def _check_compression(compression):
+    if compression not in (None, 'zlib', 'zstd'):
+        raise ValueError(f"不支持的压缩方式：{compression}")
+    if compression == 'zstd' and zstandard is None:
+        raise ValueError("使用 zstd 压缩需要先安装 zstandard")
+
+
+# ---------------------------------------------------------------- dir 格式
+
+def open_index(book_folder, append=False, name=INDEX_NAME):
+    """打开小说的段落索引文件用于写入"""
+    return open(os.path.join(book_folder, name), 'ab' if append else 'wb')
+
+
+def chapter_path(book_folder, entry):
+    """dir 格式章节文件的路径（整本重写时文件名带版本号，记录在清单的 path 中）"""
+    return os.path.join(book_folder, entry.get('path', entry['file']))
+
+
+def _index_name(entry):
+    """章节的段落偏移所在的索引文件名"""
+    return entry.get('index_file', INDEX_NAME)
+
+
+def _versioned_name(book_folder, name, version, fresh=False):
+    """
+    整本重写时新文件的文件名。
+
+    新小说（fresh）沿用原名；替换已有小说或原名已被占用时带上版本号（NNNN_标题.<版本>.txt），
+    新文件名与任何一版旧文件都不相同，读者手中的旧清单不会指向新内容。
+    """
+    if fresh and not os.path.exists(os.path.join(book_folder, name)):
+        return name
+    stem, ext = os.path.splitext(name)
+    return f'{stem}.{version}{ext}'
+
+
+def chapter_entry(filename, data, index_file):
+    """
+    根据章节文件内容生成一条清单记录，并把段落偏移写入段落索引。
+
+    :param filename: 章节文件名
+    :param data: 章节内容（utf-8 编码的 bytes）
+    :param index_file: open_index 打开的段落索引文件
+    :return: {'file', 'title', 'size', 'paragraphs', 'index'}
+    """
+    return _indexed_entry(filename, len(data), paragraph_offsets(data), index_file)
+
+
+def _indexed_entry(filename, size, offsets, index_file):
+    index_file.seek(0, os.SEEK_END)
+    position = index_file.tell() // PAIR_SIZE
+    _write_offsets(index_file, offsets)
+    return {
+        'file': filename,
+        'title': chapter_title_from_filename(filename),
+        'size': size,
+        'paragraphs': len(offsets) // 2,
+        'index': position,
+    }
+
+
+def write_manifest(book_folder, chapters):
+    """写入章节清单（先写临时文件再替换，避免读到半截文件）"""
+    path = os.path.join(book_folder, MANIFEST_NAME)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump({'version': MANIFEST_VERSION, 'chapters': chapters}, f,
+                  ensure_ascii=False, separators=(',', ':'))
+    os.replace(tmp_path, path)
+
+
+def build_manifest(book_folder):
+    """扫描目录下的章节文件重建清单（兼容没有清单的旧小说目录）"""
+    chapter_files = sorted(f for f in os.listdir(book_folder) if f.endswith('.txt'))
+    chapters = []
+    with open_index(book_folder) as index_file:
+        for filename in chapter_files:
+            with open(os.path.join(book_folder, filename), 'rb') as f:
+                chapters.append(chapter_entry(filename, f.read(), index_file))
+    write_manifest(book_folder, chapters)
+    return chapters
+
+
+def _load_dir_manifest(book_folder, path):
+    with open(path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    if data.get('version') != MANIFEST_VERSION:
+        # 旧版本清单缺少段落索引，需要重建
+        return None
+    return data['chapters']
+
+
+def _manifest_chapters(book_folder):
+    """直接读取 dir 格式清单中的章节记录（不经缓存、不重建）；没有清单时返回空列表"""
+    path = os.path.join(book_folder, MANIFEST_NAME)
+    if not os.path.exists(path):
+        return []
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)['chapters']
+
+
+def _remove_dir_chapters(book_folder, chapters=None, keep=()):
+    """
+    删除 dir 格式的章节文件和段落索引（keep 中的文件名除外）；不再保留任何文件时连同清单一起删除。
+
+    :param chapters: 要清理的章节记录，默认为当前清单中的全部章节
+    :param keep: 仍在使用的文件名（新清单引用的章节文件和索引）
+    """
+    if chapters is None:
+        if not os.path.exists(os.path.join(book_folder, MANIFEST_NAME)):
+            return
+        chapters = _manifest_chapters(book_folder)
+    removed = []
+    for entry in chapters:
+        path = chapter_path(book_folder, entry)
+        if os.path.basename(path) not in keep and os.path.exists(path):
+            os.remove(path)
+            removed.append(entry.get('sha1'))
+    names = {INDEX_NAME} | {_index_name(entry) for entry in chapters}
+    if not keep:
+        names.add(MANIFEST_NAME)
+    for name in names - set(keep):
+        if os.path.exists(os.path.join(book_folder, name)):
+            os.remove(os.path.join(book_folder, name))
+    release_objects(objects_folder(book_folder), removed)
+
+
+# ---------------------------------------------------------------- 按内容去重
+
+def objects_folder(book_folder):
+    """小说所在书库的内容目录"""
+    return os.path.join(os.path.dirname(os.path.normpath(book_folder)), OBJECTS_NAME)
+
+
+def _object_path(objects, digest):
+    return os.path.join(objects, digest[:2], digest)
+
+
+def _same_file(path, other):
+    try:
+        return os.path.samefile(path, other)
+    except FileNotFoundError:
+        return False
+
+
+def _replace_with_link(object_path, path):
+    """把 path 替换为 object_path 的硬链接"""
+    tmp_path = path + '.link'
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    os.link(object_path, tmp_path)
+    os.replace(tmp_path, path)
+
+
+def reuse_object(objects, digest, path):
+    """
+    内容已存在时把 path 换成它的硬链接（path 可以尚不存在）。
+
+    :param objects: objects_folder 返回的内容目录
+    :param digest: 章节内容的 SHA-1
+    :param path: 章节文件
+    :return: 复用成功返回 True；内容不存在或无法建立硬链接时返回 False，由调用方正常写入
+    """
+    object_path = _object_path(objects, digest)
+    if _same_file(path, object_path):
+        return True
+    if not os.path.exists(object_path):
+        return False
+    try:
+        _replace_with_link(object_path, path)
+        return True
+    except OSError:
+        # 刚好被 release_objects 回收，或文件系统不支持硬链接
+        return False
+
+
+def link_object(objects, digest, path):
+    """
+    让已写好的章节文件与内容相同的已有章节共用一份数据。
+
+    内容已存在时把 path 换成它的硬链接；否则把 path 本身登记为该内容（建立硬链接，不复制）。
+    文件系统不支持硬链接时保持原样。
+
+    :param objects: objects_folder 返回的内容目录
+    :param digest: 章节内容的 SHA-1
+    :param path: 已写好的章节文件
+    :return: True 表示复用了已有内容
+    """
+    if reuse_object(objects, digest, path):
+        return True
+    object_path = _object_path(objects, digest)
+    try:
+        os.makedirs(os.path.dirname(object_path), exist_ok=True)
+        try:
+            os.link(path, object_path)
+        except FileExistsError:
+            # 其他进程同时写入了相同内容
+            _replace_with_link(object_path, path)
+            return True
+    except OSError as e:
+        print(f"[WARN] 章节去重失败，按普通文件保存：{path}：{e}")
+    return False
+
+
+def release_objects(objects, digests):
+    """删除已不被任何章节文件引用（只剩自身一个硬链接）的内容"""
+    for digest in set(digests):
+        if not digest:
+            continue
+        object_path = _object_path(objects, digest)
+        try:
+            if os.stat(object_path).st_nlink <= 1:
+                os.remove(object_path)
+        except FileNotFoundError:
+            pass
+
+
+def _file_hash(path):
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(SPILL_BYTES), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class DirectoryWriter:
+    """
+    按 dir 格式写入章节：每章一个 txt 文件，关闭时写入清单。
+
+    整本重写（上传）时不覆盖任何旧文件：与现有文件重名的章节和段落索引改用带版本号的文件名，
+    记录在新清单中。替换清单是唯一的提交点，之后才删除旧章节和旧索引；
+    读者拿到的清单无论新旧，引用的章节与索引都是同一版本，中途失败时原小说保持不变。
+    """
+
+    def __init__(self, book_folder, append=False):
+        os.makedirs(book_folder, exist_ok=True)
+        self.book_folder = book_folder
+        self.append = append
+        chapters = load_manifest(book_folder)['chapters'] if append else []
+        self.chapters = {c['file']: c for c in chapters}
+        self.objects = objects_folder(book_folder)
+        # 整本重写时被替换的旧章节，提交后删除其文件并检查内容是否还有其他引用
+        self._old = [] if append else _manifest_chapters(book_folder)
+        # 被覆盖或不再保留的章节内容，关闭时检查是否还有其他引用
+        self._released = [c.get('sha1') for c in self._old]
+        self._version = f'{time.time_ns():x}'
+        self._fresh = not self._old and not pack_path(book_folder)
+        if append:
+            self.index_name = _index_name(chapters[0]) if chapters else INDEX_NAME
+        else:
+            self.index_name = _versioned_name(book_folder, INDEX_NAME, self._version, self._fresh)
+        self.index_file = open_index(book_folder, append=append, name=self.index_name)
+        # 整本重写时本次新写入的文件，失败时删除
+        self._written = []
+        self._file = None
+
+    def add_chapter(self, filename, text):
+        """写入一章，同名章节覆盖原记录"""
+        self.start_chapter(filename)
+        self.write(text)
+        self.finish_chapter()
+
+    def start_chapter(self, filename):
+        """开始分块写入一章，之后调用 write 写入内容、finish_chapter 结束"""
+        self._filename = filename
+        # 内容先缓存在内存，过长时写临时文件，写完再改名，崩溃时不会留下半截章节
+        self._part_path = os.path.join(self.book_folder, filename + '.part')
+        self._buffer = []
+        self._hash = hashlib.sha1()
+        self._indexer = ParagraphIndexer()
+
+    def write(self, text):
+        data = text.encode('utf-8')
+        self._indexer.feed(data)
+        self._hash.update(data)
+        if self._file is None:
+            self._buffer.append(data)
+            if self._indexer.size < SPILL_BYTES:
+                return
+            self._file = open(self._part_path, 'wb')
+            data = b''.join(self._buffer)
+            self._buffer = []
+        self._file.write(data)
+
+    def finish_chapter(self):
+        filename = self._filename
+        name = filename if self.append else _versioned_name(self.book_folder, filename, self._version, self._fresh)
+        path = os.path.join(self.book_folder, name)
+        digest = self._hash.hexdigest()
+        data = b''.join(self._buffer)
+        self._buffer = []
+        if self._file:
+            self._file.close()
+            self._file = None
+            os.replace(self._part_path, path)
+        elif not (DEDUP and reuse_object(self.objects, digest, path)):
+            # 内容已存在时（如重新上传未修改的章节）只建硬链接，不写入
+            with open(self._part_path, 'wb') as f:
+                f.write(data)
+            os.replace(self._part_path, path)
+        if DEDUP:
+            link_object(self.objects, digest, path)
+        old = self.chapters.get(filename)
+        if old:
+            self._released.append(old.get('sha1'))
+        entry = _indexed_entry(filename, self._indexer.size, self._indexer.close(), self.index_file)
+        entry['sha1'] = digest
+        if name != filename:
+            entry['path'] = name
+        if self.index_name != INDEX_NAME:
+            entry['index_file'] = self.index_name
+        self.chapters[filename] = entry
+        if not self.append:
+            self._written.append(path)
+        else:
+            # 追加模式（爬虫逐章保存）每章都更新清单，阅读端能立即看到新章节
+            self.index_file.flush()
+            self._write_manifest()
+            if old and chapter_path(self.book_folder, old) != path:
+                # 覆盖了上次整本重写时带版本号的章节，旧文件已不被清单引用
+                os.remove(chapter_path(self.book_folder, old))
+
+    def _write_manifest(self):
+        write_manifest(self.book_folder, sorted(self.chapters.values(), key=lambda c: c['file']))
+
+    def close(self):
+        self.index_file.close()
+        # 写入新清单即提交；整本重写时再删除旧清单引用、新清单不再引用的章节与索引，以及原打包文件
+        self._write_manifest()
+        if not self.append:
+            keep = {os.path.basename(path) for path in self._written} | {self.index_name}
+            _remove_dir_chapters(self.book_folder, self._old, keep=keep)
+            _remove_pack(self.book_folder)
+        release_objects(self.objects, self._released)
+
+    def abort(self):
+        # 写到一半的章节不登记到清单
+        if self._file:
+            self._file.close()
+            os.remove(self._part_path)
+        self.index_file.close()
+        if self.append:
+            self._write_manifest()
+        else:
+            # 整本重写失败：丢弃新写的章节和索引，原小说保持不变
+            for path in self._written:
+                os.remove(path)
+            os.remove(os.path.join(self.book_folder, self.index_name))
+            self._released = [entry.get('sha1') for entry in self.chapters.values()]
+        release_objects(self.objects, self._released)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+# ---------------------------------------------------------------- pack 格式
+
+class PackLock:
+    """
+    打包文件的写入锁（进程间、线程间均互斥），写入器在整个写入期间持有。
+
+    :param book_folder: 小说目录
+    """
+
+    def __init__(self, book_folder):
+        self.path = os.path.join(book_folder, PACK_LOCK_NAME)
+        self._file = None
+
+    def acquire(self, blocking=True):
+        """加锁；blocking=False 时拿不到锁立即返回 False"""
+        f = open(self.path, 'a+b')
+        try:
+            if fcntl:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_LOCK if blocking else msvcrt.LK_NBLCK, 1)
+        except OSError:
+            f.close()
+            if blocking:
+                raise
+            return False
+        self._file = f
+        return True
+
+    def release(self):
+        if self._file is None:
+            return
+        if fcntl:
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+        else:
+            self._file.seek(0)
+            msvcrt.locking(self._file.fileno(), msvcrt.LK_UNLCK, 1)
+        self._file.close()
+        self._file = None
+
+
+def read_pack_table(path, locked=False):
+    """
+    读取打包文件的目录表。
+
+    存在追加前备份的目录表时：有写入器正在追加则读取备份（追加前的章节都在备份目录表之前，不受影响）；
+    否则说明上次追加中途崩溃，先恢复再读取。
+
+    :param path: 打包文件路径
+    :param locked: 调用方已持有 PackLock（写入器）
+    :return: (目录表偏移, 目录表)
+    """
+    book_folder = os.path.dirname(path)
+    undo_path = os.path.join(book_folder, PACK_UNDO_NAME)
+    if os.path.exists(undo_path):
+        if locked:
+            _recover_pack(path)
+        else:
+            lock = PackLock(book_folder)
+            if not lock.acquire(blocking=False):
+                try:
+                    with open(undo_path, 'rb') as f:
+                        return _parse_pack_tail(f.read(), path)
+                except FileNotFoundError:
+                    pass  # 追加刚好结束，读取新的目录表
+            else:
+                try:
+                    if os.path.exists(undo_path):
+                        _recover_pack(path)
+                finally:
+                    lock.release()
+    with open(path, 'rb') as f:
+        footer_offset = f.seek(-PACK_FOOTER.size, os.SEEK_END)
+        table_offset, magic = PACK_FOOTER.unpack(f.read(PACK_FOOTER.size))
+        if magic != PACK_MAGIC or table_offset > footer_offset:
+            raise ValueError(f"打包文件已损坏或正在写入：{path}")
+        f.seek(table_offset)
+        table = json.loads(f.read(footer_offset - table_offset).decode('utf-8'))
+    return table_offset, table
+
+
+def _parse_pack_tail(tail, path):
+    """解析目录表 + 文件尾，返回 (目录表偏移, 目录表)"""
+    table_offset, magic = PACK_FOOTER.unpack(tail[-PACK_FOOTER.size:])
+    if magic != PACK_MAGIC:
+        raise ValueError(f"打包文件已损坏：{path}")
+    return table_offset, json.loads(tail[:-PACK_FOOTER.size].decode('utf-8'))
+
+
+def _recover_pack(path):
+    """用追加前备份的目录表和文件尾恢复打包文件（丢弃未写完的新章节），调用方需持有 PackLock"""
+    undo_path = os.path.join(os.path.dirname(path), PACK_UNDO_NAME)
+    with open(undo_path, 'rb') as f:
+        tail = f.read()
+    table_offset, magic = PACK_FOOTER.unpack(tail[-PACK_FOOTER.size:])
+    if magic == PACK_MAGIC:
+        with open(path, 'r+b') as f:
+            f.seek(table_offset)
+            f.truncate()
+            f.write(tail)
+            f.flush()
+            os.fsync(f.fileno())
+    os.remove(undo_path)
+
+
+class PackWriter:
+    """
+    按 pack 格式写入章节。
+
+    新建时先写临时文件，关闭时改名到位；已有打包文件时新文件带版本号，不覆盖原文件，
+    关闭时先让打包清单指向新文件（提交），最后才删除被替换的打包文件和 dir 格式章节。
+    追加模式（爬虫逐章保存）在原目录表位置截断后续写新章节，再写入新的目录表。
+    """
+
+    def __init__(self, book_folder, append=False, compression=DEFAULT_COMPRESSION):
+        os.makedirs(book_folder, exist_ok=True)
+        self.book_folder = book_folder
+        self.undo_path = os.path.join(book_folder, PACK_UNDO_NAME)
+        # 整个写入期间持有锁：同一本小说同时只有一个写入器，读取端据此判断备份目录表是否可用于恢复
+        self.lock = PackLock(book_folder)
+        self.lock.acquire()
+        try:
+            self._open(append, compression)
+        except BaseException:
+            self.lock.release()
+            raise
+
+    def _open(self, append, compression):
+        # 被替换（整本重写）或追加写入的打包文件
+        self.superseded = pack_path(self.book_folder)
+        if append and self.superseded:
+            self.path = self.superseded
+            self.superseded = None
+            table_offset, table = read_pack_table(self.path, locked=True)
+            self.compression = table['compression']
+            self.chapters = {c['file']: c for c in table['chapters']}
+            self.tmp_path = None
+            self.f = open(self.path, 'r+b')
+            self.f.seek(table_offset)
+            # 截断前先备份原目录表与文件尾，写完新目录表后删除
+            _write_synced(self.undo_path, self.f.read())
+            self.f.seek(table_offset)
+            self.f.truncate()
+        else:
+            _check_compression(compression)
+            self.compression = compression
+            self.chapters = {}
+            name = _versioned_name(self.book_folder, PACK_NAME, f'{time.time_ns():x}', fresh=not self.superseded)
+            self.path = os.path.join(self.book_folder, name)
+            self.tmp_path = self.path + '.tmp'
+            self.f = open(self.tmp_path, 'wb')
+            self.f.write(PACK_MAGIC)
+
+    def add_chapter(self, filename, text):
+        """写入一章，同名章节覆盖原记录（旧内容留在文件中，迁移时才会清理）"""
+        self.start_chapter(filename)
+        self.write(text)
+        self.finish_chapter()
+
+    def start_chapter(self, filename):
+        """开始分块写入一章，之后调用 write 写入内容、finish_chapter 结束"""
+        self._filename = filename
+        self._offset = self.f.tell()
+        self._compressor = _compressor(self.compression)
+        self._indexer = ParagraphIndexer()
+
+    def write(self, text):
+        data = text.encode('utf-8')
+        self._indexer.feed(data)
+        self.f.write(self._compressor.compress(data) if self._compressor else data)
+
+    def finish_chapter(self):
+        if self._compressor:
+            self.f.write(self._compressor.flush())
+        index = self.f.tell()
+        offsets = self._indexer.close()
+        _write_offsets(self.f, offsets)
+        self.chapters[self._filename] = {
+            'file': self._filename,
+            'title': chapter_title_from_filename(self._filename),
+            'size': self._indexer.size,
+            'paragraphs': len(offsets) // 2,
+            'offset': self._offset,
+            'length': index - self._offset,
+            'index': index,
+        }
+
+    def close(self):
+        table_offset = self.f.tell()
+        table = {
+            'version': PACK_VERSION,
+            'compression': self.compression,
+            'chapters': sorted(self.chapters.values(), key=lambda c: c['file']),
+        }
+        self.f.write(json.dumps(table, ensure_ascii=False, separators=(',', ':')).encode('utf-8'))
+        self.f.write(PACK_FOOTER.pack(table_offset, PACK_MAGIC))
+        self.f.flush()
+        os.fsync(self.f.fileno())
+        self.f.close()
+        try:
+            if self.tmp_path:
+                os.replace(self.tmp_path, self.path)
+                # 整本重写：打包清单指向新文件即提交，之后删除被替换的打包文件和 dir 格式留下的章节文件
+                if self.superseded or os.path.exists(os.path.join(self.book_folder, PACK_MANIFEST_NAME)):
+                    _write_pack_manifest(self.path)
+                if self.superseded:
+                    os.remove(self.superseded)
+                _remove_dir_chapters(self.book_folder)
+            else:
+                os.remove(self.undo_path)
+        finally:
+            self.lock.release()
+
+    def abort(self):
+        if self.tmp_path:
+            self.f.close()
+            os.remove(self.tmp_path)
+            self.lock.release()
+        else:
+            # 追加模式下已截断原目录表，必须补写目录表
+            self.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+def pack_path(book_folder):
+    """当前使用的打包文件路径（打包清单指向的文件，没有清单时为 novel.pack）；不是 pack 格式时返回 None"""
+    try:
+        with open(os.path.join(book_folder, PACK_MANIFEST_NAME), 'r', encoding='utf-8') as f:
+            path = os.path.join(book_folder, json.load(f)['pack'])
+    except FileNotFoundError:
+        path = os.path.join(book_folder, PACK_NAME)
+    return path if os.path.exists(path) else None
+
+
+def _write_pack_manifest(path):
+    """让打包清单指向 path（先写临时文件再替换）"""
+    manifest_path = os.path.join(os.path.dirname(path), PACK_MANIFEST_NAME)
+    tmp_path = manifest_path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump({'pack': os.path.basename(path)}, f)
+    os.replace(tmp_path, manifest_path)
+
+
+def _remove_pack(book_folder):
+    """删除打包文件：先删打包清单（读者随即改读 dir 格式清单），再删它指向的文件"""
+    path = pack_path(book_folder)
+    manifest_path = os.path.join(book_folder, PACK_MANIFEST_NAME)
+    if os.path.exists(manifest_path):
+        os.remove(manifest_path)
+    if path:
+        os.remove(path)
+
+
+def _write_synced(path, data):
+    """写入文件并落盘（先写临时文件再替换）"""
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def _read_pack_paragraphs(book_folder, entry, start, count):
+    compression = load_manifest(book_folder)['compression']
+    with open(os.path.join(book_folder, entry['pack']), 'rb') as f:
+        f.seek(entry['index'] + start * PAIR_SIZE)
+        offsets = _read_offsets(f, count * 2)
+        if compression:
+            # 压缩的章节需整章解压，内存占用以单章为上限
+            f.seek(entry['offset'])
+            data = _decompress(f.read(entry['length']), compression)
+            base = 0
+        else:
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            base = entry['offset']
+        try:
+            return [data[base + offsets[i]:base + offsets[i + 1]].decode('utf-8', errors='ignore')
+                    for i in range(0, len(offsets), 2)]
+        finally:
+            if isinstance(data, mmap.mmap):
+                data.close()
+
+
+# ---------------------------------------------------------------- 通用接口
+
+def novel_format(book_folder):
+    """判断小说目录的存储格式；新目录返回默认格式"""
+    if pack_path(book_folder):
+        return 'pack'
+    if os.path.isdir(book_folder) and any(
+            f == MANIFEST_NAME or f.endswith('.txt') for f in os.listdir(book_folder)):
+        return 'dir'
+    return DEFAULT_FORMAT
+
+
+def open_writer(book_folder, append=False, storage_format=None, compression=DEFAULT_COMPRESSION):
+    """
+    打开章节写入器。
+
+    :param book_folder: 小说目录
+    :param append: True 时在已有章节后追加（爬虫），False 时整本重写（上传）
+    :param storage_format: 'dir' 或 'pack'，默认追加时沿用已有格式，新写入用 DEFAULT_FORMAT
+    :param compression: pack 格式的压缩方式（None/'zlib'/'zstd'）
+    """
+    if storage_format is None:
+        storage_format = novel_format(book_folder) if append else DEFAULT_FORMAT
+    if storage_format == 'pack':
+        return PackWriter(book_folder, append=append, compression=compression)
+    if storage_format == 'dir':
+        return DirectoryWriter(book_folder, append=append)
+    raise ValueError(f"未知的存储格式：{storage_format}")
+
+
+def save_chapter(book_folder, filename, text):
+    """把一章追加保存到小说中（供爬虫逐章保存时调用）"""
+    with open_writer(book_folder, append=True) as writer:
+        writer.add_chapter(filename, text)
+
+
+def load_manifest(book_folder):
+    """
+    读取小说的章节清单，按清单文件（或打包文件）的 mtime 做进程内缓存。
+
+    缓存命中时只需一次 stat，不再遍历目录。dir 格式清单不存在时自动从目录重建。
+
+    :param book_folder: 小说目录
+    :return: {'chapters': [...], 'titles': [...], 'compression': ..., 'mtime': 清单文件 mtime（纳秒）}，
+             调用方不要修改返回值；章节有任何变动 mtime 都会变，可用作 HTTP 缓存校验
+    """
+    cached = _manifest_cache.get(book_folder)
+    if cached:
+        try:
+            if os.stat(cached[0]).st_mtime_ns == cached[1]:
+                return cached[2]
+        except FileNotFoundError:
+            pass
+
+    path = pack_path(book_folder)
+    if path:
+        mtime = os.stat(path).st_mtime_ns
+        _, table = read_pack_table(path)
+        chapters = table['chapters']
+        # 记下每章所在的打包文件：整本重写后，用旧清单读取的读者仍读旧文件（或因旧文件已删除而失败），不会错读新文件
+        for entry in chapters:
+            entry['pack'] = os.path.basename(path)
+        compression = table['compression']
+    else:
+        path = os.path.join(book_folder, MANIFEST_NAME)
+        if not os.path.exists(path):
+            build_manifest(book_folder)
+        mtime = os.stat(path).st_mtime_ns
+        chapters = _load_dir_manifest(book_folder, path)
+        if chapters is None:
+            chapters = build_manifest(book_folder)
+            mtime = os.stat(path).st_mtime_ns
+        compression = None
+
+    manifest = {
+        'chapters': chapters,
+        'titles': [c['title'] for c in chapters],
+        'compression': compression,
+        'mtime': mtime,
+    }
+    _manifest_cache[book_folder] = (path, mtime, manifest)
+    return manifest
+
+
+def read_paragraphs(book_folder, entry, start, count):
+    """
+    只读取章节中第 start 段起的 count 个段落。
+
+    先从段落索引中读出这几段的字节范围，再通过 mmap 只取对应字节，
+    内存占用与章节大小无关（压缩的 pack 章节除外）。
+
+    :param book_folder: 小说目录
+    :param entry: 章节清单记录（需先经 load_manifest 取得）
+    :param start: 起始段落序号（从0开始）
+    :param count: 段落数
+    :return: 段落字符串列表
+    """
+    count = min(count, entry['paragraphs'] - start)
+    if start < 0 or count <= 0:
+        return []
+
+    if 'offset' in entry:
+        return _read_pack_paragraphs(book_folder, entry, start, count)
+
+    with open(os.path.join(book_folder, _index_name(entry)), 'rb') as f:
+        f.seek((entry['index'] + start) * PAIR_SIZE)
+        offsets = _read_offsets(f, count * 2)
+
+    with open(chapter_path(book_folder, entry), 'rb') as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            return [mm[offsets[i]:offsets[i + 1]].decode('utf-8', errors='ignore')
+                    for i in range(0, len(offsets), 2)]
+
+
+def read_chapter(book_folder, entry):
+    """读取整章内容（迁移等批量操作使用）"""
+    if 'offset' in entry:
+        with open(os.path.join(book_folder, entry['pack']), 'rb') as f:
+            f.seek(entry['offset'])
+            blob = f.read(entry['length'])
+        return _decompress(blob, load_manifest(book_folder)['compression']).decode('utf-8')
+    with open(chapter_path(book_folder, entry), 'rb') as f:
+        return f.read().decode('utf-8', errors='ignore')
+
+
+def forget_manifest(book_folder):
+    """删除或重命名小说后清掉对应的缓存"""
+    _manifest_cache.pop(book_folder, None)
+
+
+def delete_novel(book_folder):
+    """删除整本小说，并删除只被这本小说引用的章节内容"""
+    digests = [c.get('sha1') for c in _manifest_chapters(book_folder)]
+    shutil.rmtree(book_folder)
+    forget_manifest(book_folder)
+    release_objects(objects_folder(book_folder), digests)
+
+
+def rename_novel(old_folder, new_folder):
+    """重命名小说（两种格式都只需重命名目录）"""
+    os.rename(old_folder, new_folder)
+    forget_manifest(old_folder)
+
+
+def migrate_novel(book_folder, compression=None):
+    """
+    把 dir 格式的小说迁移为 pack 格式，成功后删除原章节文件。
+
+    :return: 迁移的章节数；已是 pack 格式时返回 0
+    """
+    if novel_format(book_folder) == 'pack':
+        return 0
+    chapters = load_manifest(book_folder)['chapters']
+    with PackWriter(book_folder, compression=compression) as writer:
+        for entry in chapters:
+            writer.add_chapter(entry['file'], read_chapter(book_folder, entry))
+    forget_manifest(book_folder)
+    return len(chapters)
+
+
+def migrate_library(root, compression=None):
+    """把整个书库中的 dir 格式小说迁移为 pack 格式"""
+    for name in sorted(os.listdir(root)):
+        book_folder = os.path.join(root, name)
+        if name.startswith('.') or not os.path.isdir(book_folder):
+            continue
+        count = migrate_novel(book_folder, compression)
+        if count:
+            print(f"[MIGRATE] {name}：{count} 章")
+
+
+def _dir_novels(root):
+    """书库中 dir 格式的小说目录"""
+    for name in sorted(os.listdir(root)):
+        book_folder = os.path.join(root, name)
+        if not name.startswith('.') and os.path.isdir(book_folder) and novel_format(book_folder) == 'dir':
+            yield book_folder
+
+
+def library_usage(root):
+    """
+    统计 dir 格式章节的空间占用。
+
+    :return: {'chapters': 章节数, 'size': 各章大小之和（不去重时的占用）,
+              'disk': 实际占用（硬链接到同一内容的章节只算一次，另加未被引用的内容）}
+    """
+    chapters = size = disk = 0
+    seen = set()
+    paths = [chapter_path(book_folder, c)
+             for book_folder in _dir_novels(root) for c in load_manifest(book_folder)['chapters']]
+    for path in paths:
+        st = os.stat(path)
+        chapters += 1
+        size += st.st_size
+        if (st.st_dev, st.st_ino) not in seen:
+            seen.add((st.st_dev, st.st_ino))
+            disk += st.st_size
+    for folder, _, files in os.walk(os.path.join(root, OBJECTS_NAME)):
+        for name in files:
+            st = os.stat(os.path.join(folder, name))
+            if (st.st_dev, st.st_ino) not in seen:
+                seen.add((st.st_dev, st.st_ino))
+                disk += st.st_size
+    return {'chapters': chapters, 'size': size, 'disk': disk}
+
+
+def collect_garbage(root):
+    """删除书库中不再被任何章节引用的内容，返回删除的个数"""
+    removed = 0
+    for folder, _, files in os.walk(os.path.join(root, OBJECTS_NAME)):
+        for name in files:
+            path = os.path.join(folder, name)
+            if os.stat(path).st_nlink <= 1:
+                os.remove(path)
+                removed += 1
+    return removed
+
+
+def dedup_library(root, dry_run=False):
+    """
+    对已有书库按内容去重：计算每章的 SHA-1，相同内容的章节改为硬链接到同一份数据，并把 SHA-1 记入清单。
+
+    pack 格式的小说整本一个文件，不参与去重。
+
+    :param root: 书库目录
+    :param dry_run: 只统计去重后的大小，不修改文件
+    :return: {'before': 去重前的 library_usage, 'after': 去重后的 library_usage, 'novels', 'unique', 'removed'}
+    """
+    before = library_usage(root)
+    objects = os.path.join(root, OBJECTS_NAME)
+    sizes = {}
+    novels = 0
+    for book_folder in _dir_novels(root):
+        novels += 1
+        chapters = [dict(c) for c in load_manifest(book_folder)['chapters']]
+        changed = False
+        for entry in chapters:
+            path = chapter_path(book_folder, entry)
+            digest = entry.get('sha1')
+            if not digest or not _same_file(path, _object_path(objects, digest)):
+                digest = _file_hash(path)
+                if not dry_run:
+                    link_object(objects, digest, path)
+            sizes[digest] = entry['size']
+            if entry.get('sha1') != digest:
+                entry['sha1'] = digest
+                changed = True
+        if changed and not dry_run:
+            write_manifest(book_folder, chapters)
+        print(f"[DEDUP] {os.path.basename(book_folder)}：{len(chapters)} 章")
+
+    if dry_run:
+        after = dict(before, disk=sum(sizes.values()))
+        removed = 0
+    else:
+        removed = collect_garbage(root)
+        after = library_usage(root)
+    return {'before': before, 'after': after, 'novels': novels, 'unique': len(sizes), 'removed': removed}
+
+
+def _megabytes(size):
+    return f"{size / 1024 / 1024:.1f} MB"
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='小说存储格式工具')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    migrate_parser = subparsers.add_parser('migrate', help='把每章一个 txt 的旧目录迁移为打包格式')
+    migrate_parser.add_argument('--root', default='novels', help='书库目录')
+    migrate_parser.add_argument('--compress', choices=['zlib', 'zstd'], default=None, help='按章压缩')
+    dedup_parser = subparsers.add_parser('dedup', help='按内容去重 dir 格式的章节，输出去重前后的书库大小')
+    dedup_parser.add_argument('--root', default='novels', help='书库目录')
+    dedup_parser.add_argument('--dry-run', action='store_true', help='只统计，不修改文件')
+    args = parser.parse_args()
+
+    if args.command == 'migrate':
+        _check_compression(args.compress)
+        migrate_library(args.root, args.compress)
+    elif args.command == 'dedup':
+        report = dedup_library(args.root, args.dry_run)
+        before, after = report['before'], report['after']
+        saved = before['disk'] - after['disk']
+        print(f"[REPORT] {report['novels']} 本小说，{before['chapters']} 章，不同内容 {report['unique']} 份")
+        print(f"[REPORT] 章节合计 {_megabytes(before['size'])}；实际占用 去重前 {_megabytes(before['disk'])}，"
+              f"去重后 {_megabytes(after['disk'])}{'（预计）' if args.dry_run else ''}，"
+              f"节省 {_megabytes(saved)}（{saved / before['disk'] if before['disk'] else 0:.1%}）")
+        if report['removed']:
+            print(f"[REPORT] 删除未被引用的内容 {report['removed']} 份")
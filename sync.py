@@ -0,0 +1,118 @@
+"""
+连载小说增量更新。
+
+dybz.py、pixiv.py、pixiv_async.py 下载时把小说的来源（目录或系列地址）记录在 .journal.json 中。
+本脚本遍历书库中所有记录了来源的小说，只读取目录或系列章节列表，与已保存的章节对比，
+下载新增（以及之前失败）的章节，新章节的 NNNN_ 序号接在已有章节之后。
+适合用 cron 等定时运行；结束时输出每本小说跳过和下载的章节数。
+
+用法：python sync.py [--sites dybz pixiv] [--workers 1] [--delay 0] [--cookies cookies.txt] [--report sync.json]
+"""
+import sys
+import json
+import time
+import asyncio
+import argparse
+
+from journal import tracked_novels
+
+NOVEL_FOLDER = 'novels'
+SITES = ('dybz', 'pixiv')
+
+
+def sync_dybz(tracked, workers=1, delay=0.0):
+    """
+    增量更新第一版主的小说。
+
+    :param tracked: [(小说目录, 来源)]
+    :param workers: 并发下载数
+    :param delay: 同一站点两次请求的最小间隔（秒）
+    :return: {小说目录: get_novel_by_catalog 的结果}，出错的小说为 {'error': 错误信息}
+    """
+    import dybz
+    dybz.rate_limiter.interval = delay
+    drivers = [dybz.create_http_driver() for _ in range(max(1, workers))]
+    results = {}
+    try:
+        for folder_path, source in tracked:
+            print(f"[SYNC] {folder_path} <- {source['url']}")
+            try:
+                result = dybz.get_novel_by_catalog(drivers[0], source['url'], drivers[1:], folder_path)
+                results[folder_path] = result if result is not None else {'error': '无法读取目录'}
+            except Exception as e:
+                print(f"[ERROR] {folder_path} 更新失败：{e}")
+                results[folder_path] = {'error': str(e)}
+    finally:
+        for driver in drivers:
+            driver.quit()
+    return results
+
+
+def sync_pixiv(tracked, cookies_file, base_url=None, max_requests=8):
+    """增量更新 pixiv 系列，返回值同 sync_dybz"""
+    from pixiv import convert_cookies
+    import pixiv_async
+    return asyncio.run(pixiv_async.sync_series(tracked, convert_cookies(cookies_file),
+                                               base_url or pixiv_async.PIXIV_URL, max_requests=max_requests))
+
+
+def sync_all(sites=SITES, workers=1, delay=0.0, cookies_file='cookies.txt', pixiv_base_url=None):
+    """
+    更新所有记录了来源的小说。
+
+    :return: 汇总信息字典：各小说的结果及跳过、下载、失败章节数的合计
+    """
+    start = time.perf_counter()
+    results = {}
+    for site in sites:
+        tracked = tracked_novels(NOVEL_FOLDER, site)
+        print(f"[SYNC] {site}：{len(tracked)} 本")
+        if not tracked:
+            continue
+        if site == 'dybz':
+            site_results = sync_dybz(tracked, workers, delay)
+        else:
+            site_results = sync_pixiv(tracked, cookies_file, pixiv_base_url)
+        for folder_path, result in site_results.items():
+            results[folder_path] = dict(result, site=site)
+
+    ok = [result for result in results.values() if 'error' not in result]
+    return {
+        'novels': len(results),
+        'errors': len(results) - len(ok),
+        'chapters': sum(result['chapters'] for result in ok),
+        'skipped': sum(result['skipped'] for result in ok),
+        'fetched': sum(result['fetched'] for result in ok),
+        'failed': sum(result['failed'] for result in ok),
+        'seconds': round(time.perf_counter() - start, 1),
+        'results': results,
+    }
+
+
+def print_summary(summary):
+    for folder_path, result in summary['results'].items():
+        if 'error' in result:
+            print(f"  [FAIL] {folder_path}：{result['error']}")
+        else:
+            print(f"  [{result['site']}] {folder_path}：目录 {result['chapters']} 章，跳过 {result['skipped']}，"
+                  f"下载 {result['fetched']}，失败 {result['failed']}")
+    print(f"[SUMMARY] {summary['novels']} 本小说（出错 {summary['errors']}）：跳过 {summary['skipped']} 章，"
+          f"下载 {summary['fetched']} 章，失败 {summary['failed']} 章，用时 {summary['seconds']} 秒")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='增量更新连载小说')
+    parser.add_argument('--sites', nargs='+', choices=SITES, default=list(SITES), help='要更新的站点')
+    parser.add_argument('--workers', type=int, default=1, help='第一版主的并发下载数')
+    parser.add_argument('--delay', type=float, default=0.0, help='第一版主同一站点两次请求的最小间隔（秒）')
+    parser.add_argument('--cookies', default='cookies.txt', help='pixiv 的 Cookie 文件')
+    parser.add_argument('--pixiv-base-url', help='pixiv 站点地址（测试时可指向本地替身站点）')
+    parser.add_argument('--report', help='汇总信息写入的 JSON 文件')
+    args = parser.parse_args()
+
+    summary = sync_all(args.sites, args.workers, args.delay, args.cookies, args.pixiv_base_url)
+    print_summary(summary)
+    if args.report:
+        with open(args.report, 'w', encoding='utf-8') as f:
+            json.dump(summary, f, ensure_ascii=False, indent=2)
+    sys.exit(1 if summary['errors'] or summary['failed'] else 0)